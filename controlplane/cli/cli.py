@@ -1,15 +1,57 @@
 import cmd
 import sys
 import configuration_client
+import journal_decoder
 
 PORT_STATE_DISCARDING = 4
 PORT_STATE_LEARNING = 2
 PORT_STATE_FORWARDING = 3
 
+# Events which start a convergence, see rstp/convergence.py.
+CONVERGENCE_TRIGGER_NAMES = {0: "superior BPDU", 1: "aged info", 2: "configuration change"}
+# Order of the port counters, see rstp/counters.py.
+BPDU_TYPE_NAMES = ("config", "TCN", "RSTP")
+RCVD_INFO_NAMES = ("superior", "repeated", "inferior designated", "inferior root/alternate", "other")
+# Port roles, see rstp/rstp_util.py.
+PORT_ROLE_NAMES = {0: "Disabled", 1: "Designated", 2: "Root", 3: "Alternate", 4: "Backup"}
+# Names and snapshot fields printed by bridge_dump and port_dump.
+BRIDGE_DUMP_FIELDS = (
+    ("BridgeIdentifier", "bridge_identifier"),
+    ("TimeSinceTopologyChange", "time_since_topology_change"),
+    ("TopologyChangeCount", "topology_change_count"),
+    ("DesignatedRoot", "designated_root"),
+    ("RootPathCost", "root_path_cost"),
+    ("RootPort", "root_port"),
+    ("MaxAgeMs", "max_age_ms"),
+    ("HelloTimeMs", "hello_time_ms"),
+    ("ForwardDelayMs", "forward_delay_ms"),
+    ("BridgeMaxAgeMs", "bridge_max_age_ms"),
+    ("BridgeHelloTimeMs", "bridge_hello_time_ms"),
+    ("BridgeForwardDelayMs", "bridge_forward_delay_ms"),
+    ("TxHoldCount", "tx_hold_count"),
+    ("ForceVersion", "force_version"),
+    ("TickInterval", "tick_interval")
+)
+PORT_DUMP_FIELDS = (
+    ("Identifier", "identifier"),
+    ("PathCost", "path_cost"),
+    ("DesignatedRoot", "designated_root"),
+    ("DesignatedCost", "designated_cost"),
+    ("DesignatedBridge", "designated_bridge"),
+    ("DesignatedPort", "designated_port"),
+    ("TopologyChangeAcknowledge", "topology_change_acknowledge"),
+    ("AdminEdge", "admin_edge"),
+    ("OperEdge", "oper_edge"),
+    ("AutoEdge", "auto_edge"),
+    ("OperPointToPointMac", "oper_point_to_point_mac")
+)
+
 class Cli(cmd.Cmd):
     def __init__(self, address, port):
         cmd.Cmd.__init__(self)
-        self.client = configuration_client.ConfigurationClient(address, port)
+        self.client = configuration_client.ConfigurationClient(address, port, reconnect=True)
+        self.address = address
+        self.port = port
         Cli.prompt = "{}>".format(address)
 
     def emptyline(self):
@@ -76,22 +118,27 @@ class Cli(cmd.Cmd):
         """Get the bridge force version (0=STP compatibility, 2=RSTP)"""
         self.print_get_result("ForceVersion", self.client.get_force_version())
 
+    def do_tick_interval(self, args):
+        """Get the interval of the state machine timer ticks in milliseconds."""
+        self.print_get_result("TickInterval", self.client.get_tick_interval())
+
+    def do_hello_time_ms(self, args):
+        """Get the root bridge hello time in milliseconds."""
+        self.print_get_result("HelloTimeMs", self.client.get_hello_time_ms())
+
+    def do_bridge_hello_time_ms(self, args):
+        """Get the bridge hello time in milliseconds."""
+        self.print_get_result("BridgeHelloTimeMs", self.client.get_bridge_hello_time_ms())
+
     def do_bridge_dump(self, args):
         """Dump all info about the bridge."""
-        self.do_bridge_identifier(args)
-        self.do_time_since_topology_change(args)
-        self.do_topology_change_count(args)
-        self.do_designated_root(args)
-        self.do_root_path_cost(args)
-        self.do_root_port(args)
-        self.do_max_age(args)
-        self.do_hello_time(args)
-        self.do_forward_delay(args)
-        self.do_bridge_max_age(args)
-        self.do_bridge_hello_time(args)
-        self.do_bridge_forward_delay(args)
-        self.do_tx_hold_count(args)
-        self.do_force_version(args)
+        result = self.client.get_snapshot()
+        if result[0] != configuration_client.STATUS_SUCCESS:
+            print("Failed to get Snapshot! ({})".format(self.fail_reason(result[0])))
+            return
+        bridge, ports = result[1]
+        for name, field in BRIDGE_DUMP_FIELDS:
+            print("{} = {}".format(name, bridge[field]))
 
     # Set bridge configuration.
     def do_set_bridge_max_age(self, args):
@@ -154,6 +201,86 @@ class Cli(cmd.Cmd):
     def help_set_tx_hold_count(self):
         print("Usage: set_tx_hold_count <count>")
 
+    def do_set_tick_interval(self, args):
+        try:
+            value = int(args, 0)
+            self.print_set_result("TickInterval", self.client.set_tick_interval(value))
+        except ValueError:
+            self.help_set_tick_interval()
+
+    def help_set_tick_interval(self):
+        print("Usage: set_tick_interval <milliseconds>")
+        print("The interval must divide 1000. Intervals below 1000 allow sub-second hello times.")
+
+    def do_set_bridge_hello_time_ms(self, args):
+        try:
+            value = int(args, 0)
+            self.print_set_result("BridgeHelloTimeMs", self.client.set_bridge_hello_time_ms(value))
+        except ValueError:
+            self.help_set_bridge_hello_time_ms()
+
+    def help_set_bridge_hello_time_ms(self):
+        print("Usage: set_bridge_hello_time_ms <milliseconds>")
+        print("The time must be a multiple of the tick interval.")
+
+    # Diagnostics.
+    def do_journal_dump(self, args):
+        result = self.client.get_journal()
+        if result[0] != configuration_client.STATUS_SUCCESS:
+            print("Failed to get Journal! ({})".format(self.fail_reason(result[0])))
+            return
+        if args:
+            with open(args, "wb") as dump_file:
+                dump_file.write(result[1])
+            print("Saved {} bytes to {}".format(len(result[1]), args))
+        else:
+            for line in journal_decoder.decode(result[1]):
+                print(line)
+
+    def help_journal_dump(self):
+        print("Usage: journal_dump [file]")
+        print("Prints the journal of state machine transitions, BPDUs and switch calls as a timeline,")
+        print("or saves it to the file, to be decoded later with journal_decoder.py.")
+
+    def do_convergence_stats(self, args):
+        """Get the convergence times after topology or configuration changes, and the update iterations needed."""
+        result = self.client.get_convergence_statistics()
+        if result[0] != configuration_client.STATUS_SUCCESS:
+            print("Failed to get ConvergenceStatistics! ({})".format(self.fail_reason(result[0])))
+            return
+        converging, timeouts, last_convergence, convergence_times, iterations = result[1]
+        print("Converging = {}".format(converging))
+        print("TimedOut = {}".format(timeouts))
+        if last_convergence:
+            reason, port_no, milliseconds = last_convergence
+            print("LastConvergence = {} ms after {} (port {})".format(
+                milliseconds, CONVERGENCE_TRIGGER_NAMES.get(reason, reason), port_no
+            ))
+        self.print_histogram("Convergence time (ms)", convergence_times)
+        self.print_histogram("Update iterations", iterations)
+
+    def do_reset_convergence_stats(self, args):
+        """Clear the convergence statistics."""
+        self.print_set_result("ConvergenceStatistics", self.client.reset_convergence_statistics())
+
+    def do_unknown_port_counters(self, args):
+        """Get the BPDUs dropped because they were received on ports which aren't RSTP ports."""
+        result = self.client.get_unknown_port_counters()
+        if result[0] != configuration_client.STATUS_SUCCESS:
+            print("Failed to get UnknownPortCounters! ({})".format(self.fail_reason(result[0])))
+            return
+        dropped, rates = result[1]
+        print("Dropped = {} ({})".format(sum(count for port_no, count in dropped), self.format_rates(rates)))
+        for port_no, count in dropped:
+            print("  port {} {}".format(port_no, count))
+
+    def print_histogram(self, name, histogram):
+        buckets, count, total, maximum = histogram
+        average = float(total) / count if count else 0
+        print("{}: count = {}, average = {:.1f}, max = {}".format(name, count, average, maximum))
+        for bound, bucket_count in buckets:
+            print("  {:>8} {}".format("<= {}".format(bound) if bound is not None else "more", bucket_count))
+
     # Read port configuration.
     def do_port_uptime(self, args):
         try:
@@ -175,23 +302,37 @@ class Cli(cmd.Cmd):
             if result[0] != configuration_client.STATUS_SUCCESS:
                 print("Failed to get {}! ({})".format(name, self.fail_reason(result[0])))
             else:
-                state = result[1]
-                if state == PORT_STATE_DISCARDING:
-                    state_string = "Discarding"
-                elif state == PORT_STATE_FORWARDING:
-                    state_string = "Forwarding"
-                elif state == PORT_STATE_LEARNING:
-                    state_string = "Learning"
-                else:
-                    state_string = "Invalid!"
-
-                print("{} = {} ({})".format(name, state, state_string))
+                print("{} = {} ({})".format(name, result[1], self.format_port_state(result[1])))
         except ValueError:
             self.help_port_state()
 
     def help_port_state(self):
         print("Usage: port_state <port>")
 
+    def format_port_state(self, state):
+        if state == PORT_STATE_DISCARDING:
+            return "Discarding"
+        elif state == PORT_STATE_FORWARDING:
+            return "Forwarding"
+        elif state == PORT_STATE_LEARNING:
+            return "Learning"
+        else:
+            return "Invalid!"
+
+    def do_port_role(self, args):
+        try:
+            port_no = int(args, 0)
+            result = self.client.get_port_role(port_no)
+            if result[0] != configuration_client.STATUS_SUCCESS:
+                print("Failed to get Role! ({})".format(self.fail_reason(result[0])))
+            else:
+                print("Role = {} ({})".format(result[1], PORT_ROLE_NAMES.get(result[1], "Invalid!")))
+        except ValueError:
+            self.help_port_role()
+
+    def help_port_role(self):
+        print("Usage: port_role <port>")
+
     def do_port_identifier(self, args):
         try:
             port_no = int(args, 0)
@@ -304,25 +445,36 @@ class Cli(cmd.Cmd):
 
     def do_port_dump(self, args):
         try:
-            port_no = int(args, 0)
-            self.do_port_uptime(args)
-            self.do_port_state(args)
-            self.do_port_identifier(args)
-            self.do_port_path_cost(args)
-            self.do_port_designated_root(args)
-            self.do_port_designated_cost(args)
-            self.do_port_designated_bridge(args)
-            self.do_port_designated_port(args)
-            self.do_port_topology_change_acknowledge(args)
-            self.do_port_admin_edge(args)
-            self.do_port_oper_edge(args)
-            self.do_port_auto_edge(args)
-            self.do_port_oper_point_to_point_mac(args)
+            port_nos = [int(port_no, 0) for port_no in args.split()]
         except ValueError:
             self.help_port_dump()
+            return
+        result = self.client.get_snapshot()
+        if result[0] != configuration_client.STATUS_SUCCESS:
+            print("Failed to get Snapshot! ({})".format(self.fail_reason(result[0])))
+            return
+        bridge, ports = result[1]
+        ports = dict((port["port_no"], port) for port in ports)
+        for port_no in port_nos if port_nos else sorted(ports):
+            port = ports.get(port_no)
+            if port is None:
+                print("Failed to get port {}! (Invalid parameter)".format(port_no))
+                continue
+            if len(port_nos) != 1:
+                print("Port {}:".format(port_no))
+            print("Uptime = {}".format(port["uptime"]))
+            print("State = {} ({})".format(port["state"], self.format_port_state(port["state"])))
+            print("Role = {}".format(PORT_ROLE_NAMES.get(port["role"], "Invalid!")))
+            for name, field in PORT_DUMP_FIELDS:
+                print("{} = {}".format(name, port[field]))
+            print("Received = {}".format(self.format_counts(BPDU_TYPE_NAMES, port["received"])))
+            print("Sent = {}".format(self.format_counts(BPDU_TYPE_NAMES, port["sent"])))
+            print("ReceivedInfo = {}".format(self.format_counts(RCVD_INFO_NAMES, port["rcvd_info"])))
+            print("TxHoldCountThrottled = {}".format(port["tx_throttled"]))
 
     def help_port_dump(self):
-        print("Usage: port_dump <port>")
+        print("Usage: port_dump [<port> ...]")
+        print("Prints all info about the given ports, or about all ports, read in one request.")
 
     # Set port configuration.
     def do_set_port_path_cost(self, args):
@@ -369,6 +521,83 @@ class Cli(cmd.Cmd):
     def help_set_port_auto_edge(self):
         print("Usage: set_port_auto_edge <port> <True|False>")
 
+    # Port diagnostics.
+    def do_port_counters(self, args):
+        try:
+            port_no = int(args, 0)
+            result = self.client.get_port_counters(port_no)
+            if result[0] != configuration_client.STATUS_SUCCESS:
+                print("Failed to get Counters! ({})".format(self.fail_reason(result[0])))
+                return
+            received, sent, rcvd_info, tx_throttled, received_rates, sent_rates = result[1]
+            print("Received = {} ({})".format(self.format_counts(BPDU_TYPE_NAMES, received), self.format_rates(received_rates)))
+            print("Sent = {} ({})".format(self.format_counts(BPDU_TYPE_NAMES, sent), self.format_rates(sent_rates)))
+            print("ReceivedInfo = {}".format(self.format_counts(RCVD_INFO_NAMES, rcvd_info)))
+            print("TxHoldCountThrottled = {}".format(tx_throttled))
+        except ValueError:
+            self.help_port_counters()
+
+    def help_port_counters(self):
+        print("Usage: port_counters <port>")
+        print("Prints the BPDUs received and sent by type with their rates, the received information")
+        print("by how it compares to the port's information, and the BPDUs delayed by TxHoldCount.")
+
+    def format_counts(self, names, counts):
+        return ", ".join("{} {}".format(name, count) for name, count in zip(names, counts))
+
+    def format_rates(self, rates):
+        return ", ".join("{:.1f}/s over {} s".format(rate, seconds) for rate, seconds in zip(rates, (1, 10, 60)))
+
+    # Subscription.
+    def do_watch(self, args):
+        # A subscribed connection can't make other requests, so watch on a connection of its own.
+        client = configuration_client.ConfigurationClient(self.address, self.port)
+        try:
+            result = client.subscribe()
+            if result[0] != configuration_client.STATUS_SUCCESS:
+                print("Failed to subscribe! ({})".format(self.fail_reason(result[0])))
+                return
+            sequence, bridge, ports = result[1]
+            print("DesignatedRoot = {}, RootPort = {}, TopologyChangeCount = {}".format(
+                bridge["designated_root"], bridge["root_port"], bridge["topology_change_count"]
+            ))
+            for port in ports:
+                print("Port {}: {}, {}".format(
+                    port["port_no"], self.format_port_state(port["state"]), PORT_ROLE_NAMES.get(port["role"], "Invalid!")
+                ))
+            previous = None
+            while True:
+                event = client.read_event()
+                if event[0] != sequence + 1:
+                    print("({} events coalesced)".format(event[0] - sequence - 1))
+                sequence = event[0]
+                elapsed = event[1] - previous if previous is not None else 0
+                previous = event[1]
+                print("#{} +{:.3f} s {}".format(sequence, elapsed, self.format_event(event)))
+        except KeyboardInterrupt:
+            print("")
+        finally:
+            client.close()
+
+    def help_watch(self):
+        print("Usage: watch")
+        print("Prints the port states and roles, the root bridge, the root port and the topology change count, and then")
+        print("each change with the time since the previous one, until interrupted with Ctrl-C.")
+
+    def format_event(self, event):
+        sequence, timestamp, kind, port_no, value = event
+        if kind == configuration_client.EVENT_PORT_STATE:
+            return "port {} State = {}".format(port_no, self.format_port_state(value))
+        elif kind == configuration_client.EVENT_PORT_ROLE:
+            return "port {} Role = {}".format(port_no, PORT_ROLE_NAMES.get(value, "Invalid!"))
+        elif kind == configuration_client.EVENT_ROOT_BRIDGE:
+            return "DesignatedRoot = {}".format(value)
+        elif kind == configuration_client.EVENT_ROOT_PORT:
+            return "RootPort = {}".format(value)
+        elif kind == configuration_client.EVENT_TOPOLOGY_CHANGE_COUNT:
+            return "TopologyChangeCount = {}".format(value)
+        return "unknown event {} = {}".format(kind, value)
+
     def print_get_result(self, name, result):
         if result[0] != configuration_client.STATUS_SUCCESS:
             print("Failed to get {}! ({})".format(name, self.fail_reason(result[0])))
@@ -380,6 +609,8 @@ class Cli(cmd.Cmd):
             return "Internal error"
         elif status == configuration_client.STATUS_INVALID_PARAMETER:
             return "Invalid parameter"
+        elif status == configuration_client.STATUS_NOT_WHOLE_SECONDS:
+            return "Not whole seconds, use the _ms command"
         else:
             return "Unknown reason ({})".format(status)
 
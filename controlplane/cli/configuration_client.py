@@ -1,9 +1,11 @@
 import socket
 import struct
+import time
 
 STATUS_SUCCESS = 0
 STATUS_ERROR = 1
 STATUS_INVALID_PARAMETER = 2
+STATUS_NOT_WHOLE_SECONDS = 3
 
 # Copy pasted from configuration_server.py
 # Bridge get requests.
@@ -47,195 +49,488 @@ SET_PORT_PATH_COST = 33
 SET_PORT_PRIORITY = 34
 SET_PORT_ADMIN_EDGE = 35
 SET_PORT_AUTO_EDGE = 36
+# Tick interval and sub-second hello time requests, with times in milliseconds.
+GET_TICK_INTERVAL = 37
+SET_TICK_INTERVAL = 38
+GET_BRIDGE_HELLO_TIME_MS = 39
+SET_BRIDGE_HELLO_TIME_MS = 40
+# Diagnostics requests.
+GET_JOURNAL = 41
+GET_CONVERGENCE_STATISTICS = 42
+RESET_CONVERGENCE_STATISTICS = 43
+GET_UNKNOWN_PORT_COUNTERS = 44
+# Port diagnostics requests.
+GET_PORT_COUNTERS = 45
+# Bulk requests.
+GET_SNAPSHOT = 46
+# Subscription requests.
+SUBSCRIBE = 47
+# Port role and framing requests.
+GET_PORT_ROLE = 48
+ECHO = 49
+GET_HELLO_TIME_MS = 50
+
+# Kinds of events, see rstp/events.py.
+EVENT_PORT_STATE = 0
+EVENT_PORT_ROLE = 1
+EVENT_ROOT_BRIDGE = 2
+EVENT_ROOT_PORT = 3
+EVENT_TOPOLOGY_CHANGE_COUNT = 4
+
+# Snapshot format, see configuration_server.py.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("!iiii")
+BRIDGE_SNAPSHOT = struct.Struct("!i17s ii i17s ii 3i 3i ii i")
+PORT_SNAPSHOT = struct.Struct("!6i i17s i i17s i 5? 3q 3q 5q q")
+EVENT = struct.Struct("!qdiii17s")
+
+# Structs of the responses.
+INTEGER = struct.Struct("!i")
+BOOLEAN = struct.Struct("!?")
+LONG = struct.Struct("!q")
+DOUBLE = struct.Struct("!d")
+MAC_STRING = struct.Struct("!17s")
+RATES = struct.Struct("!3d")
+
+class ConnectionClosed(Exception):
+    pass
+
+class ResponsesOutOfStep(Exception):
+    """The responses of a batch didn't end with the request ID sent after its requests."""
+    pass
 
 class ConfigurationClient:
-    def __init__(self, address, port):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((address, port))
+    """A client of the controller's configuration server.
+
+    Each request method sends its request and waits for the response. To save the round trips, batch() collects requests
+    which are then sent together and answered in order. With reconnect, requests which fail because the connection was
+    lost are sent again on a new connection, RECONNECT_ATTEMPTS times at most."""
+    RECONNECT_ATTEMPTS = 5
+    RECONNECT_DELAY = 0.5 # Seconds between attempts.
+    MAX_PIPELINED_BYTES = 64 * 1024 # Of requests sent before their responses are read, so the server never waits for us.
+
+    def __init__(self, address, port, reconnect=False):
+        self.address = address
+        self.port = port
+        self.reconnect = reconnect
+        self.socket = None
+        self.recording = None # The list requests are added to instead of being sent, while a batch adds one.
+        self.request_id = 0
+        try:
+            self._connect()
+        except socket.error:
+            # Reconnecting clients connect with the first request, which also retries.
+            if not reconnect:
+                raise
+            self.close()
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
 
-        self.receive_buffer = bytes()
+    def batch(self):
+        """Returns a Batch of requests to this client, e.g. client.batch().get_port_state(1).get_port_role(1).execute()."""
+        return Batch(self)
 
     # Get bridge configuration.
     def get_bridge_identifier(self):
-        self.socket.sendall(struct.pack("!i", GET_BRIDGE_IDENTIFIER))
-        return self._read_identifier_response()
+        return self._call(struct.pack("!i", GET_BRIDGE_IDENTIFIER), self._read_identifier_response)
 
     def get_time_since_topology_change(self):
-        self.socket.sendall(struct.pack("!i", GET_TIME_SINCE_TOPOLOGY_CHANGE))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_TIME_SINCE_TOPOLOGY_CHANGE), self._read_integer_response)
 
     def get_topology_change_count(self):
-        self.socket.sendall(struct.pack("!i", GET_TOPOLOGY_CHANGE_COUNT))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_TOPOLOGY_CHANGE_COUNT), self._read_integer_response)
 
     def get_designated_root(self):
-        self.socket.sendall(struct.pack("!i", GET_DESIGNATED_ROOT))
-        return self._read_identifier_response()
+        return self._call(struct.pack("!i", GET_DESIGNATED_ROOT), self._read_identifier_response)
 
     def get_root_path_cost(self):
-        self.socket.sendall(struct.pack("!i", GET_ROOT_PATH_COST))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_ROOT_PATH_COST), self._read_integer_response)
 
     def get_root_port(self):
-        self.socket.sendall(struct.pack("!i", GET_ROOT_PORT))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_ROOT_PORT), self._read_integer_response)
 
     def get_max_age(self):
-        self.socket.sendall(struct.pack("!i", GET_MAX_AGE))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_MAX_AGE), self._read_integer_response)
 
     def get_hello_time(self):
-        self.socket.sendall(struct.pack("!i", GET_HELLO_TIME))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_HELLO_TIME), self._read_integer_response)
 
     def get_forward_delay(self):
-        self.socket.sendall(struct.pack("!i", GET_FORWARD_DELAY))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_FORWARD_DELAY), self._read_integer_response)
 
     def get_bridge_max_age(self):
-        self.socket.sendall(struct.pack("!i", GET_BRIDGE_MAX_AGE))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_BRIDGE_MAX_AGE), self._read_integer_response)
 
     def get_bridge_hello_time(self):
-        self.socket.sendall(struct.pack("!i", GET_BRIDGE_HELLO_TIME))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_BRIDGE_HELLO_TIME), self._read_integer_response)
 
     def get_bridge_forward_delay(self):
-        self.socket.sendall(struct.pack("!i", GET_BRIDGE_FORWARD_DELAY))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_BRIDGE_FORWARD_DELAY), self._read_integer_response)
 
     def get_tx_hold_count(self):
-        self.socket.sendall(struct.pack("!i", GET_TX_HOLD_COUNT))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_TX_HOLD_COUNT), self._read_integer_response)
 
     def get_force_version(self):
-        self.socket.sendall(struct.pack("!i", GET_FORCE_VERSION))
-        return self._read_integer_response()
+        return self._call(struct.pack("!i", GET_FORCE_VERSION), self._read_integer_response)
 
     # Set bridge configuration.
     def set_bridge_max_age(self, value):
-        self.socket.sendall(struct.pack("!ii", SET_BRIDGE_MAX_AGE, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii", SET_BRIDGE_MAX_AGE, value), self._read_integer)
 
     def set_bridge_hello_time(self, value):
-        self.socket.sendall(struct.pack("!ii", SET_BRIDGE_HELLO_TIME, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii", SET_BRIDGE_HELLO_TIME, value), self._read_integer)
 
     def set_bridge_forward_delay(self, value):
-        self.socket.sendall(struct.pack("!ii", SET_BRIDGE_FORWARD_DELAY, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii", SET_BRIDGE_FORWARD_DELAY, value), self._read_integer)
 
     def set_bridge_priority(self, value):
-        self.socket.sendall(struct.pack("!ii", SET_BRIDGE_PRIORITY, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii", SET_BRIDGE_PRIORITY, value), self._read_integer)
 
     def set_force_version(self, value):
-        self.socket.sendall(struct.pack("!ii", SET_FORCE_VERSION, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii", SET_FORCE_VERSION, value), self._read_integer)
 
     def set_tx_hold_count(self, value):
-        self.socket.sendall(struct.pack("!ii", SET_TX_HOLD_COUNT, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii", SET_TX_HOLD_COUNT, value), self._read_integer)
+
+    # Tick interval and sub-second hello time.
+    def get_tick_interval(self):
+        return self._call(struct.pack("!i", GET_TICK_INTERVAL), self._read_integer_response)
+
+    def set_tick_interval(self, value):
+        return self._call(struct.pack("!ii", SET_TICK_INTERVAL, value), self._read_integer)
+
+    def get_hello_time_ms(self):
+        return self._call(struct.pack("!i", GET_HELLO_TIME_MS), self._read_integer_response)
+
+    def get_bridge_hello_time_ms(self):
+        return self._call(struct.pack("!i", GET_BRIDGE_HELLO_TIME_MS), self._read_integer_response)
+
+    def set_bridge_hello_time_ms(self, value):
+        return self._call(struct.pack("!ii", SET_BRIDGE_HELLO_TIME_MS, value), self._read_integer)
+
+    # Diagnostics.
+    def get_journal(self):
+        return self._call(struct.pack("!i", GET_JOURNAL), self._read_bytes_response)
+
+    def get_convergence_statistics(self):
+        return self._call(struct.pack("!i", GET_CONVERGENCE_STATISTICS), self._read_convergence_statistics_response)
+
+    def reset_convergence_statistics(self):
+        return self._call(struct.pack("!i", RESET_CONVERGENCE_STATISTICS), self._read_integer)
+
+    def get_unknown_port_counters(self):
+        return self._call(struct.pack("!i", GET_UNKNOWN_PORT_COUNTERS), self._read_unknown_port_counters_response)
 
     # Read port configuration.
     def get_port_uptime(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_UPTIME, port_no))
-        return self._read_integer_response()
+        return self._call(struct.pack("!ii", GET_PORT_UPTIME, port_no), self._read_integer_response)
 
     def get_port_state(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_STATE, port_no))
-        return self._read_integer_response()
+        return self._call(struct.pack("!ii", GET_PORT_STATE, port_no), self._read_integer_response)
 
     def get_port_identifier(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_IDENTIFIER, port_no))
-        return self._read_integer_response()
+        return self._call(struct.pack("!ii", GET_PORT_IDENTIFIER, port_no), self._read_integer_response)
 
     def get_port_path_cost(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_PATH_COST, port_no))
-        return self._read_integer_response()
+        return self._call(struct.pack("!ii", GET_PORT_PATH_COST, port_no), self._read_integer_response)
 
     def get_port_designated_root(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_DESIGNATED_ROOT, port_no))
-        return self._read_identifier_response()
+        return self._call(struct.pack("!ii", GET_PORT_DESIGNATED_ROOT, port_no), self._read_identifier_response)
 
     def get_port_designated_cost(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_DESIGNATED_COST, port_no))
-        return self._read_integer_response()
+        return self._call(struct.pack("!ii", GET_PORT_DESIGNATED_COST, port_no), self._read_integer_response)
 
     def get_port_designated_bridge(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_DESIGNATED_BRIDGE, port_no))
-        return self._read_identifier_response()
+        return self._call(struct.pack("!ii", GET_PORT_DESIGNATED_BRIDGE, port_no), self._read_identifier_response)
 
     def get_port_designated_port(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_DESIGNATED_PORT, port_no))
-        return self._read_integer_response()
+        return self._call(struct.pack("!ii", GET_PORT_DESIGNATED_PORT, port_no), self._read_integer_response)
 
     def get_port_topology_change_acknowledge(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_TOPOLOGY_CHANGE_ACKNOWLEDGE, port_no))
-        return self._read_boolean_response()
+        return self._call(struct.pack("!ii", GET_PORT_TOPOLOGY_CHANGE_ACKNOWLEDGE, port_no), self._read_boolean_response)
 
     def get_port_admin_edge(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_ADMIN_EDGE, port_no))
-        return self._read_boolean_response()
+        return self._call(struct.pack("!ii", GET_PORT_ADMIN_EDGE, port_no), self._read_boolean_response)
 
     def get_port_oper_edge(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_OPER_EDGE, port_no))
-        return self._read_boolean_response()
+        return self._call(struct.pack("!ii", GET_PORT_OPER_EDGE, port_no), self._read_boolean_response)
 
     def get_port_auto_edge(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_AUTO_EDGE, port_no))
-        return self._read_boolean_response()
+        return self._call(struct.pack("!ii", GET_PORT_AUTO_EDGE, port_no), self._read_boolean_response)
 
     def get_port_oper_point_to_point_mac(self, port_no):
-        self.socket.sendall(struct.pack("!ii", GET_PORT_OPER_POINT_TO_POINT_MAC, port_no))
-        return self._read_boolean_response()
+        return self._call(struct.pack("!ii", GET_PORT_OPER_POINT_TO_POINT_MAC, port_no), self._read_boolean_response)
+
+    def get_port_role(self, port_no):
+        return self._call(struct.pack("!ii", GET_PORT_ROLE, port_no), self._read_integer_response)
 
     # Set port configuration.
     def set_port_path_cost(self, port_no, value):
-        self.socket.sendall(struct.pack("!iii", SET_PORT_PATH_COST, port_no, value))
-        return self._read_integer()
+        return self._call(struct.pack("!iii", SET_PORT_PATH_COST, port_no, value), self._read_integer)
 
     def set_port_priority(self, port_no, value):
-        self.socket.sendall(struct.pack("!iii", SET_PORT_PRIORITY, port_no, value))
-        return self._read_integer()
+        return self._call(struct.pack("!iii", SET_PORT_PRIORITY, port_no, value), self._read_integer)
 
     def set_port_admin_edge(self, port_no, value):
-        self.socket.sendall(struct.pack("!ii?", SET_PORT_ADMIN_EDGE, port_no, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii?", SET_PORT_ADMIN_EDGE, port_no, value), self._read_integer)
 
     def set_port_auto_edge(self, port_no, value):
-        self.socket.sendall(struct.pack("!iii", SET_PORT_AUTO_EDGE, port_no, value))
-        return self._read_integer()
+        return self._call(struct.pack("!ii?", SET_PORT_AUTO_EDGE, port_no, value), self._read_integer)
+
+    # Port diagnostics.
+    def get_port_counters(self, port_no):
+        """Returns the BPDUs received and sent, each as a list of config, TCN and RSTP BPDUs, the received information
+        as a list of superior, repeated, inferior designated, inferior root or alternate and other information,
+        the BPDUs delayed by TxHoldCount, and the received and sent BPDUs per second over 1, 10 and 60 seconds."""
+        return self._call(struct.pack("!ii", GET_PORT_COUNTERS, port_no), self._read_port_counters_response)
+
+    # Bulk requests.
+    def get_snapshot(self):
+        """Returns the bridge and all its ports as read by the controller at one point in time. The bridge is a dict of
+        the values of the bridge get requests, and each port a dict of the values of the port get requests, its role and
+        its BPDU counters as returned by get_port_counters()."""
+        return self._call(struct.pack("!i", GET_SNAPSHOT), self._read_snapshot_response)
+
+    # Subscription.
+    def subscribe(self):
+        """Subscribes to the changes of the port states and roles, the root bridge, the root port and the topology change
+        count. Returns the sequence number of the last event before the subscription, and the bridge and ports as
+        returned by get_snapshot(). Afterwards the changes are read with read_event(), and the connection can't be used
+        for other requests."""
+        # The events follow the response, so the subscription can't be one of the requests of a batch.
+        if self.recording is not None:
+            raise Exception("Can't subscribe in a batch.")
+        return self._call(struct.pack("!i", SUBSCRIBE), self._read_subscription_response)
+
+    def read_event(self):
+        """Waits for the next event and returns it as a tuple of sequence number, time of the controller's monotonic clock
+        in seconds, kind, port number and value. The value of EVENT_ROOT_BRIDGE is a tuple of priority and mac address.
+        If this client reads too slowly, the controller only sends the latest event of each kind and port, and the
+        sequence numbers skip the ones left out."""
+        sequence, timestamp, kind, port_no, value, mac_string = self._read_struct(EVENT)
+        if kind == EVENT_ROOT_BRIDGE:
+            value = (value, mac_string)
+        return (sequence, timestamp, kind, port_no, value)
 
     # Socket helpers.
+    def _connect(self):
+        self.close()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect((self.address, self.port))
+
+        # Responses are parsed from the buffer at the offset, and the parsed bytes are only dropped when more are received.
+        self.receive_buffer = bytearray()
+        self.receive_offset = 0
+
+    def _call(self, request, read_response):
+        if self.recording is not None:
+            self.recording.append((request, read_response))
+            return None
+        return self._execute([(request, read_response)], False)[0]
+
+    def _execute(self, requests, check_request_id):
+        """Sends the requests, each a tuple of request bytes and the function reading its response, and returns the
+        responses. With check_request_id, an ECHO of a new request ID follows the requests, and its response is checked."""
+        if check_request_id:
+            requests = self._with_request_id(requests)
+
+        attempt = 0
+        while True:
+            try:
+                if self.socket is None:
+                    if not self.reconnect:
+                        raise ConnectionClosed()
+                    self._connect()
+                responses = self._send_requests(requests)
+                return responses[:-1] if check_request_id else responses
+            except (socket.error, ConnectionClosed):
+                self.close()
+                attempt += 1
+                if not self.reconnect or attempt > ConfigurationClient.RECONNECT_ATTEMPTS:
+                    raise
+                time.sleep(ConfigurationClient.RECONNECT_DELAY)
+
+    def _with_request_id(self, requests):
+        # Adds an ECHO of a new request ID, whose response raises ResponsesOutOfStep if it doesn't match.
+        self.request_id = (self.request_id + 1) & 0x7fffffff
+        request_id = self.request_id
+        def read_request_id():
+            status, echoed_id = self._read_integer_response()
+            if status != STATUS_SUCCESS or echoed_id != request_id:
+                self.close()
+                raise ResponsesOutOfStep()
+        return requests + [(struct.pack("!ii", ECHO, request_id), read_request_id)]
+
+    def _send_requests(self, requests):
+        # The requests go out in writes of up to MAX_PIPELINED_BYTES. The server stops reading while the responses it
+        # couldn't send yet pile up, so writing more before reading could wait forever.
+        responses = []
+        start = 0
+        while start < len(requests):
+            end = start + 1
+            size = len(requests[start][0])
+            while end < len(requests) and size + len(requests[end][0]) <= ConfigurationClient.MAX_PIPELINED_BYTES:
+                size += len(requests[end][0])
+                end += 1
+            self.socket.sendall(bytes().join(request for request, read_response in requests[start:end]))
+            for request, read_response in requests[start:end]:
+                responses.append(read_response())
+            start = end
+        return responses
+
+    def _read_snapshot(self):
+        version, bridge_size, port_size, port_count = self._read_struct(SNAPSHOT_HEADER)
+        # Version 1 had the times in seconds, so it can't be read with the version 2 records.
+        if version < SNAPSHOT_VERSION or bridge_size < BRIDGE_SNAPSHOT.size or port_size < PORT_SNAPSHOT.size:
+            self.close()
+            raise Exception("Unsupported snapshot version {}.".format(version))
+        values = self._read_record(BRIDGE_SNAPSHOT, bridge_size)
+        bridge = {
+            "bridge_identifier": (values[0], values[1]),
+            "time_since_topology_change": values[2],
+            "topology_change_count": values[3],
+            "designated_root": (values[4], values[5]),
+            "root_path_cost": values[6],
+            "root_port": values[7],
+            "max_age_ms": values[8],
+            "hello_time_ms": values[9],
+            "forward_delay_ms": values[10],
+            "bridge_max_age_ms": values[11],
+            "bridge_hello_time_ms": values[12],
+            "bridge_forward_delay_ms": values[13],
+            "tx_hold_count": values[14],
+            "force_version": values[15],
+            "tick_interval": values[16]
+        }
+        ports = []
+        for i in range(port_count):
+            values = self._read_record(PORT_SNAPSHOT, port_size)
+            ports.append({
+                "port_no": values[0],
+                "uptime": values[1],
+                "state": values[2],
+                "role": values[3],
+                "identifier": values[4],
+                "path_cost": values[5],
+                "designated_root": (values[6], values[7]),
+                "designated_cost": values[8],
+                "designated_bridge": (values[9], values[10]),
+                "designated_port": values[11],
+                "topology_change_acknowledge": values[12],
+                "admin_edge": values[13],
+                "oper_edge": values[14],
+                "auto_edge": values[15],
+                "oper_point_to_point_mac": values[16],
+                "received": list(values[17:20]),
+                "sent": list(values[20:23]),
+                "rcvd_info": list(values[23:28]),
+                "tx_throttled": values[28]
+            })
+        return (bridge, ports)
+
     def _read_socket(self):
-        received_bytes = self.socket.recv(1024)
-        if received_bytes is None:
-            self.socket.close()
-            raise Exception("Socket closed.")
+        # Drop the bytes which were read before appending, so the buffer only holds the unread bytes of one response.
+        del self.receive_buffer[:self.receive_offset]
+        self.receive_offset = 0
+        received_bytes = self.socket.recv(65536)
+        if not received_bytes:
+            self.close()
+            raise ConnectionClosed()
         self.receive_buffer += received_bytes
 
-    def _read_boolean(self):
-        while len(self.receive_buffer) < 1:
+    def _read_record(self, structure, size):
+        # Records of later versions may be longer, the fields this client doesn't know are skipped.
+        while len(self.receive_buffer) - self.receive_offset < size:
             self._read_socket()
-        value = struct.unpack("!?", self.receive_buffer[:1])[0]
-        self.receive_buffer = self.receive_buffer[1:]
-        return value
+        values = structure.unpack_from(self.receive_buffer, self.receive_offset)
+        self.receive_offset += size
+        return values
+
+    def _read_struct(self, structure):
+        return self._read_record(structure, structure.size)
+
+    def _read_boolean(self):
+        return self._read_struct(BOOLEAN)[0]
 
     def _read_integer(self):
-        while len(self.receive_buffer) < 4:
-            self._read_socket()
-        value = struct.unpack("!i", self.receive_buffer[:4])[0]
-        self.receive_buffer = self.receive_buffer[4:]
-        return value
+        return self._read_struct(INTEGER)[0]
 
     def _read_mac_string(self):
-        while len(self.receive_buffer) < 17:
+        return self._read_struct(MAC_STRING)[0]
+
+    def _read_bytes(self):
+        length = self._read_integer()
+        while len(self.receive_buffer) - self.receive_offset < length:
             self._read_socket()
-        value = struct.unpack("!17s", self.receive_buffer[:17])[0]
-        self.receive_buffer = self.receive_buffer[17:]
+        value = bytes(self.receive_buffer[self.receive_offset:self.receive_offset + length])
+        self.receive_offset += length
         return value
 
+    def _read_long(self):
+        return self._read_struct(LONG)[0]
+
+    def _read_double(self):
+        return self._read_struct(DOUBLE)[0]
+
+    def _read_rates(self):
+        """Returns the rates per second over the last 1, 10 and 60 seconds."""
+        return self._read_struct(RATES)
+
+    def _read_histogram(self):
+        """Returns a list of (upper bound, count) buckets, with None as the last bound, and the count, sum and maximum."""
+        buckets = []
+        for i in range(self._read_integer()):
+            bound = self._read_integer()
+            buckets.append((bound if bound >= 0 else None, self._read_integer()))
+        return (buckets, self._read_integer(), self._read_long(), self._read_integer())
+
+    def _read_convergence_statistics_response(self):
+        status = self._read_integer()
+
+        if status != STATUS_SUCCESS:
+            return (status, None)
+
+        converging = self._read_boolean()
+        timeouts = self._read_integer()
+        last_convergence = (self._read_integer(), self._read_integer(), self._read_integer())
+        if last_convergence[0] < 0:
+            last_convergence = None
+        return (status, (converging, timeouts, last_convergence, self._read_histogram(), self._read_histogram()))
+
+    def _read_unknown_port_counters_response(self):
+        status = self._read_integer()
+
+        if status != STATUS_SUCCESS:
+            return (status, None)
+
+        dropped = []
+        for i in range(self._read_integer()):
+            dropped.append((self._read_integer(), self._read_long()))
+        return (status, (dropped, self._read_rates()))
+
+    def _read_port_counters_response(self):
+        status = self._read_integer()
+
+        if status != STATUS_SUCCESS:
+            return (status, None)
+
+        received = [self._read_long() for i in range(3)]
+        sent = [self._read_long() for i in range(3)]
+        rcvd_info = [self._read_long() for i in range(5)]
+        tx_throttled = self._read_long()
+        return (status, (received, sent, rcvd_info, tx_throttled, self._read_rates(), self._read_rates()))
+
+    def _read_snapshot_response(self):
+        status = self._read_integer()
+
+        if status != STATUS_SUCCESS:
+            return (status, None)
+
+        return (status, self._read_snapshot())
+
     def _read_integer_response(self):
         status = self._read_integer()
 
@@ -260,4 +555,84 @@ class ConfigurationClient:
 
         prio = self._read_integer()
         mac_string = self._read_mac_string()
-        return (status, (prio, mac_string))
\ No newline at end of file
+        return (status, (prio, mac_string))
+
+    def _read_subscription_response(self):
+        status = self._read_integer()
+
+        if status != STATUS_SUCCESS:
+            return (status, None)
+
+        sequence = self._read_long()
+        bridge, ports = self._read_snapshot()
+        return (status, (sequence, bridge, ports))
+
+    def _read_bytes_response(self):
+        status = self._read_integer()
+
+        if status != STATUS_SUCCESS:
+            return (status, None)
+
+        return (status, self._read_bytes())
+
+class Batch:
+    """Requests to a ConfigurationClient which are sent together, made with ConfigurationClient.batch(). Calling a get,
+    set or reset method of the client on the batch adds the request and returns the batch, and execute() sends them in
+    one write and returns the responses in the order the requests were added. An ECHO of a new request ID is sent after
+    the requests, so responses which got out of step with the requests are detected rather than returned."""
+    def __init__(self, client):
+        self.client = client
+        self.requests = [] # Tuples of request bytes and the function reading the response.
+
+    def __getattr__(self, name):
+        if not name.startswith(("get_", "set_", "reset_")):
+            raise AttributeError(name)
+        method = getattr(self.client, name)
+        def add_request(*args):
+            self.client.recording = self.requests
+            try:
+                method(*args)
+            finally:
+                self.client.recording = None
+            return self
+        return add_request
+
+    def execute(self):
+        return self.client._execute(self.requests, True)
+
+def execute_batches(batches):
+    """Executes batches of different clients, e.g. one for each controller of a network. All batches are written before
+    any response is read, so the round trips to the controllers overlap. Returns the responses of each batch."""
+    pending = []
+    for batch in batches:
+        client = batch.client
+        requests = client._with_request_id(batch.requests)
+        size = sum(len(request) for request, read_response in requests)
+        written = False
+        if client.socket is not None and size <= ConfigurationClient.MAX_PIPELINED_BYTES:
+            try:
+                client.socket.sendall(bytes().join(request for request, read_response in requests))
+                written = True
+            except socket.error:
+                client.close()
+        pending.append((batch, requests, written))
+
+    results = []
+    try:
+        for batch, requests, written in pending:
+            if written:
+                try:
+                    results.append([read_response() for request, read_response in requests][:-1])
+                    continue
+                except (socket.error, ConnectionClosed):
+                    batch.client.close()
+                    if not batch.client.reconnect:
+                        raise
+            # Batches which couldn't be written ahead, or lost their connection, are executed on their own.
+            results.append(batch.execute())
+    except Exception:
+        # The responses of the remaining batches weren't read, so their connections are out of step.
+        for batch, requests, written in pending[len(results):]:
+            batch.client.close()
+        raise
+    return results
@@ -0,0 +1,80 @@
+import json
+import struct
+import sys
+from datetime import datetime
+
+# Record kinds, see rstp/journal.py.
+EMPTY = 0
+TRANSITION = 1
+BPDU_RECEIVED = 2
+BPDU_SENT = 3
+SET_PORT_STATE = 4
+FLUSH_MAC_ENTRIES = 5
+
+NO_PORT = 0xFFFF
+NO_STATE = 0xFF
+
+# Dump header, keep in sync with rstp/journal.py. The records are read with the format stored in the dump.
+DUMP_MAGIC = b"RSTJ"
+DUMP_VERSION = 2
+DUMP_HEADER = struct.Struct("<4sHHIIddI")
+
+BPDU_TYPE_NAMES = {0x00: "Config", 0x02: "RSTP", 0x80: "TCN"}
+SWITCH_STP_STATE_NAMES = {0: "none", 1: "disabled", 2: "learning", 3: "forwarding", 4: "blocking"}
+
+def bridge_id_string(bridge_id):
+    return "{:04x}.{:012x}".format(bridge_id >> 48, bridge_id & 0xFFFFFFFFFFFF)
+
+def decode(data):
+    """Turns a journal dump into a list of timeline lines, oldest first."""
+    magic, version, record_size, capacity, next_sequence, dump_monotonic, dump_time, names_length = DUMP_HEADER.unpack_from(data, 0)
+    if magic != DUMP_MAGIC or version != DUMP_VERSION:
+        raise ValueError("Not a journal dump of a supported version.")
+    offset = DUMP_HEADER.size
+    names = json.loads(data[offset:offset + names_length].decode("utf-8"))
+    machines = names["machines"]
+    record_struct = struct.Struct(str(names["record"]))
+    if record_struct.size != record_size:
+        raise ValueError(
+            "Journal dump has records of {} bytes, but their format has {}.".format(record_size, record_struct.size)
+        )
+    offset += names_length
+
+    records = []
+    for slot in range(capacity):
+        record = record_struct.unpack_from(data, offset + slot * record_size)
+        if record[3] != EMPTY:
+            records.append(record)
+    # Sequence numbers wrap at 32 bits, so order by distance from the newest one.
+    records.sort(key=lambda record: -((next_sequence - 1 - record[0]) & 0xFFFFFFFF))
+
+    lines = []
+    first_timestamp = records[0][1] if records else 0
+    for sequence, timestamp, port_no, kind, a, b, c, d, e, f in records:
+        wall_time = datetime.fromtimestamp(dump_time - (dump_monotonic - timestamp)).strftime("%H:%M:%S.%f")
+        port = "bridge" if port_no == NO_PORT else "port {}".format(port_no)
+        if kind == TRANSITION:
+            machine = machines[a]
+            old_state = "none" if b == NO_STATE else machine["states"][b]
+            event = "{} {} -> {} on {}".format(machine["name"], old_state, machine["states"][c], machine["guards"][d])
+        elif kind == BPDU_RECEIVED or kind == BPDU_SENT:
+            event = "{} {} BPDU".format("Received" if kind == BPDU_RECEIVED else "Sent", BPDU_TYPE_NAMES.get(a, hex(a)))
+            if a != 0x80:
+                event += " flags=0x{:02x} root={} cost={} port=0x{:04x}".format(b, bridge_id_string(e), f, d)
+        elif kind == SET_PORT_STATE:
+            event = "switch_set_port_state {} ({:.3f} ms)".format(SWITCH_STP_STATE_NAMES.get(a, a), f / 1000.0)
+        elif kind == FLUSH_MAC_ENTRIES:
+            event = "switch_flush_mac_entries ({:.3f} ms)".format(f / 1000.0)
+        else:
+            event = "Unknown record kind {}".format(kind)
+        lines.append("{} +{:.6f} {}: {}".format(wall_time, timestamp - first_timestamp, port, event))
+    return lines
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: journal_decoder.py <journal dump>")
+        exit()
+    with open(sys.argv[1], "rb") as dump_file:
+        data = dump_file.read()
+    for line in decode(data):
+        print(line)
@@ -0,0 +1,85 @@
+import struct
+
+BYTE = struct.Struct("!B")
+SHORT = struct.Struct("!H")
+INT = struct.Struct("!I")
+BRIDGE_ID = struct.Struct("!Q")
+
+# Field offsets from the start of the BPDU.
+VERSION_OFFSET = 2
+TYPE_OFFSET = 3
+FLAGS_OFFSET = 4
+ROOT_ID_OFFSET = 5
+PATH_COST_OFFSET = 13
+BRIDGE_ID_OFFSET = 17
+PORT_ID_OFFSET = 25
+AGE_OFFSET = 27
+MAX_AGE_OFFSET = 29
+HELLO_TIME_OFFSET = 31
+FORWARD_DELAY_OFFSET = 33
+CONFIG_BPDU_SIZE = 35
+
+MAC_MASK = 0xFFFFFFFFFFFF
+
+def _byte_field(offset):
+    def get(self):
+        return BYTE.unpack_from(self.frame, self.offset + offset)[0]
+    return property(get)
+
+def _short_field(offset):
+    def get(self):
+        return SHORT.unpack_from(self.frame, self.offset + offset)[0]
+    return property(get)
+
+def _int_field(offset):
+    def get(self):
+        return INT.unpack_from(self.frame, self.offset + offset)[0]
+    return property(get)
+
+def _bridge_id_field(offset):
+    def get(self):
+        return BRIDGE_ID.unpack_from(self.frame, self.offset + offset)[0]
+    return property(get)
+
+def _mac_field(bridge_id_offset):
+    # The mac address is the lower 48 bits of the 64 bit bridge identifier.
+    def get(self):
+        return BRIDGE_ID.unpack_from(self.frame, self.offset + bridge_id_offset)[0] & MAC_MASK
+    return property(get)
+
+def _time_field(offset):
+    # Times are sent in units of 1/256 seconds.
+    def get(self):
+        return SHORT.unpack_from(self.frame, self.offset + offset)[0] / 256.0
+    return property(get)
+
+class Bpdu(object):
+    """A received BPDU, which decodes its fields from the frame bytes only when they are read.
+    Has the same field names as scapy's STP layer, except that mac addresses are integers,
+    and also gives the bridge identifiers as 64 bit integers."""
+    __slots__ = ("frame", "offset")
+
+    def __init__(self, frame, offset):
+        # Topology change notification BPDUs end after the type, so read the other fields as zeros.
+        missing = offset + CONFIG_BPDU_SIZE - len(frame)
+        if missing > 0:
+            frame = frame + b"\x00" * missing
+        self.frame = frame
+        self.offset = offset
+
+    proto = _short_field(0)
+    version = _byte_field(VERSION_OFFSET)
+    bpdutype = _byte_field(TYPE_OFFSET)
+    bpduflags = _byte_field(FLAGS_OFFSET)
+    rootid = _short_field(ROOT_ID_OFFSET)
+    rootmac = _mac_field(ROOT_ID_OFFSET)
+    rootbridgeid = _bridge_id_field(ROOT_ID_OFFSET)
+    pathcost = _int_field(PATH_COST_OFFSET)
+    bridgeid = _short_field(BRIDGE_ID_OFFSET)
+    bridgemac = _mac_field(BRIDGE_ID_OFFSET)
+    designatedbridgeid = _bridge_id_field(BRIDGE_ID_OFFSET)
+    portid = _short_field(PORT_ID_OFFSET)
+    age = _time_field(AGE_OFFSET)
+    maxage = _time_field(MAX_AGE_OFFSET)
+    hellotime = _time_field(HELLO_TIME_OFFSET)
+    fwddelay = _time_field(FORWARD_DELAY_OFFSET)
@@ -1,12 +1,20 @@
+from collections import deque
+import errno
+import fcntl
+import os
+import select
 import socket
 from threading import Thread
 import struct
 import traceback
+from timer import monotonic
 import rstp.rstp_configuration as rstp_configuration
+import rstp.events as events
 
 STATUS_SUCCESS = 0
 STATUS_ERROR = 1
 STATUS_INVALID_PARAMETER = 2
+STATUS_NOT_WHOLE_SECONDS = 3 # A time in seconds has a fraction, so it can only be read with the _MS request.
 
 # Bridge get requests.
 GET_BRIDGE_IDENTIFIER = 0
@@ -49,217 +57,466 @@ SET_PORT_PATH_COST = 33
 SET_PORT_PRIORITY = 34
 SET_PORT_ADMIN_EDGE = 35
 SET_PORT_AUTO_EDGE = 36
+# Tick interval and sub-second hello time requests, with times in milliseconds.
+GET_TICK_INTERVAL = 37
+SET_TICK_INTERVAL = 38
+GET_BRIDGE_HELLO_TIME_MS = 39
+SET_BRIDGE_HELLO_TIME_MS = 40
+# Diagnostics requests.
+GET_JOURNAL = 41
+GET_CONVERGENCE_STATISTICS = 42
+RESET_CONVERGENCE_STATISTICS = 43
+GET_UNKNOWN_PORT_COUNTERS = 44
+# Port diagnostics requests.
+GET_PORT_COUNTERS = 45
+# Bulk requests.
+GET_SNAPSHOT = 46
+# Subscription requests.
+SUBSCRIBE = 47
+# Port role and framing requests.
+GET_PORT_ROLE = 48
+ECHO = 49 # Answers with its argument, so clients can check that the responses are in step with their requests.
+# Sub-second root hello time request, in milliseconds. GET_HELLO_TIME and GET_BRIDGE_HELLO_TIME fail with
+# STATUS_NOT_WHOLE_SECONDS for sub-second hello times.
+GET_HELLO_TIME_MS = 50
+
+# Structs of the requests and responses.
+OPCODE = struct.Struct("!i")
+INTEGER = struct.Struct("!i")
+BOOLEAN = struct.Struct("!?")
+IDENTIFIER = struct.Struct("!i17s")
+PORT = struct.Struct("!i")
+PORT_AND_INTEGER = struct.Struct("!ii")
+PORT_AND_BOOLEAN = struct.Struct("!i?")
+RATES = struct.Struct("!3d")
+UNKNOWN_PORT_DROPPED = struct.Struct("!iq")
+PORT_COUNTERS = struct.Struct("!3q 3q 5q q")
+
+# A snapshot starts with its version, the sizes of the bridge and port records and the number of ports, followed by the
+# bridge record and the port records. Later versions append fields to the records, so readers skip what they don't
+# know. Version 2 has the root and bridge times in milliseconds instead of seconds.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("!iiii")
+# Identifier, time since topology change, topology change count, designated root, root path cost, root port, root
+# times and bridge times in milliseconds (max age, hello time, forward delay), tx hold count, force version, tick
+# interval.
+BRIDGE_SNAPSHOT = struct.Struct("!i17s ii i17s ii 3i 3i ii i")
+# Port number, uptime, state, role, identifier, path cost, designated root, designated cost, designated bridge,
+# designated port, topology change acknowledge, admin edge, oper edge, auto edge, oper point to point MAC, counters.
+PORT_SNAPSHOT = struct.Struct("!6i i17s i i17s i 5? 3q 3q 5q q")
+
+# SUBSCRIBE is answered with the sequence number of the last event before the subscription and a snapshot, followed by
+# one record per event: sequence number, monotonic time in seconds, kind and port number as in rstp/events.py, and the
+# value. The root bridge event has the priority as value and the mac address after it, other events an empty string.
+SEQUENCE = struct.Struct("!q")
+EVENT = struct.Struct("!qdiii17s")
+
+RESPONSE_SUCCESS = INTEGER.pack(STATUS_SUCCESS)
+RESPONSE_ERROR = INTEGER.pack(STATUS_ERROR)
+RESPONSE_INVALID_PARAMETER = INTEGER.pack(STATUS_INVALID_PARAMETER)
+RESPONSE_NOT_WHOLE_SECONDS = INTEGER.pack(STATUS_NOT_WHOLE_SECONDS)
+
+class NotWholeSeconds(Exception):
+    pass
+
+def _pack_identifier(bridge_id):
+    return IDENTIFIER.pack(bridge_id[0], bridge_id[1])
+
+def _pack_whole_seconds(seconds):
+    # Hello times can be fractional, which an integer of seconds would truncate.
+    if seconds != int(seconds):
+        raise NotWholeSeconds()
+    return INTEGER.pack(int(seconds))
+
+def _pack_bytes(value):
+    return INTEGER.pack(len(value)) + value
+
+def _pack_histogram(histogram):
+    # Bucket count, then the upper bound and count of each bucket, with -1 as the bound of the last one.
+    bounds, counts, count, total, maximum = histogram
+    data = [struct.pack("!i", len(counts))]
+    for bound, bucket_count in zip(list(bounds) + [-1], counts):
+        data.append(struct.pack("!ii", bound, bucket_count))
+    data.append(struct.pack("!iqi", count, total, maximum))
+    return bytes().join(data)
+
+def _pack_convergence_statistics(statistics):
+    converging, timeouts, last_convergence, convergence_times, iterations = statistics
+    if last_convergence is None:
+        last_convergence = (-1, 0, 0)
+    return (
+        struct.pack("!?i", converging, timeouts) +
+        struct.pack("!iii", *last_convergence) +
+        _pack_histogram(convergence_times) +
+        _pack_histogram(iterations)
+    )
+
+def _pack_unknown_port_counters(unknown_port_counters):
+    dropped, rates = unknown_port_counters
+    data = [INTEGER.pack(len(dropped))]
+    for port_no, count in dropped:
+        data.append(UNKNOWN_PORT_DROPPED.pack(port_no, count))
+    data.append(RATES.pack(*rates))
+    return bytes().join(data)
+
+def _pack_port_counters(port_counters):
+    received, sent, rcvd_info, tx_throttled, received_rates, sent_rates = port_counters
+    return (
+        PORT_COUNTERS.pack(*(list(received) + list(sent) + list(rcvd_info) + [tx_throttled])) +
+        RATES.pack(*received_rates) +
+        RATES.pack(*sent_rates)
+    )
+
+def _pack_snapshot(snapshot):
+    bridge, ports = snapshot
+    data = [SNAPSHOT_HEADER.pack(SNAPSHOT_VERSION, BRIDGE_SNAPSHOT.size, PORT_SNAPSHOT.size, len(ports))]
+    data.append(BRIDGE_SNAPSHOT.pack(
+        bridge["bridge_identifier"][0], bridge["bridge_identifier"][1],
+        int(bridge["time_since_topology_change"]),
+        bridge["topology_change_count"],
+        bridge["designated_root"][0], bridge["designated_root"][1],
+        bridge["root_path_cost"],
+        bridge["root_port"],
+        bridge["max_age_ms"], bridge["hello_time_ms"], bridge["forward_delay_ms"],
+        bridge["bridge_max_age_ms"], bridge["bridge_hello_time_ms"], bridge["bridge_forward_delay_ms"],
+        bridge["tx_hold_count"],
+        bridge["force_version"],
+        bridge["tick_interval"]
+    ))
+    for port in ports:
+        data.append(PORT_SNAPSHOT.pack(*(
+            [
+                port["port_no"], int(port["uptime"]), port["state"], port["role"], port["identifier"], port["path_cost"],
+                port["designated_root"][0], port["designated_root"][1],
+                port["designated_cost"],
+                port["designated_bridge"][0], port["designated_bridge"][1],
+                port["designated_port"],
+                port["topology_change_acknowledge"], port["admin_edge"], port["oper_edge"], port["auto_edge"],
+                port["oper_point_to_point_mac"]
+            ] +
+            list(port["received"]) + list(port["sent"]) + list(port["rcvd_info"]) + [port["tx_throttled"]]
+        )))
+    return bytes().join(data)
+
+def _pack_event(event):
+    sequence, timestamp, kind, port_no, value = event
+    if kind == events.ROOT_BRIDGE:
+        return EVENT.pack(sequence, timestamp, kind, port_no, value[0], value[1])
+    return EVENT.pack(sequence, timestamp, kind, port_no, value, bytes())
+
+class Request:
+    """An entry of the request table: the struct of the arguments following the opcode or None, the name of the
+    RstpConfiguration method handling the request, and the function packing its result into the response or None."""
+    def __init__(self, arguments, method, pack_response):
+        self.arguments = arguments
+        self.method = method
+        self.pack_response = pack_response
+
+REQUESTS = {
+    # Bridge get requests.
+    GET_BRIDGE_IDENTIFIER: Request(None, "get_bridge_identifier", _pack_identifier),
+    GET_TIME_SINCE_TOPOLOGY_CHANGE: Request(None, "get_time_since_topology_change", INTEGER.pack),
+    GET_TOPOLOGY_CHANGE_COUNT: Request(None, "get_topology_change_count", INTEGER.pack),
+    GET_DESIGNATED_ROOT: Request(None, "get_designated_root", _pack_identifier),
+    GET_ROOT_PATH_COST: Request(None, "get_root_path_cost", INTEGER.pack),
+    GET_ROOT_PORT: Request(None, "get_root_port", INTEGER.pack),
+    GET_MAX_AGE: Request(None, "get_max_age", INTEGER.pack),
+    GET_HELLO_TIME: Request(None, "get_hello_time", _pack_whole_seconds),
+    GET_FORWARD_DELAY: Request(None, "get_forward_delay", INTEGER.pack),
+    GET_BRIDGE_MAX_AGE: Request(None, "get_bridge_max_age", INTEGER.pack),
+    GET_BRIDGE_HELLO_TIME: Request(None, "get_bridge_hello_time", _pack_whole_seconds),
+    GET_BRIDGE_FORWARD_DELAY: Request(None, "get_bridge_forward_delay", INTEGER.pack),
+    GET_TX_HOLD_COUNT: Request(None, "get_tx_hold_count", INTEGER.pack),
+    GET_FORCE_VERSION: Request(None, "get_force_version", INTEGER.pack),
+    # Bridge set requests.
+    SET_BRIDGE_MAX_AGE: Request(INTEGER, "set_bridge_max_age", None),
+    SET_BRIDGE_HELLO_TIME: Request(INTEGER, "set_bridge_hello_time", None),
+    SET_BRIDGE_FORWARD_DELAY: Request(INTEGER, "set_bridge_forward_delay", None),
+    SET_BRIDGE_PRIORITY: Request(INTEGER, "set_bridge_priority", None),
+    SET_FORCE_VERSION: Request(INTEGER, "set_force_version", None),
+    SET_TX_HOLD_COUNT: Request(INTEGER, "set_tx_hold_count", None),
+    # Port get requests.
+    GET_PORT_UPTIME: Request(PORT, "get_port_uptime", INTEGER.pack),
+    GET_PORT_STATE: Request(PORT, "get_port_state", INTEGER.pack),
+    GET_PORT_IDENTIFIER: Request(PORT, "get_port_identifier", INTEGER.pack),
+    GET_PORT_PATH_COST: Request(PORT, "get_port_path_cost", INTEGER.pack),
+    GET_PORT_DESIGNATED_ROOT: Request(PORT, "get_port_designated_root", _pack_identifier),
+    GET_PORT_DESIGNATED_COST: Request(PORT, "get_port_designated_cost", INTEGER.pack),
+    GET_PORT_DESIGNATED_BRIDGE: Request(PORT, "get_port_designated_bridge", _pack_identifier),
+    GET_PORT_DESIGNATED_PORT: Request(PORT, "get_port_designated_port", INTEGER.pack),
+    GET_PORT_TOPOLOGY_CHANGE_ACKNOWLEDGE: Request(PORT, "get_port_topology_change_acknowledge", BOOLEAN.pack),
+    GET_PORT_ADMIN_EDGE: Request(PORT, "get_port_admin_edge", BOOLEAN.pack),
+    GET_PORT_OPER_EDGE: Request(PORT, "get_port_oper_edge", BOOLEAN.pack),
+    GET_PORT_AUTO_EDGE: Request(PORT, "get_port_auto_edge", BOOLEAN.pack),
+    GET_PORT_OPER_POINT_TO_POINT_MAC: Request(PORT, "get_port_oper_point_to_point_mac", BOOLEAN.pack),
+    # Port set requests.
+    SET_PORT_PATH_COST: Request(PORT_AND_INTEGER, "set_port_path_cost", None),
+    SET_PORT_PRIORITY: Request(PORT_AND_INTEGER, "set_port_priority", None),
+    SET_PORT_ADMIN_EDGE: Request(PORT_AND_BOOLEAN, "set_port_admin_edge", None),
+    SET_PORT_AUTO_EDGE: Request(PORT_AND_BOOLEAN, "set_port_auto_edge", None),
+    # Tick interval and sub-second hello time requests.
+    GET_TICK_INTERVAL: Request(None, "get_tick_interval", INTEGER.pack),
+    SET_TICK_INTERVAL: Request(INTEGER, "set_tick_interval", None),
+    GET_BRIDGE_HELLO_TIME_MS: Request(None, "get_bridge_hello_time_ms", INTEGER.pack),
+    SET_BRIDGE_HELLO_TIME_MS: Request(INTEGER, "set_bridge_hello_time_ms", None),
+    # Diagnostics requests.
+    GET_JOURNAL: Request(None, "get_journal", _pack_bytes),
+    GET_CONVERGENCE_STATISTICS: Request(None, "get_convergence_statistics", _pack_convergence_statistics),
+    RESET_CONVERGENCE_STATISTICS: Request(None, "reset_convergence_statistics", None),
+    GET_UNKNOWN_PORT_COUNTERS: Request(None, "get_unknown_port_counters", _pack_unknown_port_counters),
+    # Port diagnostics requests.
+    GET_PORT_COUNTERS: Request(PORT, "get_port_counters", _pack_port_counters),
+    # Bulk requests.
+    GET_SNAPSHOT: Request(None, "get_snapshot", _pack_snapshot),
+    # Port role and framing requests.
+    GET_PORT_ROLE: Request(PORT, "get_port_role", INTEGER.pack),
+    ECHO: Request(INTEGER, "echo", INTEGER.pack),
+    # Sub-second root hello time request.
+    GET_HELLO_TIME_MS: Request(None, "get_hello_time_ms", INTEGER.pack)
+}
+
+class Connection:
+    """The state of one client connection of the ConfigurationServer."""
+    def __init__(self, socket, deadline):
+        self.socket = socket
+        self.receive_buffer = bytearray() # Received bytes of requests which aren't complete yet.
+        self.send_buffer = bytearray() # Responses which weren't sent yet.
+        self.deadline = deadline # Closed when idle until then.
+        # After SUBSCRIBE, the sequence number of the last event queued to be sent, otherwise None.
+        self.subscription_sequence = None
+        self.pending_events = {} # Events of a slow subscriber by kind and port number, only the latest of each.
 
 class ConfigurationServer:
-    """A TCP configuration server for the controller. Can be connected to with the cli."""
+    """A TCP configuration server for the controller. Can be connected to with the cli.
+    A single thread serves all connections with non-blocking sockets and select(). Requests are handled in the order
+    they arrive, and the responses are sent as the clients read them. A client which doesn't read its responses isn't
+    read from until it does, so it can't make the server buffer without bound.
+
+    A connection which sent SUBSCRIBE only streams events from then on, see rstp/events.py. The events are queued by the
+    thread running the state machines, which wakes the serving thread through a pipe. When a subscriber doesn't read
+    its events fast enough, the events waiting for it are coalesced to the latest of each kind and port, so the
+    subscriber sees the sequence numbers skip, but always ends up with the current values."""
+    MAX_CONNECTIONS = 32
+    IDLE_TIMEOUT = 300.0 # Seconds a connection may stay without sending a request or reading a response.
+    MAX_SEND_BUFFER = 256 * 1024 # Bytes of unsent responses above which a connection isn't read from.
+    MAX_EVENT_BUFFER = 64 * 1024 # Bytes of unsent events above which the events of a subscriber are coalesced.
+    RECEIVE_SIZE = 4096
+
     def __init__(self, rstp_configuration, port):
         self.rstp_configuration = rstp_configuration
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket.settimeout(1.0)
+        self.socket.setblocking(0)
         self.socket.bind(("", port))
-        self.socket.listen(2)
+        self.socket.listen(16)
+        # stop() and published events wake the thread from select() through this pipe.
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        fcntl.fcntl(self.wakeup_write, fcntl.F_SETFL, fcntl.fcntl(self.wakeup_write, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.connections = {} # Connection by socket, only used by the serving thread.
+        self.published_events = deque() # Appended by the thread running the state machines.
+        self.subscribers = 0
         print("Configuration server listening on port {}".format(port))
 
     def start(self):
         self.should_run = True
-        self.listen_thread = Thread(target=self._listen)
-        self.listen_thread.daemon = True
-        self.listen_thread.start()
+        self.serve_thread = Thread(target=self._serve)
+        self.serve_thread.daemon = True
+        self.serve_thread.start()
 
     def stop(self):
         self.should_run = False
-        self.listen_thread.join()
+        self._wake()
+        self.serve_thread.join()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
 
-    def _listen(self):
-        threads = []
+    def _serve(self):
         while self.should_run:
+            readable = [self.wakeup_read]
+            if len(self.connections) < ConfigurationServer.MAX_CONNECTIONS:
+                readable.append(self.socket)
+            writable = []
+            for connection in self.connections.values():
+                if len(connection.send_buffer) <= ConfigurationServer.MAX_SEND_BUFFER:
+                    readable.append(connection.socket)
+                if connection.send_buffer:
+                    writable.append(connection.socket)
+            # Subscribers stay connected while idle.
+            deadlines = [
+                connection.deadline for connection in self.connections.values() if connection.subscription_sequence is None
+            ]
+            timeout = max(0, min(deadlines) - monotonic()) if deadlines else None
             try:
-                socket, address = self.socket.accept()
-                thread = Thread(target=self._client_thread, args=(socket, address))
-                thread.daemon = True
-                threads.append(thread)
-                thread.start()
-            except Exception as e:
-                pass
+                readable, writable, _ = select.select(readable, writable, [], timeout)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            now = monotonic()
+            for ready_socket in readable:
+                if ready_socket is self.wakeup_read:
+                    os.read(self.wakeup_read, 4096)
+                    self._send_published_events()
+                elif ready_socket is self.socket:
+                    self._accept(now)
+                elif ready_socket in self.connections:
+                    self._read(self.connections[ready_socket], now)
+            for ready_socket in writable:
+                if ready_socket in self.connections:
+                    self._write(self.connections[ready_socket], now)
+            for connection in list(self.connections.values()):
+                if connection.subscription_sequence is None and connection.deadline <= now:
+                    self._close(connection)
 
+        for connection in list(self.connections.values()):
+            self._close(connection)
         self.socket.close()
-        for thread in threads:
-            thread.join()
 
-    def _client_thread(self, socket, address):
-        socket.settimeout(1.0)
-        current_buffer = bytes()
-        while self.should_run:
-            try:
-                received_bytes = socket.recv(1024)
-                if not received_bytes:
-                    break
-                current_buffer += received_bytes
-                handled_bytes = self._handle_requests(socket, current_buffer)
-                if handled_bytes < 0:
-                    break
-                current_buffer = current_buffer[handled_bytes:]
-            except Exception as e:
-                pass
-
-        socket.close()
-
-    def _handle_requests(self, socket, buffer):
-        handled_bytes = 0
-        request_start_index = 0
-        i = 0
-        full_response = bytes()
-        while True:
-            if (len(buffer) - i) < 4:
+    def _accept(self, now):
+        try:
+            client_socket, address = self.socket.accept()
+        except socket.error:
+            return
+        client_socket.setblocking(0)
+        self.connections[client_socket] = Connection(client_socket, now + ConfigurationServer.IDLE_TIMEOUT)
+
+    def _read(self, connection, now):
+        try:
+            received_bytes = connection.socket.recv(ConfigurationServer.RECEIVE_SIZE)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self._close(connection)
+            return
+        if not received_bytes:
+            self._close(connection)
+            return
+
+        connection.deadline = now + ConfigurationServer.IDLE_TIMEOUT
+        if connection.subscription_sequence is not None:
+            # Subscribers can't make requests, what they send is ignored.
+            return
+        connection.receive_buffer += received_bytes
+        if self._handle_connection_requests(connection):
+            # Most responses fit into the socket buffer, so try to send them before waiting for select().
+            self._write(connection, now)
+
+    def _handle_connection_requests(self, connection):
+        # Requests are only handled while the responses fit into the send buffer. The rest wait until the client
+        # read enough of the responses. Returns False if the connection was closed.
+        space = ConfigurationServer.MAX_SEND_BUFFER - len(connection.send_buffer)
+        if space <= 0 or not connection.receive_buffer or connection.subscription_sequence is not None:
+            return True
+        handled_bytes, response = self._handle_requests(connection, connection.receive_buffer, space)
+        if handled_bytes < 0:
+            self._close(connection)
+            return False
+        del connection.receive_buffer[:handled_bytes]
+        connection.send_buffer += response
+        return True
+
+    def _write(self, connection, now):
+        if not connection.send_buffer:
+            return
+        try:
+            sent = connection.socket.send(connection.send_buffer)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self._close(connection)
+            return
+        del connection.send_buffer[:sent]
+        connection.deadline = now + ConfigurationServer.IDLE_TIMEOUT
+        if connection.subscription_sequence is None:
+            self._handle_connection_requests(connection)
+        elif connection.pending_events and len(connection.send_buffer) < ConfigurationServer.MAX_EVENT_BUFFER:
+            pending_events = sorted(connection.pending_events.values())
+            connection.pending_events = {}
+            for event in pending_events:
+                connection.send_buffer += _pack_event(event)
+
+    def _close(self, connection):
+        if self.connections.pop(connection.socket, None) is not None:
+            connection.socket.close()
+            if connection.subscription_sequence is not None:
+                self.subscribers -= 1
+                if self.subscribers == 0:
+                    self.rstp_configuration.unsubscribe(self._events_published)
+
+    def _wake(self):
+        try:
+            os.write(self.wakeup_write, b"\0")
+        except OSError as e:
+            # The pipe is full, so the thread is woken anyway.
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def _subscribe(self, connection):
+        try:
+            sequence, snapshot = self.rstp_configuration.subscribe(self._events_published)
+        except Exception:
+            traceback.print_exc()
+            return RESPONSE_ERROR
+        connection.subscription_sequence = sequence
+        self.subscribers += 1
+        return RESPONSE_SUCCESS + SEQUENCE.pack(sequence) + _pack_snapshot(snapshot)
+
+    def _events_published(self, published_events):
+        # Called by the thread running the state machines, while it holds the callback lock.
+        self.published_events.extend(published_events)
+        self._wake()
+
+    def _send_published_events(self):
+        while self.published_events:
+            event = self.published_events.popleft()
+            for connection in self.connections.values():
+                if connection.subscription_sequence is None or event[0] <= connection.subscription_sequence:
+                    continue
+                connection.subscription_sequence = event[0]
+                if connection.pending_events or len(connection.send_buffer) >= ConfigurationServer.MAX_EVENT_BUFFER:
+                    connection.pending_events[(event[2], event[3])] = event
+                else:
+                    connection.send_buffer += _pack_event(event)
+
+    def _handle_requests(self, connection, buffer, response_limit):
+        """Handles the complete requests at the start of buffer, a bytearray, until the responses reach response_limit
+        bytes or the connection subscribes. Returns the number of bytes handled, or -1 if the connection should be
+        closed, and the responses."""
+        offset = 0
+        responses = []
+        response_size = 0
+        while response_size < response_limit and len(buffer) - offset >= OPCODE.size:
+            opcode = OPCODE.unpack_from(buffer, offset)[0]
+            if opcode == SUBSCRIBE:
+                offset += OPCODE.size
+                responses.append(self._subscribe(connection))
                 break
-            request = struct.unpack("!i", buffer[i:i+4])[0]
-            i += 4
+            request = REQUESTS.get(opcode)
+            if request is None:
+                return -1, bytes()
+            arguments = ()
+            end = offset + OPCODE.size
+            if request.arguments is not None:
+                if len(buffer) - end < request.arguments.size:
+                    break
+                arguments = request.arguments.unpack_from(buffer, end)
+                end += request.arguments.size
+            offset = end
 
-            response = bytes()
             try:
-                # Bridge get requests.
-                if request == GET_BRIDGE_IDENTIFIER:
-                    bridge_id = self.rstp_configuration.get_bridge_identifier()
-                    response += struct.pack("!i17s", bridge_id[0], bridge_id[1])
-                elif request == GET_TIME_SINCE_TOPOLOGY_CHANGE:
-                    response += struct.pack("!i", self.rstp_configuration.get_time_since_topology_change())
-                elif request == GET_TOPOLOGY_CHANGE_COUNT:
-                    response += struct.pack("!i", self.rstp_configuration.get_topology_change_count())
-                elif request == GET_DESIGNATED_ROOT:
-                    bridge_id = self.rstp_configuration.get_designated_root()
-                    response += struct.pack("!i17s", bridge_id[0], bridge_id[1])
-                elif request == GET_ROOT_PATH_COST:
-                    response += struct.pack("!i", self.rstp_configuration.get_root_path_cost())
-                elif request == GET_ROOT_PORT:
-                    response += struct.pack("!i", self.rstp_configuration.get_root_port())
-                elif request == GET_MAX_AGE:
-                    response += struct.pack("!i", self.rstp_configuration.get_max_age())
-                elif request == GET_HELLO_TIME:
-                    response += struct.pack("!i", self.rstp_configuration.get_hello_time())
-                elif request == GET_FORWARD_DELAY:
-                    response += struct.pack("!i", self.rstp_configuration.get_forward_delay())
-                elif request == GET_BRIDGE_MAX_AGE:
-                    response += struct.pack("!i", self.rstp_configuration.get_bridge_max_age())
-                elif request == GET_BRIDGE_HELLO_TIME:
-                    response += struct.pack("!i", self.rstp_configuration.get_bridge_hello_time())
-                elif request == GET_BRIDGE_FORWARD_DELAY:
-                    response += struct.pack("!i", self.rstp_configuration.get_bridge_forward_delay())
-                elif request == GET_TX_HOLD_COUNT:
-                    response += struct.pack("!i", self.rstp_configuration.get_tx_hold_count())
-                elif request == GET_FORCE_VERSION:
-                    response += struct.pack("!i", self.rstp_configuration.get_force_version())
-                # Bridge set requests.
-                elif request == SET_BRIDGE_MAX_AGE:
-                    if (len(buffer) - i) < 4:
-                        break
-                    value = struct.unpack("!i", buffer[i:i+4])[0]
-                    i += 4
-                    self.rstp_configuration.set_bridge_max_age(value)
-                elif request == SET_BRIDGE_HELLO_TIME:
-                    if (len(buffer) - i) < 4:
-                        break
-                    value = struct.unpack("!i", buffer[i:i+4])[0]
-                    i += 4
-                    self.rstp_configuration.set_bridge_hello_time(value)
-                elif request == SET_BRIDGE_FORWARD_DELAY:
-                    if (len(buffer) - i) < 4:
-                        break
-                    value = struct.unpack("!i", buffer[i:i+4])[0]
-                    i += 4
-                    self.rstp_configuration.set_bridge_forward_delay(value)
-                elif request == SET_BRIDGE_PRIORITY:
-                    if (len(buffer) - i) < 4:
-                        break
-                    value = struct.unpack("!i", buffer[i:i+4])[0]
-                    i += 4
-                    self.rstp_configuration.set_bridge_priority(value)
-                elif request == SET_FORCE_VERSION:
-                    if (len(buffer) - i) < 4:
-                        break
-                    value = struct.unpack("!i", buffer[i:i+4])[0]
-                    i += 4
-                    self.rstp_configuration.set_force_version(value)
-                elif request == SET_TX_HOLD_COUNT:
-                    if (len(buffer) - i) < 4:
-                        break
-                    value = struct.unpack("!i", buffer[i:i+4])[0]
-                    i += 4
-                    self.rstp_configuration.set_tx_hold_count(value)
-                # Port get requests.
-                else:
-                    if (len(buffer) - i) < 4:
-                        break
-                    port_no = struct.unpack("!i", buffer[i:i+4])[0]
-                    i += 4
-
-                    if request == GET_PORT_UPTIME:
-                        response += struct.pack("!i", self.rstp_configuration.get_port_uptime(port_no))
-                    elif request == GET_PORT_STATE:
-                        response += struct.pack("!i", self.rstp_configuration.get_port_state(port_no))
-                    elif request == GET_PORT_IDENTIFIER:
-                        response += struct.pack("!i", self.rstp_configuration.get_port_identifier(port_no))
-                    elif request == GET_PORT_PATH_COST:
-                        response += struct.pack("!i", self.rstp_configuration.get_port_path_cost(port_no))
-                    elif request == GET_PORT_DESIGNATED_ROOT:
-                        bridge_id = self.rstp_configuration.get_port_designated_root(port_no)
-                        response += struct.pack("!i17s", bridge_id[0], bridge_id[1])
-                    elif request == GET_PORT_DESIGNATED_COST:
-                        response += struct.pack("!i", self.rstp_configuration.get_port_designated_cost(port_no))
-                    elif request == GET_PORT_DESIGNATED_BRIDGE:
-                        bridge_id = self.rstp_configuration.get_port_designated_bridge(port_no)
-                        response += struct.pack("!i17s", bridge_id[0], bridge_id[1])
-                    elif request == GET_PORT_DESIGNATED_PORT:
-                        response += struct.pack("!i", self.rstp_configuration.get_port_designated_port(port_no))
-                    elif request == GET_PORT_TOPOLOGY_CHANGE_ACKNOWLEDGE:
-                        response += struct.pack("!?", self.rstp_configuration.get_port_topology_change_acknowledge(port_no))
-                    elif request == GET_PORT_ADMIN_EDGE:
-                        response += struct.pack("!?", self.rstp_configuration.get_port_admin_edge(port_no))
-                    elif request == GET_PORT_OPER_EDGE:
-                        response += struct.pack("!?", self.rstp_configuration.get_port_oper_edge(port_no))
-                    elif request == GET_PORT_AUTO_EDGE:
-                        response += struct.pack("!?", self.rstp_configuration.get_port_auto_edge(port_no))
-                    elif request == GET_PORT_OPER_POINT_TO_POINT_MAC:
-                        response += struct.pack("!?", self.rstp_configuration.get_port_oper_point_to_point_mac(port_no))
-                    # Port set requests.
-                    elif request == SET_PORT_PATH_COST:
-                        if (len(buffer) - i) < 4:
-                            break
-                        value = struct.unpack("!i", buffer[i:i+4])[0]
-                        i += 4
-                        self.rstp_configuration.set_port_path_cost(port_no, value)
-                    elif request == SET_PORT_PRIORITY:
-                        if (len(buffer) - i) < 4:
-                            break
-                        value = struct.unpack("!i", buffer[i:i+4])[0]
-                        i += 4
-                        self.rstp_configuration.set_port_priority(port_no, value)
-                    elif request == SET_PORT_ADMIN_EDGE:
-                        if (len(buffer) - i) < 1:
-                            break
-                        value = struct.unpack("!?", buffer[i:i+1])[0]
-                        i += 1
-                        self.rstp_configuration.set_port_admin_edge(port_no, value)
-                    elif request == SET_PORT_AUTO_EDGE:
-                        if (len(buffer) - i) < 1:
-                            break
-                        value = struct.unpack("!?", buffer[i:i+1])[0]
-                        i += 1
-                        self.rstp_configuration.set_port_auto_edge(port_no, value)
-                    else:
-                        return -1
-                # Success.
-                full_response += struct.pack("!i", STATUS_SUCCESS) + response
+                result = getattr(self.rstp_configuration, request.method)(*arguments)
+                response = RESPONSE_SUCCESS
+                if request.pack_response is not None:
+                    response += request.pack_response(result)
             except rstp_configuration.InvalidParameter:
-                full_response += struct.pack("!i", STATUS_INVALID_PARAMETER)
+                response = RESPONSE_INVALID_PARAMETER
+            except NotWholeSeconds:
+                response = RESPONSE_NOT_WHOLE_SECONDS
             except Exception:
                 traceback.print_exc()
-                full_response += struct.pack("!i", STATUS_ERROR)
-
-            handled_bytes += (i - request_start_index)
-            request_start_index = i
-
-        if len(full_response) > 0:
-            socket.sendall(full_response)
+                response = RESPONSE_ERROR
+            responses.append(response)
+            response_size += len(response)
 
-        return handled_bytes
+        return offset, bytes().join(responses)
@@ -14,9 +14,13 @@ from thrift.protocol import TBinaryProtocol
 
 from options import Options
 from packet_io import PacketIo
+from raw_packet_io import RawPacketIo
 from rstp.rstp_handler import RstpHandler
 from configuration_server import ConfigurationServer
+from metrics_server import MetricsServer
 from rstp.rstp_configuration import RstpConfiguration
+from rstp.tracing import tracer
+from rstp.switch_api_proxy import SwitchApiProxy
 
 device = 0
 from port_info import PortInfo
@@ -28,19 +32,24 @@ class Controller:
         self.mac = self.options.mac
         self.cpu_interface = self.options.cpu_interface
         self.config_port = self.options.config_port
+        self.metrics_port = self.options.metrics_port
         self.rstp = True if self.options.stp_version == Options.VERSION_RSTP else False
         self.bridge_prio = self.options.bridge_prio
 
+        self.trace_log = open(self.options.trace_log, "a") if self.options.trace_log else None
+        tracer.configure(self.options.trace, self.options.trace_port_nos, self.trace_log)
+        tracer.start()
+
         self.transport = TSocket.TSocket("localhost", self.options.rpc_port)
         self.transport = TTransport.TBufferedTransport(self.transport)
         self.protocol = TBinaryProtocol.TBinaryProtocol(self.transport)
 
-        self.client = switch_api_rpc.Client(self.protocol)
+        # All SwitchAPI calls, including the ones in setup() and teardown(), go through the proxy to be measured.
+        self.client = SwitchApiProxy(switch_api_rpc.Client(self.protocol), self.options.slow_switch_call)
         self.transport.open()
 
-    def handle_packet_in(self, packet, in_port):
-        if STP in packet:
-            self.rstp_handler.bpdu_received_callback(packet, in_port)
+    def handle_packet_in(self, bpdu, in_port):
+        self.rstp_handler.bpdu_received_callback(bpdu, in_port)
 
     def setup(self):
         self.client.switcht_api_init(device)
@@ -65,8 +74,11 @@ class Controller:
         )
         self.client.switcht_api_hostif_reason_code_create(device, stp_rcode_info)
 
-        self.packet_io = PacketIo(self.cpu_interface, self.mac, self.handle_packet_in)
-        self.rstp_handler = RstpHandler(self.client, self.packet_io, self.vlan, self.port_infos, self.bridge_prio, self.mac, self.rstp)
+        if self.options.packet_io == Options.PACKET_IO_RAW:
+            self.packet_io = RawPacketIo(self.cpu_interface, self.mac, self.handle_packet_in)
+        else:
+            self.packet_io = PacketIo(self.cpu_interface, self.mac, self.handle_packet_in)
+        self.rstp_handler = RstpHandler(self.client, self.packet_io, self.vlan, self.port_infos, self.bridge_prio, self.mac, self.rstp, self.options.tick_interval)
         self.rstp_configuration = RstpConfiguration(self.rstp_handler)
 
     def teardown(self):
@@ -80,6 +92,10 @@ class Controller:
             self.client.switcht_api_interface_delete(device, port_info.interface)
         self.client.switcht_api_vlan_delete(device, self.vlan)
 
+        tracer.stop()
+        if self.trace_log:
+            self.trace_log.close()
+
     def run(self):
         if not self.rstp_handler.initialize():
             return
@@ -88,6 +104,9 @@ class Controller:
         if self.config_port:
             config_server = ConfigurationServer(self.rstp_configuration, self.config_port)
             config_server.start()
+        if self.metrics_port:
+            metrics_server = MetricsServer(self.rstp_configuration, self.metrics_port)
+            metrics_server.start()
 
         signal.signal(signal.SIGTERM, self.stop)
         signal.signal(signal.SIGINT, self.stop)
@@ -97,6 +116,8 @@ class Controller:
 
         if self.config_port:
             config_server.stop()
+        if self.metrics_port:
+            metrics_server.stop()
 
     def stop(self, signum=None, frame=None):
         self.should_run = False
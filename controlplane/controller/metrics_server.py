@@ -0,0 +1,267 @@
+import errno
+import select
+import socket
+from threading import Thread
+import traceback
+from timer import monotonic
+import rstp.rstp_util as rstp_util
+from rstp.counters import BPDU_TYPES, RCVD_INFOS
+
+PORT_STATE_NAMES = {
+    rstp_util.PORT_STATE_DISCARDING: "discarding",
+    rstp_util.PORT_STATE_LEARNING: "learning",
+    rstp_util.PORT_STATE_FORWARDING: "forwarding"
+}
+PORT_ROLE_NAMES = {
+    rstp_util.DISABLED_PORT: "disabled",
+    rstp_util.DESIGNATED_PORT: "designated",
+    rstp_util.ROOT_PORT: "root",
+    rstp_util.ALTERNATE_PORT: "alternate",
+    rstp_util.BACKUP_PORT: "backup"
+}
+BPDU_TYPE_NAMES = {
+    rstp_util.BPDU_TYPE_CONFIGURATION: "config",
+    rstp_util.BPDU_TYPE_TOPOLOGY_CHANGE_NOTIFICATION: "tcn",
+    rstp_util.BPDU_TYPE_RSTP: "rstp"
+}
+RCVD_INFO_NAMES = {
+    rstp_util.SUPERIOR_DESIGNATED_INFO: "superior_designated",
+    rstp_util.REPEATED_DESIGNATED_INFO: "repeated_designated",
+    rstp_util.INFERIOR_DESIGNATED_INFO: "inferior_designated",
+    rstp_util.INFERIOR_ROOT_ALTERNATE_INFO: "inferior_root_alternate",
+    rstp_util.OTHER_INFO: "other"
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class MetricsServer:
+    """An HTTP server exposing the controller metrics in the Prometheus text format on /metrics.
+    A single thread serves all connections with non-blocking sockets and select(). Each scrape copies the metrics
+    with one acquisition of the callback lock, and formats and sends them after releasing it."""
+    MAX_REQUEST_SIZE = 8192 # Bytes of request line and headers.
+    CONNECTION_TIMEOUT = 10.0 # Seconds a connection may take to send its request and read the response.
+    MAX_CONNECTIONS = 64
+
+    def __init__(self, rstp_configuration, port):
+        self.rstp_configuration = rstp_configuration
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.setblocking(0)
+        self.socket.bind(("", port))
+        self.socket.listen(16)
+        print("Metrics server listening on port {}".format(port))
+
+    def start(self):
+        self.should_run = True
+        self.serve_thread = Thread(target=self._serve)
+        self.serve_thread.daemon = True
+        self.serve_thread.start()
+
+    def stop(self):
+        self.should_run = False
+        self.serve_thread.join()
+
+    def _serve(self):
+        # Connections by socket, as [request bytes, response bytes or None, deadline].
+        connections = {}
+        while self.should_run:
+            readable = [self.socket] if len(connections) < MetricsServer.MAX_CONNECTIONS else []
+            writable = []
+            for connection, (request, response, deadline) in connections.items():
+                if response is None:
+                    readable.append(connection)
+                else:
+                    writable.append(connection)
+            try:
+                readable, writable, _ = select.select(readable, writable, [], 1.0)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            now = monotonic()
+            for connection in readable:
+                if connection is self.socket:
+                    self._accept(connections, now)
+                else:
+                    self._read(connections, connection)
+            for connection in writable:
+                if connection in connections:
+                    self._write(connections, connection)
+            for connection in list(connections):
+                if connections[connection][2] < now:
+                    self._close(connections, connection)
+
+        for connection in list(connections):
+            self._close(connections, connection)
+        self.socket.close()
+
+    def _accept(self, connections, now):
+        try:
+            connection, address = self.socket.accept()
+        except socket.error:
+            return
+        connection.setblocking(0)
+        connections[connection] = [bytes(), None, now + MetricsServer.CONNECTION_TIMEOUT]
+
+    def _read(self, connections, connection):
+        try:
+            received_bytes = connection.recv(4096)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self._close(connections, connection)
+            return
+        if not received_bytes:
+            self._close(connections, connection)
+            return
+
+        state = connections[connection]
+        state[0] += received_bytes
+        header_end = state[0].find(b"\r\n\r\n")
+        if header_end < 0:
+            if len(state[0]) > MetricsServer.MAX_REQUEST_SIZE:
+                state[1] = self._response("431 Request Header Fields Too Large", "")
+            return
+        request_line = state[0][:state[0].find(b"\r\n")].decode("latin-1").split()
+        if len(request_line) != 3 or request_line[0] != "GET":
+            state[1] = self._response("405 Method Not Allowed", "")
+        elif request_line[1].split("?")[0] != "/metrics":
+            state[1] = self._response("404 Not Found", "")
+        else:
+            try:
+                state[1] = self._response("200 OK", format_metrics(self.rstp_configuration.get_metrics()))
+            except Exception:
+                traceback.print_exc()
+                state[1] = self._response("500 Internal Server Error", "")
+
+    def _write(self, connections, connection):
+        state = connections[connection]
+        try:
+            sent = connection.send(state[1])
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self._close(connections, connection)
+            return
+        state[1] = state[1][sent:]
+        if not state[1]:
+            self._close(connections, connection)
+
+    def _close(self, connections, connection):
+        del connections[connection]
+        connection.close()
+
+    def _response(self, status, body):
+        body = body.encode("utf-8")
+        header = "HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+            status, CONTENT_TYPE, len(body)
+        )
+        return header.encode("latin-1") + body
+
+def format_metrics(metrics):
+    """Formats a copy of the metrics from RstpConfiguration.get_metrics() in the Prometheus text format."""
+    lines = []
+    def family(name, metric_type, help_text):
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} {}".format(name, metric_type))
+    def sample(name, labels, value):
+        if labels:
+            label_text = ",".join('{}="{}"'.format(key, label_value) for key, label_value in labels)
+            lines.append("{}{{{}}} {}".format(name, label_text, value))
+        else:
+            lines.append("{} {}".format(name, value))
+
+    ports = metrics["ports"]
+    family("rstp_port_state", "gauge", "1 for the current state of the port, 0 for the others.")
+    for port in ports:
+        for state, state_name in sorted(PORT_STATE_NAMES.items()):
+            sample("rstp_port_state", (("port", port["port_no"]), ("state", state_name)), int(port["state"] == state))
+    family("rstp_port_role", "gauge", "1 for the current role of the port, 0 for the others.")
+    for port in ports:
+        for role, role_name in sorted(PORT_ROLE_NAMES.items()):
+            sample("rstp_port_role", (("port", port["port_no"]), ("role", role_name)), int(port["role"] == role))
+
+    family("rstp_topology_changes_total", "counter", "Topology changes since the controller started.")
+    sample("rstp_topology_changes_total", (), metrics["topology_change_count"])
+    if metrics["time_since_topology_change"] >= 0:
+        family("rstp_time_since_topology_change_seconds", "gauge", "Time since the last topology change.")
+        sample("rstp_time_since_topology_change_seconds", (), metrics["time_since_topology_change"])
+
+    family("rstp_bpdus_received_total", "counter", "BPDUs received, by type.")
+    for port in ports:
+        for bpdu_type in BPDU_TYPES:
+            labels = (("port", port["port_no"]), ("type", BPDU_TYPE_NAMES[bpdu_type]))
+            sample("rstp_bpdus_received_total", labels, port["received"][bpdu_type])
+    family("rstp_bpdus_sent_total", "counter", "BPDUs sent, by type.")
+    for port in ports:
+        for bpdu_type in BPDU_TYPES:
+            labels = (("port", port["port_no"]), ("type", BPDU_TYPE_NAMES[bpdu_type]))
+            sample("rstp_bpdus_sent_total", labels, port["sent"][bpdu_type])
+    family("rstp_received_info_total", "counter", "Received information, by how it compares to the port's information.")
+    for port in ports:
+        for rcvd_info in RCVD_INFOS:
+            labels = (("port", port["port_no"]), ("info", RCVD_INFO_NAMES[rcvd_info]))
+            sample("rstp_received_info_total", labels, port["rcvd_info"][rcvd_info])
+    family("rstp_bpdus_tx_hold_throttled_total", "counter", "BPDUs which waited because txCount reached TxHoldCount.")
+    for port in ports:
+        sample("rstp_bpdus_tx_hold_throttled_total", (("port", port["port_no"]),), port["tx_throttled"])
+    family("rstp_bpdu_batches_total", "counter", "Batches of BPDUs sent together, by number of BPDUs.")
+    for size, count in metrics["bpdu_batch_sizes"]:
+        sample("rstp_bpdu_batches_total", (("size", size),), count)
+    family("rstp_bpdu_frames_sent_total", "counter", "Frames sent out of the CPU interface.")
+    sample("rstp_bpdu_frames_sent_total", (), metrics["bpdu_frames_sent"])
+    family("rstp_bpdu_send_calls_total", "counter", "System calls made to send the frames.")
+    sample("rstp_bpdu_send_calls_total", (), metrics["bpdu_send_calls"])
+    family("rstp_bpdus_dropped_total", "counter", "BPDUs dropped because they were received on a port which isn't an RSTP port.")
+    for port_no, count in metrics["unknown_port_dropped"]:
+        sample("rstp_bpdus_dropped_total", (("port", port_no),), count)
+
+    family("rstp_update_duration_seconds", "histogram", "Duration of the state machine updates.")
+    _histogram_samples(sample, "rstp_update_duration_seconds", (), metrics["update_durations"])
+    family("rstp_update_machine_evaluations", "histogram", "State machine evaluations of each state machine update.")
+    _histogram_samples(sample, "rstp_update_machine_evaluations", (), metrics["machine_evaluations"])
+    family("rstp_callback_lock_wait_seconds", "histogram", "Time spent waiting to acquire the callback lock.")
+    _histogram_samples(sample, "rstp_callback_lock_wait_seconds", (), metrics["lock_wait_times"])
+
+    family("rstp_hardware_batches_total", "counter", "Batches of port states and flushes programmed into the switch.")
+    sample("rstp_hardware_batches_total", (), metrics["hardware_batches"])
+    family("rstp_hardware_superseded_states_total", "counter", "Port states replaced by a later state before they were programmed.")
+    sample("rstp_hardware_superseded_states_total", (), metrics["hardware_superseded_states"])
+    family("rstp_hardware_merged_flushes_total", "counter", "Flushes merged into a flush which was still pending.")
+    sample("rstp_hardware_merged_flushes_total", (), metrics["hardware_merged_flushes"])
+    family("rstp_flush_requests_total", "counter", "Port flushes requested by the state machines, once per batch.")
+    sample("rstp_flush_requests_total", (), metrics["flushes_requested"])
+    family("rstp_flush_requests_deferred_total", "counter", "Port flushes deferred because the port was flushed just before.")
+    sample("rstp_flush_requests_deferred_total", (), metrics["flushes_deferred"])
+    family("rstp_flush_requests_merged_deferred_total", "counter", "Port flushes merged into a deferred flush.")
+    sample("rstp_flush_requests_merged_deferred_total", (), metrics["flushes_merged_deferred"])
+    family("rstp_flushes_total", "counter", "MAC table flushes made, by scope.")
+    sample("rstp_flushes_total", (("scope", "port"),), metrics["port_flushes"])
+    sample("rstp_flushes_total", (("scope", "vlan"),), metrics["vlan_flushes"])
+    switch_api = sorted(metrics["switch_api"].items())
+    family("rstp_switch_api_call_duration_seconds", "histogram", "Duration of the SwitchAPI calls, by method.")
+    for method, statistics in switch_api:
+        _histogram_samples(sample, "rstp_switch_api_call_duration_seconds", (("method", method),), statistics["durations"])
+    family("rstp_switch_api_exceptions_total", "counter", "SwitchAPI calls which raised an exception, by method.")
+    for method, statistics in switch_api:
+        sample("rstp_switch_api_exceptions_total", (("method", method),), statistics["exceptions"])
+    family(
+        "rstp_switch_api_slow_calls_under_lock_total", "counter",
+        "SwitchAPI calls made while holding the callback lock which took longer than the slow call threshold, by method."
+    )
+    for method, statistics in switch_api:
+        sample("rstp_switch_api_slow_calls_under_lock_total", (("method", method),), statistics["slow_calls_under_lock"])
+
+    return "\n".join(lines) + "\n"
+
+def _histogram_samples(sample, name, labels, histogram):
+    # Prometheus buckets are cumulative.
+    bounds, counts, count, total, maximum = histogram
+    cumulative = 0
+    for bound, bucket_count in zip(bounds, counts):
+        cumulative += bucket_count
+        sample(name + "_bucket", labels + (("le", repr(float(bound))),), cumulative)
+    sample(name + "_bucket", labels + (("le", "+Inf"),), count)
+    sample(name + "_sum", labels, repr(float(total)))
+    sample(name + "_count", labels, count)
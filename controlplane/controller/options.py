@@ -1,9 +1,12 @@
 import argparse
+from rstp.tracing import CATEGORIES, PORT_STATE
 
 class Options:
     """Parsing of command line arguments."""
     VERSION_RSTP = 0
     VERSION_STP = 1
+    PACKET_IO_RAW = 0
+    PACKET_IO_SCAPY = 1
 
     def __init__(self):
         parser = argparse.ArgumentParser()
@@ -14,7 +17,25 @@ class Options:
         parser.add_argument("--cpu-interface", action="store", required=True, help="The interface that is connected to the CPU port of the switch.")
         parser.add_argument("--stp-version", action="store", default="rstp", choices=["stp", "rstp"], help="Which version of stp to use. Default: rstp")
         parser.add_argument("--config-port", action="store", type=int, required=False, help="If present, this port can be used to configure the switch using the CLI.")
+        parser.add_argument("--metrics-port", action="store", type=int, required=False, help="If present, metrics are served on this port over HTTP at /metrics in the Prometheus text format.")
+        parser.add_argument("--slow-switch-call-ms", action="store", type=float, default=10, help="SwitchAPI calls made while holding the callback lock which take longer than this are reported. Default: 10")
+        parser.add_argument("--packet-io", action="store", default="raw", choices=["raw", "scapy"], help="How BPDUs are received from the CPU interface. Default: raw")
+        parser.add_argument("--tick-interval", action="store", type=int, default=1000, help="Interval of the rstp timer ticks in milliseconds. Must divide 1000. Default: 1000")
+        parser.add_argument("--trace", action="store", default=PORT_STATE, help="Comma separated list of what to trace: the names of the state machines, e.g. PortRoleTransitions, {} for the learning and forwarding state of the ports, all or none. Default: {}".format(PORT_STATE, PORT_STATE))
+        parser.add_argument("--trace-port-no", action="append", type=int, help="Use multiple times to only trace these ports. Default: all ports")
+        parser.add_argument("--trace-log", action="store", help="File the trace is appended to. Default: stdout")
         arguments = parser.parse_args()
+        if arguments.tick_interval <= 0 or 1000 % arguments.tick_interval != 0:
+            parser.error("--tick-interval must divide 1000")
+        if arguments.trace == "all":
+            trace = list(CATEGORIES)
+        elif arguments.trace == "none":
+            trace = []
+        else:
+            trace = arguments.trace.split(",")
+            for category in trace:
+                if category not in CATEGORIES:
+                    parser.error("--trace: unknown category {}, expected one of {}".format(category, ", ".join(CATEGORIES)))
 
         self.port_nos = arguments.port_no
         self.rpc_port = arguments.api_rpc_port
@@ -22,4 +43,11 @@ class Options:
         self.bridge_prio = arguments.bridge_prio
         self.cpu_interface = arguments.cpu_interface
         self.config_port = arguments.config_port
-        self.stp_version = Options.VERSION_RSTP if arguments.stp_version == "rstp" else Options.VERSION_STP
\ No newline at end of file
+        self.metrics_port = arguments.metrics_port
+        self.stp_version = Options.VERSION_RSTP if arguments.stp_version == "rstp" else Options.VERSION_STP
+        self.packet_io = Options.PACKET_IO_RAW if arguments.packet_io == "raw" else Options.PACKET_IO_SCAPY
+        self.tick_interval = arguments.tick_interval
+        self.slow_switch_call = arguments.slow_switch_call_ms / 1000.0
+        self.trace = trace
+        self.trace_port_nos = arguments.trace_port_no
+        self.trace_log = arguments.trace_log
\ No newline at end of file
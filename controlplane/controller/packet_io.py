@@ -1,6 +1,9 @@
 import threading
 from scapy.all import *
 
+from bpdu import Bpdu
+from rstp import rstp_util
+
 EHTER_TYPE_CPU = 0x9000
 
 class FabricHeader(Packet):
@@ -35,7 +38,8 @@ class FabricPayloadHeader(Packet):
     fields_desc = [XShortField("ether_type", 0)]
 
 class PacketIo:
-    """Handles packet incoming on the CPU port, and allows sending packets out of the switch."""
+    """Handles packet incoming on the CPU port, and allows sending packets out of the switch.
+    packet_in_callback is called with each received BPDU and the switch port it arrived on."""
     BPDU_SIZE = 0x26
     RSTP_BPDU_SIZE = 0x27
     def __init__(self, cpu_interface, self_mac, packet_in_callback):
@@ -43,6 +47,13 @@ class PacketIo:
         self.mac = self_mac
         self.packet_in_callback = packet_in_callback
 
+        # Batching of sent BPDUs.
+        self.batch_depth = 0
+        self.batch = []
+        self.batch_sizes = {} # Number of flushed batches for each batch size.
+        self.send_calls = 0
+        self.frames_sent = 0
+
         bind_layers(Ether, FabricHeader, type=EHTER_TYPE_CPU)
         bind_layers(FabricHeader, FabricCpuHeader, packet_type=0x05)
         bind_layers(FabricCpuHeader, FabricPayloadHeader)
@@ -59,19 +70,51 @@ class PacketIo:
         packet_raw = str(packet)
         new_packet_raw = packet_raw[0:12] + packet_raw[30:]
         new_packet = Ether(new_packet_raw)
-        self.packet_in_callback(new_packet, packet.ingress_port)
+        if STP in new_packet:
+            self.packet_in_callback(Bpdu(str(new_packet[STP]), 0), packet.ingress_port)
 
     def _cpu_port_sniffing(self):
         sniff(iface=self.cpu_interface, prn=lambda x: self._handle_packet_in(x), filter="inbound")
 
+    def begin_batch(self):
+        """Queue sent BPDUs until the matching end_batch(), so they can be sent together. Can be nested."""
+        self.batch_depth += 1
+
+    def end_batch(self):
+        """Returns the frames queued since the outermost begin_batch(), to be passed to send_batch()."""
+        self.batch_depth -= 1
+        if self.batch_depth > 0:
+            return []
+        frames = self.batch
+        self.batch = []
+        return frames
+
+    def send_batch(self, frames):
+        if frames:
+            self._send(frames)
+
+    def _queue(self, frame):
+        if self.batch_depth > 0:
+            self.batch.append(frame)
+        else:
+            self._send([frame])
+
+    def _send(self, frames):
+        self.send_calls += self._send_frames(frames)
+        self.frames_sent += len(frames)
+        self.batch_sizes[len(frames)] = self.batch_sizes.get(len(frames), 0) + 1
+
+    def _send_frames(self, frames):
+        """Sends frames out of the CPU interface and returns the number of system calls needed."""
+        sendp(frames, iface=self.cpu_interface, verbose=False)
+        return 1
+
     def send_config_bpdu(
         self,
         bpdu_flags,
-        root_prio,
-        root_mac,
+        root_id,
         root_path_cost,
-        bridge_prio,
-        bridge_mac,
+        bridge_id,
         port_id,
         message_age,
         max_age,
@@ -89,11 +132,11 @@ class PacketIo:
             version=0,
             bpdutype=0x00,
             bpduflags=bpdu_flags,
-            rootid=root_prio,
-            rootmac=root_mac,
+            rootid=rstp_util.bridge_id_priority(root_id),
+            rootmac=rstp_util.mac_to_string(rstp_util.bridge_id_mac(root_id)),
             pathcost=root_path_cost,
-            bridgeid=bridge_prio,
-            bridgemac=bridge_mac,
+            bridgeid=rstp_util.bridge_id_priority(bridge_id),
+            bridgemac=rstp_util.mac_to_string(rstp_util.bridge_id_mac(bridge_id)),
             portid=port_id,
             age=message_age,
             maxage=max_age,
@@ -102,7 +145,7 @@ class PacketIo:
         )
         pkt = ether / fabric_header / fabric_cpu_header / FabricPayloadHeader(ether_type=PacketIo.BPDU_SIZE) / LLC() / bpdu
 
-        sendp(pkt, iface=self.cpu_interface, verbose=False)
+        self._queue(pkt)
 
     def send_tcn_bpdu(self, out_port):
         """Sends a topology change notification BPDU on the switch port identified by out_port."""
@@ -114,16 +157,14 @@ class PacketIo:
 
         pkt = ether / fabric_header / fabric_cpu_header / FabricPayloadHeader(ether_type=PacketIo.BPDU_SIZE) / LLC() / bpdu
 
-        sendp(pkt, iface=self.cpu_interface, verbose=False)
+        self._queue(pkt)
 
     def send_rstp_bpdu(
         self,
         bpdu_flags,
-        root_prio,
-        root_mac,
+        root_id,
         root_path_cost,
-        bridge_prio,
-        bridge_mac,
+        bridge_id,
         port_id,
         message_age,
         max_age,
@@ -143,11 +184,11 @@ class PacketIo:
             version=0x02,
             bpdutype=0x02,
             bpduflags=bpdu_flags,
-            rootid=root_prio,
-            rootmac=root_mac,
+            rootid=rstp_util.bridge_id_priority(root_id),
+            rootmac=rstp_util.mac_to_string(rstp_util.bridge_id_mac(root_id)),
             pathcost=root_path_cost,
-            bridgeid=bridge_prio,
-            bridgemac=bridge_mac,
+            bridgeid=rstp_util.bridge_id_priority(bridge_id),
+            bridgemac=rstp_util.mac_to_string(rstp_util.bridge_id_mac(bridge_id)),
             portid=port_id,
             age=message_age,
             maxage=max_age,
@@ -156,4 +197,4 @@ class PacketIo:
         ) / version_1_length
         pkt = ether / fabric_header / fabric_cpu_header / FabricPayloadHeader(ether_type=PacketIo.RSTP_BPDU_SIZE) / LLC() / bpdu
 
-        sendp(pkt, iface=self.cpu_interface, verbose=False)
\ No newline at end of file
+        self._queue(pkt)
\ No newline at end of file
@@ -0,0 +1,228 @@
+import socket
+import struct
+import ctypes
+import os
+
+from packet_io import PacketIo, EHTER_TYPE_CPU
+from bpdu import Bpdu
+from rstp import rstp_util
+
+SO_ATTACH_FILTER = 26
+PACKET_OUTGOING = 4
+FABRIC_PACKET_TYPE_CPU = 0x05
+
+# Offsets into a frame received on the CPU interface.
+# Ethernet (14) / FabricHeader (5) / FabricCpuHeader (11) / FabricPayloadHeader (2) / LLC (3) / BPDU.
+FABRIC_HEADER_OFFSET = 14
+INGRESS_PORT_OFFSET = 20
+LLC_OFFSET = 32
+BPDU_OFFSET = 35
+
+LLC_STP = b"\x42\x42\x03"
+STP_MULTICAST_MAC = 0x0180C2000000
+FABRIC_CPU_TX_BYPASS = 0x04
+FABRIC_CPU_REASON_CODE_NONE = 0xFFFF
+
+INGRESS_PORT = struct.Struct("!H")
+BPDU_HEADER_SIZE = 4 # Protocol identifier, version and type.
+
+# Templates for transmitted frames, with the same layers as PacketIo builds with scapy.
+TEMPLATE_HEADERS = struct.Struct(
+    "!HIHIH" # Ethernet destination, source and type.
+    "BBBH" # FabricHeader, including the out port.
+    "BHHHHH" # FabricCpuHeader.
+    "H" # FabricPayloadHeader.
+    "3s" # LLC.
+    "HBB" # BPDU protocol identifier, version and type.
+)
+DST_PORT_OFFSET = 17
+BPDU_FIELDS = struct.Struct("!BQIQHHHHH") # Flags, root id, path cost, bridge id, port id and times.
+BPDU_FIELDS_OFFSET = BPDU_OFFSET + BPDU_HEADER_SIZE
+
+# Structures for sendmmsg().
+class IoVec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t)
+    ]
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int)
+    ]
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", MsgHdr),
+        ("msg_len", ctypes.c_uint)
+    ]
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc_sendmmsg = getattr(libc, "sendmmsg", None)
+
+def sendmmsg(sock, frames):
+    """Sends multiple frames on a socket using as few system calls as possible. Returns the number of calls made."""
+    if libc_sendmmsg is None:
+        for frame in frames:
+            sock.send(frame)
+        return len(frames)
+
+    count = len(frames)
+    iovecs = (IoVec * count)()
+    messages = (MMsgHdr * count)()
+    for i, frame in enumerate(frames):
+        iovecs[i].iov_base = ctypes.cast(ctypes.c_char_p(frame), ctypes.c_void_p)
+        iovecs[i].iov_len = len(frame)
+        messages[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+        messages[i].msg_hdr.msg_iovlen = 1
+
+    calls = 0
+    sent = 0
+    while sent < count:
+        result = libc_sendmmsg(sock.fileno(), ctypes.byref(messages, sent * ctypes.sizeof(MMsgHdr)), count - sent, 0)
+        calls += 1
+        if result < 0:
+            error = ctypes.get_errno()
+            raise socket.error(error, os.strerror(error))
+        sent += result
+    return calls
+
+# Classic BPF program, equivalent to
+# "ether proto 0x9000 and ether[14] & 0xe0 == 0xa0 and inbound".
+BPF_FILTER = [
+    (0x28, 0, 0, 0x0000000c), # ldh [12]
+    (0x15, 0, 6, EHTER_TYPE_CPU), # jeq #0x9000, else drop
+    (0x30, 0, 0, FABRIC_HEADER_OFFSET), # ldb [14]
+    (0x54, 0, 0, 0x000000e0), # and #0xe0
+    (0x15, 0, 3, FABRIC_PACKET_TYPE_CPU << 5), # jeq #0xa0, else drop
+    (0x20, 0, 0, 0xfffff004), # ld pkttype
+    (0x15, 1, 0, PACKET_OUTGOING), # jeq #outgoing, drop
+    (0x06, 0, 0, 0x00040000), # ret #262144
+    (0x06, 0, 0, 0x00000000), # ret #0
+]
+
+class RawPacketIo(PacketIo):
+    """PacketIo which uses plain AF_PACKET sockets instead of scapy's sniff() and sendp().
+    Received frames are filtered in the kernel and decoded directly from the receive buffer.
+    Sent BPDUs are written into a prebuilt frame template per port and BPDU type."""
+    RECEIVE_BUFFER_SIZE = 2048
+
+    def __init__(self, cpu_interface, self_mac, packet_in_callback):
+        PacketIo.__init__(self, cpu_interface, self_mac, packet_in_callback)
+        self.mac_int = rstp_util.mac_to_int(self_mac)
+        self.templates = {}
+
+        # One socket is kept open for all transmitted BPDUs.
+        self.send_socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        self.send_socket.bind((self.cpu_interface, 0))
+
+        # Attach the filter before binding, so no unfiltered frames get queued on the socket.
+        self.receive_socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        self._attach_filter(self.receive_socket)
+        self.receive_socket.bind((self.cpu_interface, EHTER_TYPE_CPU))
+
+    def _attach_filter(self, sock):
+        program = b"".join(struct.pack("HBBI", code, jt, jf, k) for code, jt, jf, k in BPF_FILTER)
+        self.filter_buffer = ctypes.create_string_buffer(program, len(program)) # Must outlive the socket.
+        fprog = struct.pack("HL", len(BPF_FILTER), ctypes.addressof(self.filter_buffer))
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+    def _cpu_port_sniffing(self):
+        while True:
+            frame = self.receive_socket.recv(RawPacketIo.RECEIVE_BUFFER_SIZE)
+            self._handle_frame(frame)
+
+    def _handle_frame(self, frame):
+        if len(frame) < BPDU_OFFSET + BPDU_HEADER_SIZE:
+            return
+        if frame[LLC_OFFSET:BPDU_OFFSET] != LLC_STP:
+            return
+        in_port = INGRESS_PORT.unpack_from(frame, INGRESS_PORT_OFFSET)[0]
+        self.packet_in_callback(Bpdu(frame, BPDU_OFFSET), in_port)
+
+    def _get_template(self, out_port, bpdu_type):
+        """Returns the frame template for sending a BPDU of a type on a port, creating it on first use."""
+        key = (out_port, bpdu_type)
+        template = self.templates.get(key)
+        if template is None:
+            if bpdu_type == rstp_util.BPDU_TYPE_RSTP:
+                version = 0x02
+                payload_size = PacketIo.RSTP_BPDU_SIZE
+            else:
+                version = 0
+                payload_size = PacketIo.BPDU_SIZE
+            template = bytearray(LLC_OFFSET + payload_size)
+            TEMPLATE_HEADERS.pack_into(
+                template,
+                0,
+                STP_MULTICAST_MAC >> 32, STP_MULTICAST_MAC & 0xFFFFFFFF,
+                self.mac_int >> 32, self.mac_int & 0xFFFFFFFF,
+                EHTER_TYPE_CPU,
+                FABRIC_PACKET_TYPE_CPU << 5, 0, 0, out_port,
+                FABRIC_CPU_TX_BYPASS, 0, 0, 0, FABRIC_CPU_REASON_CODE_NONE, 0,
+                payload_size,
+                LLC_STP,
+                0, version, bpdu_type
+            )
+            # The version 1 length of RSTP BPDUs is left as zero.
+            self.templates[key] = template
+        return template
+
+    def _send_bpdu(
+        self,
+        bpdu_type,
+        bpdu_flags,
+        root_id,
+        root_path_cost,
+        bridge_id,
+        port_id,
+        message_age,
+        max_age,
+        hello_time,
+        forward_delay,
+        out_port
+    ):
+        template = self._get_template(out_port, bpdu_type)
+        BPDU_FIELDS.pack_into(
+            template,
+            BPDU_FIELDS_OFFSET,
+            bpdu_flags,
+            root_id,
+            root_path_cost,
+            bridge_id,
+            port_id,
+            int(message_age * 256),
+            int(max_age * 256),
+            int(hello_time * 256),
+            int(forward_delay * 256)
+        )
+        self._queue(template)
+
+    def send_config_bpdu(self, bpdu_flags, *bpdu_fields):
+        """Send a STP BPDU out on the switch port identified by out_port."""
+        self._send_bpdu(rstp_util.BPDU_TYPE_CONFIGURATION, bpdu_flags, *bpdu_fields)
+
+    def send_rstp_bpdu(self, bpdu_flags, *bpdu_fields):
+        """Send a RSTP BPDU out on the switch port identified by out_port."""
+        self._send_bpdu(rstp_util.BPDU_TYPE_RSTP, bpdu_flags, *bpdu_fields)
+
+    def send_tcn_bpdu(self, out_port):
+        """Sends a topology change notification BPDU on the switch port identified by out_port."""
+        # Nothing after the BPDU type is read by receivers, so the template is sent as is.
+        self._queue(self._get_template(out_port, rstp_util.BPDU_TYPE_TOPOLOGY_CHANGE_NOTIFICATION))
+
+    def _queue(self, frame):
+        # Templates are reused, so queued frames have to be copies.
+        PacketIo._queue(self, bytes(frame) if self.batch_depth > 0 else frame)
+
+    def _send_frames(self, frames):
+        if len(frames) == 1:
+            self.send_socket.send(frames[0])
+            return 1
+        return sendmmsg(self.send_socket, frames)
@@ -0,0 +1,106 @@
+from threading import Lock
+from timer import monotonic
+from metrics import Histogram
+import rstp_util
+
+# Events which start a convergence.
+SUPERIOR_BPDU = 0 # PortInformation entered SUPERIOR_DESIGNATED.
+INFO_AGED = 1 # rcvdInfoWhile expired.
+CONFIGURATION = 2 # A setting was changed through RstpConfiguration.
+
+class ConvergenceMonitor:
+    """Measures the time from an event which changes the spanning tree until the port states of all ports, in the
+    state machines and in the switch, have settled again. Also counts the fixpoint iterations of RstpHandler.update().
+
+    The state machines are checked at the end of each update(). Once they have settled, the convergence is finished
+    when the HardwareWorker reports that the states committed by that update() were applied, at the time they were.
+    That report comes from the worker thread, so the monitor has its own lock."""
+    CONVERGENCE_TIME_BOUNDS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000) # Milliseconds.
+    ITERATION_BOUNDS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+    TIMEOUT = 300 # Seconds after which a convergence which never settles is given up.
+
+    def __init__(self):
+        self.lock = Lock()
+        self.applied_commit = 0 # Number of the last HardwareWorker commit which is in the switch.
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.start_time = None # Time of the event which started the convergence in progress.
+            self.trigger_reason = None
+            self.trigger_port_no = None
+            self.settled_commit = None # Commit the state machines settled with, while waiting for the switch.
+            self.last_convergence = None # (reason, port number, milliseconds) of the last finished convergence.
+            self.timeouts = 0
+            self.convergence_times = Histogram(ConvergenceMonitor.CONVERGENCE_TIME_BOUNDS)
+            self.iterations = Histogram(ConvergenceMonitor.ITERATION_BOUNDS)
+
+    def is_converging(self):
+        return self.start_time is not None
+
+    def get_statistics(self):
+        """Returns the statistics of RstpConfiguration.get_convergence_statistics()."""
+        with self.lock:
+            return (
+                self.is_converging(),
+                self.timeouts,
+                self.last_convergence,
+                self.convergence_times.snapshot(),
+                self.iterations.snapshot()
+            )
+
+    def trigger(self, reason, port_no=0):
+        with self.lock:
+            # Events during a convergence are part of it, so it is measured from the first one.
+            if self.start_time is None:
+                self.start_time = monotonic()
+                self.trigger_reason = reason
+                self.trigger_port_no = port_no
+            # The state machines have to settle again first.
+            self.settled_commit = None
+
+    def update_finished(self, iterations, ports, commit):
+        """Called at the end of RstpHandler.update(), with the number of the last commit of the HardwareWorker."""
+        with self.lock:
+            self.iterations.add(iterations)
+            if self.start_time is None:
+                return
+
+            if monotonic() - self.start_time > ConvergenceMonitor.TIMEOUT:
+                self.timeouts += 1
+                self.start_time = None
+                self.settled_commit = None
+                return
+            for port in ports:
+                if not self._is_settled(port):
+                    self.settled_commit = None
+                    return
+
+            self.settled_commit = commit
+            if self.applied_commit >= commit:
+                self._finish(monotonic())
+
+    def states_applied(self, commit, apply_time):
+        """Called by the HardwareWorker once the intents of the given commit and all before it are in the switch."""
+        with self.lock:
+            self.applied_commit = commit
+            if self.settled_commit is not None and commit >= self.settled_commit:
+                self._finish(apply_time)
+
+    def _finish(self, end_time):
+        milliseconds = int(round((end_time - self.start_time) * 1000))
+        self.convergence_times.add(milliseconds)
+        self.last_convergence = (self.trigger_reason, self.trigger_port_no, milliseconds)
+        self.start_time = None
+        self.settled_commit = None
+
+    def _is_settled(self, port):
+        # Role selection is done and the port has taken its role.
+        if not port.selected or port.updtInfo or port.role != port.selectedRole:
+            return False
+        # Root and designated ports end up forwarding, all others discarding.
+        should_forward = port.role == rstp_util.ROOT_PORT or port.role == rstp_util.DESIGNATED_PORT
+        if port.forward != should_forward or port.learn != should_forward:
+            return False
+        # The port state transition machine has followed, and the switch state was committed from it just before.
+        return port.forwarding == port.forward and port.learning == port.learn
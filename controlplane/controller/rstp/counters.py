@@ -0,0 +1,82 @@
+from collections import deque
+import rstp_util
+
+# Order of the BPDU types and rcvdInfo values in the counter lists.
+BPDU_TYPES = (
+    rstp_util.BPDU_TYPE_CONFIGURATION,
+    rstp_util.BPDU_TYPE_TOPOLOGY_CHANGE_NOTIFICATION,
+    rstp_util.BPDU_TYPE_RSTP
+)
+RCVD_INFOS = (
+    rstp_util.SUPERIOR_DESIGNATED_INFO,
+    rstp_util.REPEATED_DESIGNATED_INFO,
+    rstp_util.INFERIOR_DESIGNATED_INFO,
+    rstp_util.INFERIOR_ROOT_ALTERNATE_INFO,
+    rstp_util.OTHER_INFO
+)
+
+RATE_INTERVALS = (1, 10, 60) # Seconds.
+
+class RateEstimator:
+    """Estimates the rates of growing totals over the last RATE_INTERVALS seconds from samples taken once a second."""
+    def __init__(self, width):
+        self.samples = deque([(0,) * width], maxlen=RATE_INTERVALS[-1] + 1)
+
+    def sample(self, totals):
+        self.samples.append(tuple(totals))
+
+    def rates(self):
+        """Returns the rates per second of each total, for each interval. Until an interval has been sampled
+        completely, the rate is over the time sampled so far."""
+        latest = self.samples[-1]
+        rates = []
+        for interval in RATE_INTERVALS:
+            interval = min(interval, len(self.samples) - 1)
+            if interval == 0:
+                rates.append((0.0,) * len(latest))
+                continue
+            oldest = self.samples[-1 - interval]
+            rates.append(tuple((new - old) / float(interval) for new, old in zip(latest, oldest)))
+        return rates
+
+class PortCounters:
+    """BPDU counters of a port. The counters only grow, so they can be compared between reads."""
+    def __init__(self):
+        self.received = dict((bpdu_type, 0) for bpdu_type in BPDU_TYPES)
+        self.sent = dict((bpdu_type, 0) for bpdu_type in BPDU_TYPES)
+        self.rcvd_info = dict((rcvd_info, 0) for rcvd_info in RCVD_INFOS)
+        # Times a BPDU waited for txCount to drop below TxHoldCount.
+        self.tx_throttled = 0
+        self.throttling = False
+        self.rates = RateEstimator(2) # Received and sent.
+
+    def bpdu_received(self, bpdu_type):
+        if bpdu_type in self.received:
+            self.received[bpdu_type] += 1
+
+    def bpdu_sent(self, bpdu_type):
+        self.sent[bpdu_type] += 1
+
+    def info_received(self, rcvd_info):
+        self.rcvd_info[rcvd_info] += 1
+
+    def set_throttling(self, throttling):
+        # A BPDU is only counted once, however long it waits.
+        if throttling and not self.throttling:
+            self.tx_throttled += 1
+        self.throttling = throttling
+
+    def sample(self):
+        self.rates.sample((sum(self.received.values()), sum(self.sent.values())))
+
+class UnknownPortCounters:
+    """BPDUs received on ports which don't take part in RSTP, and dropped."""
+    def __init__(self):
+        self.dropped = {} # By port number.
+        self.rates = RateEstimator(1)
+
+    def bpdu_dropped(self, port_no):
+        self.dropped[port_no] = self.dropped.get(port_no, 0) + 1
+
+    def sample(self):
+        self.rates.sample((sum(self.dropped.values()),))
@@ -0,0 +1,63 @@
+from timer import monotonic
+import rstp_util
+
+# Kinds of events. Port events carry the port number, bridge events port number 0.
+PORT_STATE = 0
+PORT_ROLE = 1
+ROOT_BRIDGE = 2 # The value is the root bridge identifier as a tuple of priority and mac address.
+ROOT_PORT = 3
+TOPOLOGY_CHANGE_COUNT = 4
+
+class EventPublisher:
+    """Compares the port states and roles, the root bridge, the root port and the topology change count after each
+    RstpHandler.update() with their values after the previous one, and passes each change to the listeners as an event
+    tuple of sequence number, monotonic time, kind, port number and value.
+
+    Listeners are called by the thread running update(), while holding the callback lock, so they must only queue the
+    events. Nothing is compared while there are no listeners."""
+    def __init__(self):
+        self.listeners = []
+        self.sequence = 0 # Of the last event.
+        self.values = None # Values after the last update(), by (kind, port number).
+
+    def add_listener(self, listener, handler):
+        if not self.listeners:
+            self.values = self._read_values(handler)
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+        if not self.listeners:
+            self.values = None
+
+    def update_finished(self, handler):
+        if not self.listeners:
+            return
+        values = self._read_values(handler)
+        now = monotonic()
+        events = []
+        for key, value in sorted(values.items()):
+            if self.values.get(key) != value:
+                self.sequence += 1
+                events.append((self.sequence, now, key[0], key[1], value))
+        self.values = values
+        if events:
+            for listener in self.listeners:
+                listener(events)
+
+    def _read_values(self, handler):
+        root_bridge_id = handler.rootPriority.RootBridgeID
+        values = {
+            (ROOT_BRIDGE, 0): (
+                rstp_util.bridge_id_priority(root_bridge_id),
+                rstp_util.mac_to_string(rstp_util.bridge_id_mac(root_bridge_id))
+            ),
+            (ROOT_PORT, 0): handler.rootPortId,
+            (TOPOLOGY_CHANGE_COUNT, 0): handler.topology_change_count
+        }
+        for port_no, port in handler.rstp_ports.items():
+            values[(PORT_STATE, port_no)] = port.state
+            values[(PORT_ROLE, port_no)] = port.role
+        return values
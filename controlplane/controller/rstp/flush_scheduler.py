@@ -0,0 +1,64 @@
+class FlushScheduler:
+    """Decides how the MAC table flushes requested in a batch of the HardwareWorker are made.
+
+    A port which was flushed less than REPEAT_INTERVAL ago isn't flushed again right away. Instead it is flushed once
+    when the interval is over, however often it was requested in the meantime. When every port needs flushing at once,
+    one VLAN flush replaces the per port flushes. It is never used for all but a few ports: a topology change flushes
+    every port except the one which received it, and that port's entries must stay."""
+    REPEAT_INTERVAL = 0.1 # Seconds.
+    VLAN_FLUSH_MIN_PORTS = 8
+
+    def __init__(self, port_count):
+        self.port_count = port_count
+        self.defer_repeats = False # Only the worker thread can wait for deferred flushes.
+        self.last_port_flush = {} # Time of the last flush of each port.
+        self.last_vlan_flush = None
+        self.deferred = {} # Time each deferred port is due.
+
+        # Statistics.
+        self.requested = 0 # Port flushes requested, after merging the ones in the same batch.
+        self.deferred_count = 0 # Requests deferred because the port was flushed just before.
+        self.merged = 0 # Requests merged into a deferred flush.
+        self.port_flushes = 0
+        self.vlan_flushes = 0
+
+    def add(self, ports, now):
+        """Adds the ports requested in a batch. Returns the ports to flush now."""
+        self.requested += len(ports)
+        flush_now = []
+        for port_no in ports:
+            if port_no in self.deferred:
+                self.merged += 1
+            elif self.defer_repeats and now - self._last_flush(port_no) < FlushScheduler.REPEAT_INTERVAL:
+                self.deferred[port_no] = self._last_flush(port_no) + FlushScheduler.REPEAT_INTERVAL
+                self.deferred_count += 1
+            else:
+                flush_now.append(port_no)
+        for port_no, due in list(self.deferred.items()):
+            if due <= now or not self.defer_repeats:
+                del self.deferred[port_no]
+                flush_now.append(port_no)
+        return sorted(flush_now)
+
+    def next_due(self):
+        """Returns when the next deferred flush is due, or None."""
+        return min(self.deferred.values()) if self.deferred else None
+
+    def use_vlan_flush(self, ports):
+        return len(ports) >= FlushScheduler.VLAN_FLUSH_MIN_PORTS and len(ports) == self.port_count
+
+    def port_flushed(self, port_no, now):
+        self.last_port_flush[port_no] = now
+        self.port_flushes += 1
+
+    def vlan_flushed(self, now):
+        # Covers every port, including the deferred ones.
+        self.last_vlan_flush = now
+        self.deferred.clear()
+        self.vlan_flushes += 1
+
+    def _last_flush(self, port_no):
+        last = self.last_port_flush.get(port_no)
+        if self.last_vlan_flush is not None and (last is None or self.last_vlan_flush > last):
+            last = self.last_vlan_flush
+        return last if last is not None else float("-inf")
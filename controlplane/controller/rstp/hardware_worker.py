@@ -0,0 +1,238 @@
+from threading import Thread, Condition
+import traceback
+from timer import monotonic
+from flush_scheduler import FlushScheduler
+
+from switch_api_thrift.ttypes import *
+from switch_api_thrift.switch_api_headers import *
+
+class HardwareWorker:
+    """Programs port states, MAC table flushes and the aging time into the switch on its own thread, so the state machines never wait
+    for SwitchAPI while holding the callback lock.
+
+    The intents of an update() are staged and then committed together. Committed intents which weren't applied yet
+    are coalesced: the last state of a port wins and flushes of the same port are merged. Each batch is applied in a
+    safe order: ports are blocked first, then flushed, and only then do ports start learning and forwarding, so no port
+    forwards while another port that should already be discarding still does. How the flushes are made is up to the
+    FlushScheduler. The port flushes of a batch are pipelined, so they take one round trip to SwitchAPI.
+
+    The BPDUs of an update() are committed with its intents. They are sent right away, unless the update() blocks a
+    port or earlier intents are still being applied. Then they are sent by the batch once its ports were blocked, as
+    agreements and proposals must not reach the neighbours before the ports they were sent for are discarding. A
+    blocking state which queued BPDUs wait for is applied even if a later state of the port replaces it.
+
+    Commits which queue intents are numbered. After each batch, states_applied is called with the number of the last
+    commit in it and the time the batch was done.
+
+    Until start() is called, committed intents are applied right away by the committing thread."""
+    def __init__(
+        self, set_port_state, flush_ports, flush_vlan, set_aging_time, send_frames, states_applied, port_count
+    ):
+        # Functions which make the SwitchAPI calls, the one which sends BPDUs, and the one told of applied batches.
+        self.apply_port_state = set_port_state
+        self.apply_flush_ports = flush_ports # Flushes a list of ports with pipelined calls.
+        self.apply_flush_vlan = flush_vlan
+        self.apply_aging_time = set_aging_time
+        self.apply_send_frames = send_frames
+        self.states_applied = states_applied
+
+        # Written while holding the callback lock only.
+        self.staged_states = {}
+        self.staged_flush_ports = set()
+        self.staged_aging_time = None
+        self.staged_frames = []
+
+        self.condition = Condition()
+        self.committed = 0 # Number of the last commit which queued intents.
+        self.pending_states = {}
+        self.pending_flush_ports = set()
+        self.pending_aging_time = None
+        self.pending_frames = []
+        self.pending_blocks = {} # Blocking states which pending_frames wait for.
+        self.applying = False
+
+        # Only used by the applying thread.
+        self.applied_states = {} # What the switch was last set to.
+        self.flushes = FlushScheduler(port_count)
+        self.thread = None
+        self.should_run = False
+
+        # Statistics.
+        self.batches = 0
+        self.superseded_states = 0 # States replaced by a later state before they were applied.
+        self.merged_flushes = 0 # Flushes merged into a flush which was still pending.
+
+    def set_port_state(self, port_no, stp_state):
+        self.staged_states[port_no] = stp_state
+
+    def flush_port(self, port_no):
+        self.staged_flush_ports.add(port_no)
+
+    def set_aging_time(self, aging_time):
+        self.staged_aging_time = aging_time
+
+    def send_frames(self, frames):
+        self.staged_frames.extend(frames)
+
+    def commit(self):
+        """Queues the staged intents to be applied, and sends or queues the staged BPDUs."""
+        frames = self.staged_frames
+        self.staged_frames = []
+        blocks = dict(
+            (port_no, stp_state) for port_no, stp_state in self.staged_states.items()
+            if stp_state != SWITCH_PORT_STP_STATE_LEARNING and stp_state != SWITCH_PORT_STP_STATE_FORWARDING
+        )
+        if frames and not blocks:
+            self._send_frames(frames)
+            frames = []
+        if not (self.staged_states or self.staged_flush_ports or self.staged_aging_time is not None):
+            return
+        with self.condition:
+            self.committed += 1
+            if frames:
+                self.pending_frames.extend(frames)
+                self.pending_blocks.update(blocks)
+            for port_no, stp_state in self.staged_states.items():
+                if port_no in self.pending_states:
+                    self.superseded_states += 1
+                self.pending_states[port_no] = stp_state
+            self.merged_flushes += len(self.staged_flush_ports & self.pending_flush_ports)
+            self.pending_flush_ports |= self.staged_flush_ports
+            if self.staged_aging_time is not None:
+                self.pending_aging_time = self.staged_aging_time
+            self.condition.notify()
+        self.staged_states = {}
+        self.staged_flush_ports = set()
+        self.staged_aging_time = None
+
+        if self.thread is None:
+            self._apply(self._take_pending())
+
+    def _send_frames(self, frames):
+        """Sends BPDUs which don't wait for blocking states, unless earlier intents are still being applied."""
+        with self.condition:
+            if self.applying or self._has_pending():
+                self.pending_frames.extend(frames)
+                self.condition.notify()
+                return
+        self._call(self.apply_send_frames, frames)
+
+    def start(self):
+        self.should_run = True
+        self.flushes.defer_repeats = True
+        self.thread = Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Applies everything committed so far and stops the thread."""
+        if self.thread is not None:
+            with self.condition:
+                self.should_run = False
+                self.condition.notify()
+            self.thread.join()
+            self.thread = None
+        # Deferred flushes are made right away.
+        self.flushes.defer_repeats = False
+        self._apply(self._take_pending())
+
+    def _has_pending(self):
+        return (
+            self.pending_states or self.pending_flush_ports or self.pending_aging_time is not None or
+            self.pending_frames or self.pending_blocks
+        )
+
+    def _take_pending(self):
+        with self.condition:
+            batch = (
+                self.pending_states,
+                self.pending_flush_ports,
+                self.pending_aging_time,
+                self.pending_frames,
+                self.pending_blocks,
+                self.committed
+            )
+            self.pending_states = {}
+            self.pending_flush_ports = set()
+            self.pending_aging_time = None
+            self.pending_frames = []
+            self.pending_blocks = {}
+            return batch
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.should_run and not self._has_pending():
+                    due = self.flushes.next_due()
+                    if due is None:
+                        self.condition.wait()
+                    elif due <= monotonic():
+                        break
+                    else:
+                        self.condition.wait(due - monotonic())
+                if not self.should_run:
+                    return
+                self.applying = True
+            try:
+                self._apply(self._take_pending())
+            finally:
+                with self.condition:
+                    self.applying = False
+
+    def _apply(self, batch):
+        states, flush_ports, aging_time, frames, blocks, commit = batch
+        now = monotonic()
+        flush_ports = self.flushes.add(flush_ports, now)
+        if not (states or flush_ports or aging_time is not None or frames):
+            self.states_applied(commit, now)
+            return
+        self.batches += 1
+        for port_no, stp_state in sorted(blocks.items()):
+            if states.get(port_no) != stp_state and self.applied_states.get(port_no) != stp_state:
+                self._apply_state(port_no, stp_state)
+        blocking = []
+        learning = []
+        forwarding = []
+        for port_no, stp_state in sorted(states.items()):
+            if self.applied_states.get(port_no) == stp_state:
+                continue
+            if stp_state == SWITCH_PORT_STP_STATE_FORWARDING:
+                forwarding.append(port_no)
+            elif stp_state == SWITCH_PORT_STP_STATE_LEARNING:
+                learning.append(port_no)
+            else:
+                blocking.append(port_no)
+
+        for port_no in blocking:
+            self._apply_state(port_no, states[port_no])
+        if frames:
+            self._call(self.apply_send_frames, frames)
+        if aging_time is not None:
+            self._call(self.apply_aging_time, aging_time)
+        if self.flushes.use_vlan_flush(flush_ports):
+            self._call(self.apply_flush_vlan)
+            self.flushes.vlan_flushed(now)
+        elif flush_ports:
+            self._call(self.apply_flush_ports, flush_ports)
+            for port_no in flush_ports:
+                self.flushes.port_flushed(port_no, now)
+        for port_no in learning:
+            self._apply_state(port_no, states[port_no])
+        for port_no in forwarding:
+            self._apply_state(port_no, states[port_no])
+        self.states_applied(commit, monotonic())
+
+    def _apply_state(self, port_no, stp_state):
+        if self._call(self.apply_port_state, port_no, stp_state):
+            self.applied_states[port_no] = stp_state
+        else:
+            # The switch state is unknown, so the next intent for the port is applied even if it is the same.
+            self.applied_states.pop(port_no, None)
+
+    def _call(self, function, *args):
+        try:
+            function(*args)
+            return True
+        except Exception:
+            traceback.print_exc()
+            return False
@@ -0,0 +1,95 @@
+import itertools
+import json
+import struct
+import time
+from timer import monotonic
+
+# Record kinds.
+EMPTY = 0
+TRANSITION = 1
+BPDU_RECEIVED = 2
+BPDU_SENT = 3
+SET_PORT_STATE = 4
+FLUSH_MAC_ENTRIES = 5
+
+NO_PORT = 0xFFFF # Port number of records which don't belong to a port.
+NO_STATE = 0xFF # Old state of the first transition of a state machine.
+
+# Every record has a sequence number, a monotonic timestamp in seconds, a port number and a kind,
+# followed by the fields a to f, whose meaning depends on the kind:
+# TRANSITION: a = state machine, b = old state, c = new state, d = guard.
+# BPDU_RECEIVED and BPDU_SENT: a = BPDU type, b = flags, d = port identifier, e = root bridge identifier,
+#                              f = root path cost.
+# SET_PORT_STATE: a = switch stp state, f = duration of the call in microseconds.
+# FLUSH_MAC_ENTRIES: f = duration of the call in microseconds.
+RECORD = struct.Struct("<IdHBBBBHQI")
+
+# A dump is the header, the name table as JSON and then the records of the ring buffer in slot order. The name table
+# also has the format of RECORD, so cli/journal_decoder.py reads the records with the struct they were written with.
+# It has a copy of the header, so DUMP_VERSION must be bumped whenever DUMP_HEADER changes.
+DUMP_MAGIC = b"RSTJ"
+DUMP_VERSION = 2
+# Magic, version, record size, number of records, next sequence number,
+# monotonic and wall clock time of the dump, length of the name table.
+DUMP_HEADER = struct.Struct("<4sHHIIddI")
+
+MAX_DURATION = 0xFFFFFFFF
+
+# Names of the states and guards of each state machine, by the id returned from register_machine().
+machines = []
+
+def register_machine(name, state_names, guard_names):
+    """Registers the names used to decode the transitions of a state machine. Returns its id."""
+    machines.append({
+        "name": name,
+        "states": [state_names[state] for state in range(len(state_names))],
+        "guards": list(guard_names)
+    })
+    return len(machines) - 1
+
+class Journal:
+    """Fixed size ring buffer of binary records of every state machine transition, BPDU and hardware call,
+    to analyze convergence after the fact. The buffer is allocated up front and a record is a single pack_into(),
+    so writing costs the same whether the buffer is full or not, and the journal can always be on."""
+    CAPACITY = 65536 # Records. When full, the oldest records are overwritten.
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.buffer = bytearray(RECORD.size * capacity)
+        self.sequence = itertools.count() # next() is atomic, so concurrent writers never get the same slot.
+        self.next_sequence = 0
+
+    def _write(self, port_no, kind, a=0, b=0, c=0, d=0, e=0, f=0):
+        sequence = next(self.sequence)
+        RECORD.pack_into(
+            self.buffer, (sequence % self.capacity) * RECORD.size,
+            sequence & 0xFFFFFFFF, monotonic(), port_no, kind, a, b, c, d, e, f
+        )
+        self.next_sequence = sequence + 1
+
+    def transition(self, machine_id, port_no, old_state, new_state, guard_id):
+        self._write(port_no, TRANSITION, machine_id, NO_STATE if old_state is None else old_state, new_state, guard_id)
+
+    def bpdu_received(self, port_no, bpdu):
+        self._write(
+            port_no, BPDU_RECEIVED, bpdu.bpdutype, bpdu.bpduflags, 0, bpdu.portid, bpdu.rootbridgeid, bpdu.pathcost
+        )
+
+    def bpdu_sent(self, port_no, bpdu_type, flags, root_id=0, root_path_cost=0, port_id=0):
+        self._write(port_no, BPDU_SENT, bpdu_type, flags, 0, port_id, root_id, root_path_cost)
+
+    def set_port_state(self, port_no, stp_state, duration):
+        self._write(port_no, SET_PORT_STATE, stp_state, f=min(int(duration * 1e6), MAX_DURATION))
+
+    def flush_mac_entries(self, port_no, duration):
+        self._write(port_no, FLUSH_MAC_ENTRIES, f=min(int(duration * 1e6), MAX_DURATION))
+
+    def dump(self):
+        """Returns the journal in the format read by cli/journal_decoder.py."""
+        records = bytes(self.buffer)
+        names = json.dumps({"machines": machines, "record": RECORD.format}).encode("utf-8")
+        header = DUMP_HEADER.pack(
+            DUMP_MAGIC, DUMP_VERSION, RECORD.size, self.capacity, self.next_sequence & 0xFFFFFFFF,
+            monotonic(), time.time(), len(names)
+        )
+        return header + names + records
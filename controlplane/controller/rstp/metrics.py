@@ -0,0 +1,60 @@
+import bisect
+from threading import Lock, current_thread
+from timer import monotonic
+
+# Bucket bounds in seconds for the durations of update(), lock waits and SwitchAPI calls.
+DURATION_BOUNDS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+class Histogram:
+    """Counts values into buckets with the given inclusive upper bounds, and one more bucket for larger values."""
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self):
+        """Returns a copy as a tuple of bucket bounds, bucket counts, count, sum and maximum."""
+        return (self.bounds, list(self.counts), self.count, self.sum, self.max)
+
+class TimedLock:
+    """A Lock which measures how long acquiring it had to wait, and knows which thread holds it.
+    The wait times are only written while holding the lock."""
+    def __init__(self):
+        self.lock = Lock()
+        self.owner = None
+        self.wait_times = Histogram(DURATION_BOUNDS)
+
+    def acquire(self):
+        # Only read the clock when the lock is taken, so uncontended acquisitions stay cheap.
+        if self.lock.acquire(False):
+            self.wait_times.add(0)
+        else:
+            start = monotonic()
+            self.lock.acquire()
+            self.wait_times.add(monotonic() - start)
+        self.owner = current_thread()
+        return True
+
+    def release(self):
+        self.owner = None
+        self.lock.release()
+
+    def is_owned(self):
+        """True if the current thread holds the lock."""
+        return self.owner is current_thread()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
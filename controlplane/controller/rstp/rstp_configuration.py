@@ -1,14 +1,24 @@
 from datetime import datetime
+import rstp_util
+import convergence
+import counters
 
 class InvalidParameter(Exception):
     pass
 
+def _milliseconds(seconds):
+    # Hello times can be fractional, and times received from other bridges too.
+    return int(round(seconds * 1000))
+
 class RstpConfiguration:
     """An interface for reading and setting configuration for RstpHandler, following 802.1D-2004, section 14.8."""
 
     def __init__(self, rstp_handler):
         self.rstp_handler = rstp_handler
 
+    def _bridge_id_to_tuple(self, bridge_id):
+        return (rstp_util.bridge_id_priority(bridge_id), rstp_util.mac_to_string(rstp_util.bridge_id_mac(bridge_id)))
+
     def _verify_port_parameter(self, port_no):
         if port_no < 1 or port_no > 4095:
             raise InvalidParameter()
@@ -18,7 +28,7 @@ class RstpConfiguration:
     # Get bridge configuration.
     def get_bridge_identifier(self):
         """Returns the bridge identifier as a tuple of priority and mac address."""
-        return self.rstp_handler.BridgeIdentifier
+        return self._bridge_id_to_tuple(self.rstp_handler.BridgeIdentifier)
 
     def get_time_since_topology_change(self):
         if self.rstp_handler.last_topology_change_time != None:
@@ -30,7 +40,7 @@ class RstpConfiguration:
 
     def get_designated_root(self):
         """Returns the designated root as a tuple of priority and mac address."""
-        return self.rstp_handler.rootPriority.RootBridgeID
+        return self._bridge_id_to_tuple(self.rstp_handler.rootPriority.RootBridgeID)
 
     def get_root_path_cost(self):
         return self.rstp_handler.rootPriority.RootPathCost
@@ -62,10 +72,156 @@ class RstpConfiguration:
     def get_force_version(self):
         return self.rstp_handler.ForceProtocolVersion
 
+    def get_tick_interval(self):
+        """Returns the interval of the state machine timer ticks in milliseconds."""
+        return self.rstp_handler.TickInterval
+
+    def get_hello_time_ms(self):
+        return _milliseconds(self.rstp_handler.rootTimes.BridgeHelloTime)
+
+    def get_bridge_hello_time_ms(self):
+        return _milliseconds(self.rstp_handler.BridgeTimes.BridgeHelloTime)
+
+    def get_journal(self):
+        """Returns a dump of the event journal, which cli/journal_decoder.py turns into a timeline."""
+        with self.rstp_handler.callback_lock:
+            return self.rstp_handler.journal.dump()
+
+    def get_convergence_statistics(self):
+        """Returns whether a convergence is in progress, the number of convergences given up, the last convergence as
+        a tuple of trigger, port and milliseconds or None, and the histograms of the convergence times in milliseconds
+        and of the update() iterations, each as a tuple of bucket bounds, bucket counts, count, sum and maximum."""
+        return self.rstp_handler.convergence.get_statistics()
+
+    def reset_convergence_statistics(self):
+        with self.rstp_handler.callback_lock:
+            self.rstp_handler.convergence.reset()
+
+    def get_unknown_port_counters(self):
+        """Returns a list of (port number, BPDUs dropped) of the ports which aren't RSTP ports but received BPDUs,
+        and the rates of dropped BPDUs per second over the last 1, 10 and 60 seconds."""
+        with self.rstp_handler.callback_lock:
+            unknown_port_counters = self.rstp_handler.unknown_port_counters
+            rates = unknown_port_counters.rates.rates()
+            return sorted(unknown_port_counters.dropped.items()), tuple(rate[0] for rate in rates)
+
+    def get_snapshot(self):
+        """Returns the bridge and all its ports, taken with a single acquisition of the lock. The bridge is a dict of
+        the values of the bridge get requests, and each port a dict of the values of the port get requests, its role
+        and its BPDU counters in the order of counters.BPDU_TYPES and counters.RCVD_INFOS."""
+        with self.rstp_handler.callback_lock:
+            return self._take_snapshot()
+
+    def subscribe(self, listener):
+        """Passes every later change of a port state or role, the root bridge, the root port or the topology change
+        count to listener, see rstp/events.py. Returns the sequence number of the last event before them and a
+        snapshot as returned by get_snapshot(), both taken together with adding the listener."""
+        with self.rstp_handler.callback_lock:
+            self.rstp_handler.events.add_listener(listener, self.rstp_handler)
+            return self.rstp_handler.events.sequence, self._take_snapshot()
+
+    def unsubscribe(self, listener):
+        with self.rstp_handler.callback_lock:
+            self.rstp_handler.events.remove_listener(listener)
+
+    def _take_snapshot(self):
+        # Must hold the lock.
+        handler = self.rstp_handler
+        bridge = {
+            "bridge_identifier": self.get_bridge_identifier(),
+            "time_since_topology_change": self.get_time_since_topology_change(),
+            "topology_change_count": handler.topology_change_count,
+            "designated_root": self.get_designated_root(),
+            "root_path_cost": handler.rootPriority.RootPathCost,
+            "root_port": handler.rootPortId,
+            "max_age_ms": _milliseconds(handler.rootTimes.BridgeMaxAge),
+            "hello_time_ms": _milliseconds(handler.rootTimes.BridgeHelloTime),
+            "forward_delay_ms": _milliseconds(handler.rootTimes.BridgeForwardDelay),
+            "bridge_max_age_ms": _milliseconds(handler.BridgeTimes.BridgeMaxAge),
+            "bridge_hello_time_ms": _milliseconds(handler.BridgeTimes.BridgeHelloTime),
+            "bridge_forward_delay_ms": _milliseconds(handler.BridgeTimes.BridgeForwardDelay),
+            "tx_hold_count": handler.TxHoldCount,
+            "force_version": handler.ForceProtocolVersion,
+            "tick_interval": handler.TickInterval
+        }
+        now = datetime.now()
+        ports = []
+        for port_no in sorted(handler.rstp_ports):
+            port = handler.rstp_ports[port_no]
+            port_counters = port.counters
+            ports.append({
+                "port_no": port_no,
+                "uptime": (now - port.initialize_time).total_seconds(),
+                "state": port.state,
+                "role": port.role,
+                "identifier": port.portId,
+                "path_cost": port.PortPathCost,
+                "designated_root": self._bridge_id_to_tuple(port.portPriority.RootBridgeID),
+                "designated_cost": port.portPriority.RootPathCost,
+                "designated_bridge": self._bridge_id_to_tuple(port.portPriority.DesignatedBridgeID),
+                "designated_port": port.portPriority.DesignatedPortID,
+                "topology_change_acknowledge": port.tcAck,
+                "admin_edge": port.AdminEdgePort,
+                "oper_edge": port.operEdge,
+                "auto_edge": port.AutoEdgePort,
+                "oper_point_to_point_mac": port.operPointToPointMAC,
+                "received": [port_counters.received[bpdu_type] for bpdu_type in counters.BPDU_TYPES],
+                "sent": [port_counters.sent[bpdu_type] for bpdu_type in counters.BPDU_TYPES],
+                "rcvd_info": [port_counters.rcvd_info[rcvd_info] for rcvd_info in counters.RCVD_INFOS],
+                "tx_throttled": port_counters.tx_throttled
+            })
+        return bridge, ports
+
+    def get_metrics(self):
+        """Returns a copy of everything the metrics endpoint exposes, taken with a single acquisition of the lock,
+        so formatting it doesn't hold up the callbacks. Histograms are tuples of bucket bounds, bucket counts, count, sum
+        and maximum."""
+        with self.rstp_handler.callback_lock:
+            handler = self.rstp_handler
+            ports = []
+            for port_no in sorted(handler.rstp_ports):
+                port = handler.rstp_ports[port_no]
+                port_counters = port.counters
+                ports.append({
+                    "port_no": port_no,
+                    "state": port.state,
+                    "role": port.role,
+                    "received": dict(port_counters.received),
+                    "sent": dict(port_counters.sent),
+                    "rcvd_info": dict(port_counters.rcvd_info),
+                    "tx_throttled": port_counters.tx_throttled
+                })
+            return {
+                "ports": ports,
+                "unknown_port_dropped": sorted(handler.unknown_port_counters.dropped.items()),
+                "topology_change_count": handler.topology_change_count,
+                "time_since_topology_change": self.get_time_since_topology_change(),
+                "update_durations": handler.update_durations.snapshot(),
+                "machine_evaluations": handler.machine_evaluation_counts.snapshot(),
+                "lock_wait_times": handler.callback_lock.wait_times.snapshot(),
+                "bpdu_batch_sizes": sorted(handler.packet_io.batch_sizes.items()),
+                "bpdu_send_calls": handler.packet_io.send_calls,
+                "bpdu_frames_sent": handler.packet_io.frames_sent,
+                "switch_api": handler.client.get_statistics(),
+                "hardware_batches": handler.hardware.batches,
+                "hardware_superseded_states": handler.hardware.superseded_states,
+                "hardware_merged_flushes": handler.hardware.merged_flushes,
+                "flushes_requested": handler.hardware.flushes.requested,
+                "flushes_deferred": handler.hardware.flushes.deferred_count,
+                "flushes_merged_deferred": handler.hardware.flushes.merged,
+                "port_flushes": handler.hardware.flushes.port_flushes,
+                "vlan_flushes": handler.hardware.flushes.vlan_flushes
+            }
+
+    def echo(self, value):
+        """Returns value, so clients can check that the responses are in step with their requests."""
+        return value
+
     # Set bridge configuration.
     def set_bridge_max_age(self, value):
         with self.rstp_handler.callback_lock:
-            self.rstp_handler.BridgeTimes.BridgeMaxAge = value
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION)
+            self.rstp_handler.BridgeTimes = self.rstp_handler.BridgeTimes._replace(BridgeMaxAge=value)
             for port in self.rstp_handler.rstp_ports.values():
                 port.reselect = True
                 port.selected = False
@@ -73,15 +229,30 @@ class RstpConfiguration:
 
     def set_bridge_hello_time(self, value):
         with self.rstp_handler.callback_lock:
-            self.rstp_handler.BridgeTimes.BridgeHelloTime = value
-            for port in self.rstp_handler.rstp_ports.values():
-                port.reselect = True
-                port.selected = False
-            self.rstp_handler.update()
+            self._set_bridge_hello_time(value)
+
+    def set_bridge_hello_time_ms(self, value):
+        """Sets the bridge hello time in milliseconds. Hello times below one second need a shorter tick interval."""
+        if value <= 0:
+            raise InvalidParameter()
+        with self.rstp_handler.callback_lock:
+            # Checked under the lock, so the tick interval can't change before the hello time is set.
+            if value % self.rstp_handler.TickInterval != 0:
+                raise InvalidParameter()
+            self._set_bridge_hello_time(value / 1000.0)
+
+    def _set_bridge_hello_time(self, value):
+        self.rstp_handler.convergence.trigger(convergence.CONFIGURATION)
+        self.rstp_handler.BridgeTimes = self.rstp_handler.BridgeTimes._replace(BridgeHelloTime=value)
+        for port in self.rstp_handler.rstp_ports.values():
+            port.reselect = True
+            port.selected = False
+        self.rstp_handler.update()
 
     def set_bridge_forward_delay(self, value):
         with self.rstp_handler.callback_lock:
-            self.rstp_handler.BridgeTimes.BridgeForwardDelay = value
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION)
+            self.rstp_handler.BridgeTimes = self.rstp_handler.BridgeTimes._replace(BridgeForwardDelay=value)
             for port in self.rstp_handler.rstp_ports.values():
                 port.reselect = True
                 port.selected = False
@@ -92,9 +263,13 @@ class RstpConfiguration:
         if value < 0 or value > 61440 or value % 4096 != 0:
             raise InvalidParameter()
         with self.rstp_handler.callback_lock:
-            self.rstp_handler.BridgePriority.RootBridgeID = (value, self.rstp_handler.BridgePriority.RootBridgeID[1])
-            self.rstp_handler.BridgePriority.DesignatedBridgeID = (value, self.rstp_handler.BridgePriority.DesignatedBridgeID[1])
-            self.rstp_handler.BridgeIdentifier = (value, self.rstp_handler.BridgeIdentifier[1])
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION)
+            bridge_id = rstp_util.bridge_id(value, rstp_util.bridge_id_mac(self.rstp_handler.BridgeIdentifier))
+            self.rstp_handler.BridgePriority = self.rstp_handler.BridgePriority._replace(
+                RootBridgeID=bridge_id,
+                DesignatedBridgeID=bridge_id
+            )
+            self.rstp_handler.BridgeIdentifier = bridge_id
             for port in self.rstp_handler.rstp_ports.values():
                 port.reselect = True
                 port.selected = False
@@ -102,11 +277,25 @@ class RstpConfiguration:
 
     def set_force_version(self, value):
         with self.rstp_handler.callback_lock:
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION)
             self.rstp_handler.ForceProtocolVersion = value
             self.rstp_handler.do_begin_states()
 
+    def set_tick_interval(self, value):
+        """Sets the interval of the state machine timer ticks in milliseconds. Must divide one second."""
+        if value <= 0 or value > 1000 or 1000 % value != 0:
+            raise InvalidParameter()
+        with self.rstp_handler.callback_lock:
+            # The hello times have to stay a whole number of ticks: the bridge's for helloWhen, and the root's, which
+            # rcvdInfoWhile is derived from.
+            if self.get_bridge_hello_time_ms() % value != 0 or self.get_hello_time_ms() % value != 0:
+                raise InvalidParameter()
+            self.rstp_handler.set_tick_interval(value)
+            self.rstp_handler.update()
+
     def set_tx_hold_count(self, value):
         with self.rstp_handler.callback_lock:
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION)
             self.rstp_handler.TxHoldCount = value
             for port in self.rstp_handler.rstp_ports.values():
                 port.txCount = 0
@@ -127,13 +316,34 @@ class RstpConfiguration:
         self._verify_port_parameter(port_no)
         return self.rstp_handler.rstp_ports[port_no].portId
 
+    def get_port_role(self, port_no):
+        self._verify_port_parameter(port_no)
+        return self.rstp_handler.rstp_ports[port_no].role
+
     def get_port_path_cost(self, port_no):
         self._verify_port_parameter(port_no)
         return self.rstp_handler.rstp_ports[port_no].PortPathCost
 
+    def get_port_counters(self, port_no):
+        """Returns the BPDUs received and sent, each by type in the order of counters.BPDU_TYPES, the received
+        information by rcvdInfo in the order of counters.RCVD_INFOS, the BPDUs delayed by TxHoldCount, and the rates
+        of received and sent BPDUs per second over the last 1, 10 and 60 seconds."""
+        self._verify_port_parameter(port_no)
+        with self.rstp_handler.callback_lock:
+            port_counters = self.rstp_handler.rstp_ports[port_no].counters
+            rates = port_counters.rates.rates()
+            return (
+                [port_counters.received[bpdu_type] for bpdu_type in counters.BPDU_TYPES],
+                [port_counters.sent[bpdu_type] for bpdu_type in counters.BPDU_TYPES],
+                [port_counters.rcvd_info[rcvd_info] for rcvd_info in counters.RCVD_INFOS],
+                port_counters.tx_throttled,
+                tuple(rate[0] for rate in rates),
+                tuple(rate[1] for rate in rates)
+            )
+
     def get_port_designated_root(self, port_no):
         self._verify_port_parameter(port_no)
-        return self.rstp_handler.rstp_ports[port_no].portPriority.RootBridgeID
+        return self._bridge_id_to_tuple(self.rstp_handler.rstp_ports[port_no].portPriority.RootBridgeID)
 
     def get_port_designated_cost(self, port_no):
         self._verify_port_parameter(port_no)
@@ -141,7 +351,7 @@ class RstpConfiguration:
 
     def get_port_designated_bridge(self, port_no):
         self._verify_port_parameter(port_no)
-        return self.rstp_handler.rstp_ports[port_no].portPriority.DesignatedBridgeID
+        return self._bridge_id_to_tuple(self.rstp_handler.rstp_ports[port_no].portPriority.DesignatedBridgeID)
 
     def get_port_designated_port(self, port_no):
         self._verify_port_parameter(port_no)
@@ -172,6 +382,7 @@ class RstpConfiguration:
         with self.rstp_handler.callback_lock:
             self._verify_port_parameter(port_no)
             port = self.rstp_handler.rstp_ports[port_no]
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION, port_no)
             port.PortPathCost = value
             port.reselect = True
             port.selected = False
@@ -184,6 +395,7 @@ class RstpConfiguration:
             if value < 0 or value > 240 or value % 16 != 0:
                 raise InvalidParameter()
             port = self.rstp_handler.rstp_ports[port_no]
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION, port_no)
             port.portId = (value << 8) | port.port_no
             port.reselect = True
             port.selected = False
@@ -193,6 +405,7 @@ class RstpConfiguration:
         with self.rstp_handler.callback_lock:
             self._verify_port_parameter(port_no)
             port = self.rstp_handler.rstp_ports[port_no]
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION, port_no)
             port.AdminEdgePort = value
             port.reselect = True
             port.selected = False
@@ -202,6 +415,7 @@ class RstpConfiguration:
         with self.rstp_handler.callback_lock:
             self._verify_port_parameter(port_no)
             port = self.rstp_handler.rstp_ports[port_no]
+            self.rstp_handler.convergence.trigger(convergence.CONFIGURATION, port_no)
             port.AutoEdgePort = value
             port.reselect = True
             port.selected = False
@@ -1,10 +1,17 @@
 from datetime import datetime
-from threading import Lock
 import time
-
-from timer import Timer
+import heapq
+
+from timer import Timer, monotonic
+from journal import Journal
+from convergence import ConvergenceMonitor
+from events import EventPublisher
+from counters import UnknownPortCounters
+from metrics import Histogram, TimedLock, DURATION_BOUNDS
+from switch_api_proxy import SwitchApiProxy
+from hardware_worker import HardwareWorker
 from structures import PriorityVector, BridgeTimes
-from rstp_port import RstpPort
+from rstp_port import RstpPort, ALL_PORT_STATE_MACHINES, BRIDGE_WATCHERS
 from state_machines import PortRoleSelection
 import rstp_util
 
@@ -15,6 +22,12 @@ device = 0
 
 class RstpHandler:
     """Implementation of the Rapid Spanning Tree Protocol (IEEE 802.1D-2004)"""
+    # Variables read by all state machines, either directly or through the timer values.
+    ALL_DIRTY_VARIABLES = frozenset(["BEGIN", "ticks_per_second"])
+    # Variables read by updtRolesTree() for all ports.
+    ROLES_TREE_INPUTS = frozenset(["BridgeIdentifier", "BridgePriority", "BridgeTimes"])
+    MACHINE_EVALUATION_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
     def __init__(
         self,
         switch_api_client,
@@ -23,26 +36,49 @@ class RstpHandler:
         port_infos,
         bridge_prio,
         bridge_mac,
-        rstp
+        rstp,
+        tick_interval=1000
     ):
-        self.client = switch_api_client
         self.packet_io = packet_io
         self.vlan = vlan
 
         self.rstp_ports = {}
-        self.callback_lock = Lock() # Lock so multiple callbacks don't run at the same time.
+        self.callback_lock = TimedLock() # Lock so multiple callbacks don't run at the same time.
+        # Every SwitchAPI call is measured, and the ones made under callback_lock are checked for slowness.
+        if not isinstance(switch_api_client, SwitchApiProxy):
+            switch_api_client = SwitchApiProxy(switch_api_client)
+        self.client = switch_api_client
+        self.client.watch_lock(self.callback_lock)
+        self.journal = Journal()
+        self.convergence = ConvergenceMonitor()
+        self.events = EventPublisher()
+        self.unknown_port_counters = UnknownPortCounters()
+        self.update_durations = Histogram(DURATION_BOUNDS)
+
+        # Only state machines whose inputs changed are evaluated, see StateMachine.INPUTS.
+        self.role_selection_dirty = True
+        self.machine_evaluations = 0 # Evaluations during the last update().
+        self.machine_evaluation_counts = Histogram(RstpHandler.MACHINE_EVALUATION_BOUNDS) # Of each update().
+
+        # updtRolesTree() only recalculates the ports in roles_dirty_ports, unless roles_full_update is set.
+        self.roles_dirty_ports = set()
+        self.roles_full_update = True
+        self.root_candidates = [] # Heap of (root path priority vector, port order, version, port_no).
+        self.root_candidate_vectors = {} # Current root path priority vector of each port, or None.
+        self.root_candidate_versions = {} # Heap entries of older versions are outdated.
 
         # Set default aging time.
-        self.current_aging_time = None
-        self.switch_set_aging_time(rstp_util.DEFAULT_AGING_TIME)
+        self.current_aging_time = rstp_util.DEFAULT_AGING_TIME
+        self.switch_set_aging_time(self.current_aging_time)
+        # Ports in rapid aging, with the ticks until their request runs out.
+        self.rapid_aging_ports = {}
 
         # Add STP group, needed for setting port states.
         self.stp_group = self.client.switcht_api_stp_group_create(device, SWITCH_PORT_STP_MODE_RSTP)
         self.client.switcht_api_stp_group_vlans_add(device, self.stp_group, 1, [self.vlan])
-        self.second_timer = Timer(self.second_timer_callback)
-        self.rapid_aging_timer = Timer(self.rapid_aging_workaround_callback) # TODO: See comment in "start_rapid_aging_workaround".
+        self.tick_timer = Timer(self.tick_timer_callback)
 
-        self.BridgeIdentifier = (bridge_prio, bridge_mac)
+        self.BridgeIdentifier = rstp_util.bridge_id(bridge_prio, rstp_util.mac_to_int(bridge_mac))
         self.BridgePriority = PriorityVector(self.BridgeIdentifier, 0, self.BridgeIdentifier, 0, 0)
 
         self.last_topology_change_time = None
@@ -55,11 +91,49 @@ class RstpHandler:
         # 17.13.4
         self.ForceProtocolVersion = 2 if rstp else 0
 
+        # The state machine timers count ticks of TickInterval milliseconds. 1000 gives standard behavior.
+        self.TickInterval = tick_interval
+        self.ticks_per_second = 1000 // tick_interval
+        self.tick_count = 0
+
         for port_info in port_infos.values():
             self.rstp_ports[port_info.port_no] = RstpPort(self, port_info)
+        # Ties between root path priority vectors go to the port which comes first when iterating rstp_ports.
+        self.port_order = dict((port_no, i) for i, port_no in enumerate(self.rstp_ports))
+
+        # Port states and flushes are programmed into the switch by the worker, outside of callback_lock.
+        self.hardware = HardwareWorker(
+            self.switch_set_port_state,
+            self.switch_flush_mac_entries,
+            self.switch_flush_vlan_mac_entries,
+            self.switch_set_aging_time,
+            self.packet_io.send_batch,
+            self.convergence.states_applied,
+            len(self.rstp_ports)
+        )
 
         self.port_role_selection = PortRoleSelection(self)
 
+    def __setattr__(self, name, value):
+        if name in RstpHandler.ROLES_TREE_INPUTS:
+            self.__dict__["roles_full_update"] = True
+        if name in RstpHandler.ALL_DIRTY_VARIABLES or name in BRIDGE_WATCHERS:
+            if self.__dict__.get(name, RstpHandler.ALL_DIRTY_VARIABLES) != value:
+                self.__dict__[name] = value
+                if name in RstpHandler.ALL_DIRTY_VARIABLES:
+                    self.mark_all_dirty()
+                else:
+                    for port in self.rstp_ports.values():
+                        port.dirty_machines |= BRIDGE_WATCHERS[name]
+                return
+        self.__dict__[name] = value
+
+    def mark_all_dirty(self):
+        """Makes the next update() evaluate every state machine."""
+        self.role_selection_dirty = True
+        for port in self.__dict__.get("rstp_ports", {}).values():
+            port.dirty_machines = ALL_PORT_STATE_MACHINES
+
     def do_begin_states(self):
         # The standard claims execution order of states doesn't matter,
         # but the wrong order while BEGIN is True results in attempted use of undefined variables.
@@ -93,11 +167,13 @@ class RstpHandler:
     def initialize(self):
         with self.callback_lock:
             self.do_begin_states()
-            self.second_timer.start(1.0)
+            self.hardware.start()
+            self.tick_timer.start(self.TickInterval / 1000.0)
             return True
 
     # Update all state machines.
     def update(self):
+        start = monotonic()
         # Check if there was a topology change active.
         was_topology_change = False
         for port in self.rstp_ports.values():
@@ -105,12 +181,25 @@ class RstpHandler:
                 was_topology_change = True
 
         # Do all state machine updates.
-        needsUpdate = True
-        while needsUpdate:
-            needsUpdate = False
-            needsUpdate = self.port_role_selection.update() or needsUpdate
-            for port in self.rstp_ports.values():
-                needsUpdate = port.update() or needsUpdate
+        # BPDUs transmitted during the updates are sent together once they are done, after the ports they block.
+        self.packet_io.begin_batch()
+        self.machine_evaluations = 0
+        iterations = 0
+        try:
+            needsUpdate = True
+            while needsUpdate:
+                needsUpdate = False
+                iterations += 1
+                if self.role_selection_dirty:
+                    self.role_selection_dirty = False
+                    self.machine_evaluations += 1
+                    if self.port_role_selection.update():
+                        self.role_selection_dirty = True
+                        needsUpdate = True
+                for port in self.rstp_ports.values():
+                    needsUpdate = port.update() or needsUpdate
+        finally:
+            self.hardware.send_frames(self.packet_io.end_batch())
 
         # Check if there's a topology change active after update.
         topology_change = False
@@ -118,41 +207,48 @@ class RstpHandler:
             if port.tcWhile > 0:
                 topology_change = True
             port.set_switch_state()
+            port.counters.set_throttling(port.port_transmit.tx_hold_reached())
+        self.hardware.commit()
+        self.convergence.update_finished(iterations, self.rstp_ports.values(), self.hardware.committed)
+        self.update_durations.add(monotonic() - start)
+        self.machine_evaluation_counts.add(self.machine_evaluations)
 
         if topology_change:
             self.last_topology_change_time = datetime.now()
             if not was_topology_change:
                 self.topology_change_count += 1
-
-    def start_rapid_aging(self):
-        self.rapid_aging_timer.start(self.rootTimes.BridgeForwardDelay)
-        self.switch_set_aging_time(self.rootTimes.BridgeForwardDelay)
-
-    def rapid_aging_callback(self):
-        with self.callback_lock:
-            self.switch_set_aging_time(rstp_util.DEFAULT_AGING_TIME)
-            self.rapid_aging_timer.stop()
-
-    def start_rapid_aging_workaround(self):
-        # TODO: This is used as a workaround for SwitchAPI not updating aging for existing entries
-        # when aging time is changed. Once this problem is fixed, "start_rapid_aging" and "rapid_aging_callback"
-        # should be used instead.
-        if not self.rapid_aging_timer.is_active():
-            self.rapid_aging_timer.start(self.rootTimes.BridgeForwardDelay)
-
-    def rapid_aging_workaround_callback(self):
-        with self.callback_lock:
-            self.client.switcht_api_mac_table_entries_delete_by_vlan(
-                device = device,
-                vlan_handle = self.vlan
-            )
-            self.rapid_aging_timer.stop()
+        self.events.update_finished(self)
+
+    # 17.19.7: in STP compatibility mode, a topology change ages out the entries of a port which
+    # haven't been refreshed for ForwardDelay, instead of flushing them.
+    # The switch ages the entries of the whole VLAN, so its aging time is ForwardDelay while any port asked for rapid
+    # aging within the last ForwardDelay. Every BPDU carrying the topology change asks again, so the short aging time
+    # lasts until the topology change is over, and no entries are flushed.
+    def start_rapid_aging(self, port_no):
+        self.rapid_aging_ports[port_no] = self.to_ticks(self.rootTimes.BridgeForwardDelay)
+        self.set_aging_time(max(1, int(round(self.rootTimes.BridgeForwardDelay))))
+
+    def rapid_aging_tick(self):
+        for port_no in list(self.rapid_aging_ports):
+            self.rapid_aging_ports[port_no] -= 1
+            if self.rapid_aging_ports[port_no] <= 0:
+                del self.rapid_aging_ports[port_no]
+        if not self.rapid_aging_ports:
+            self.set_aging_time(rstp_util.DEFAULT_AGING_TIME)
+
+    def set_aging_time(self, aging_time):
+        if aging_time != self.current_aging_time:
+            self.current_aging_time = aging_time
+            self.hardware.set_aging_time(aging_time)
 
     def bpdu_received_callback(self, packet, in_port):
         with self.callback_lock:
             if in_port not in self.rstp_ports:
+                self.unknown_port_counters.bpdu_dropped(in_port)
                 return
+            self.journal.bpdu_received(in_port, packet)
             rstp_port = self.rstp_ports[in_port]
+            rstp_port.counters.bpdu_received(packet.bpdutype)
             rstp_port.last_bpdu = packet
             # 17.19.25
             rstp_port.rcvdBPDU = True
@@ -166,12 +262,35 @@ class RstpHandler:
     def stpVersion(self):
         return self.ForceProtocolVersion < 2
 
+    def to_ticks(self, seconds):
+        """Converts a time in seconds to a timer value in ticks."""
+        return int(round(seconds * self.ticks_per_second))
+
+    def set_tick_interval(self, tick_interval):
+        old_tick_interval = self.TickInterval
+        self.TickInterval = tick_interval
+        self.ticks_per_second = 1000 // tick_interval
+        # Scale running timers so they expire at the same time as before.
+        for port in self.rstp_ports.values():
+            for timer_name in RstpPort.TIMER_NAMES:
+                ticks = getattr(port, timer_name)
+                setattr(port, timer_name, int(round(ticks * old_tick_interval / float(tick_interval))))
+        for port_no, ticks in self.rapid_aging_ports.items():
+            self.rapid_aging_ports[port_no] = int(round(ticks * old_tick_interval / float(tick_interval)))
+        if self.tick_timer.is_active():
+            self.tick_timer.start(tick_interval / 1000.0)
+
     # 17.22
-    def second_timer_callback(self):
+    def tick_timer_callback(self):
         with self.callback_lock:
             if self.BEGIN:
                 return
             # TICK
+            # txCount is decremented once a second, or once per hello time when the hello time is shorter,
+            # so sub-second hello times are not throttled by TxHoldCount.
+            self.tick_count += 1
+            tx_hold_ticks = max(1, min(self.ticks_per_second, self.to_ticks(self.BridgeTimes.BridgeHelloTime)))
+            decrement_tx_count = self.tick_count % tx_hold_ticks == 0
             for port in self.rstp_ports.values():
                 if port.helloWhen > 0:
                     port.helloWhen -= 1
@@ -189,8 +308,15 @@ class RstpHandler:
                     port.mdelayWhile -= 1
                 if port.edgeDelayWhile > 0:
                     port.edgeDelayWhile -= 1
-                if port.txCount > 0:
+                if port.txCount > 0 and decrement_tx_count:
                     port.txCount -= 1
+            self.rapid_aging_tick()
+
+            # The rates are estimated from the counters once a second.
+            if self.tick_count % self.ticks_per_second == 0:
+                self.unknown_port_counters.sample()
+                for port in self.rstp_ports.values():
+                    port.counters.sample()
 
             self.update()
 
@@ -198,39 +324,102 @@ class RstpHandler:
     def updtRoleDisabledTree(self):
         for port in self.rstp_ports.values():
             port.selectedRole = rstp_util.DISABLED_PORT
+        self.roles_full_update = True
+
+    def _update_root_candidate(self, port):
+        """Updates the root path priority vector of a port in the heap of root candidates."""
+        vector = None
+        if port.infoIs == rstp_util.RECEIVED:
+            portPriority = port.portPriority
+            if portPriority.DesignatedBridgeID != self.BridgePriority.DesignatedBridgeID:
+                vector = portPriority._replace(RootPathCost=portPriority.RootPathCost + port.PortPathCost)
+        if vector == self.root_candidate_vectors.get(port.port_no):
+            return
+        version = self.root_candidate_versions.get(port.port_no, 0) + 1
+        self.root_candidate_vectors[port.port_no] = vector
+        self.root_candidate_versions[port.port_no] = version
+        if vector is not None:
+            heapq.heappush(self.root_candidates, (vector, self.port_order[port.port_no], version, port.port_no))
+
+    def _rebuild_root_candidates(self):
+        self.root_candidates = []
+        self.root_candidate_vectors = {}
+        for port in self.rstp_ports.values():
+            self._update_root_candidate(port)
+
+    def _best_root_candidate(self):
+        """Returns the port_no with the best root path priority vector, or None if no port has one."""
+        # Outdated entries are removed once they reach the top.
+        while self.root_candidates:
+            vector, _, version, port_no = self.root_candidates[0]
+            if version == self.root_candidate_versions[port_no]:
+                return port_no
+            heapq.heappop(self.root_candidates)
+        return None
 
     # 17.21.25
     def updtRolesTree(self):
+        # Only the root candidates and roles of ports whose information changed are recalculated,
+        # unless the result of (a) to (c) changed or a bridge variable changed.
+        full_update = self.roles_full_update
+        if full_update or len(self.root_candidates) > 2 * len(self.rstp_ports) + 16:
+            self._rebuild_root_candidates()
+        else:
+            for port_no in self.roles_dirty_ports:
+                self._update_root_candidate(self.rstp_ports[port_no])
+
         # (a), (b) and (c)
-        self.rootPriority = self.BridgePriority.copy()
-        self.rootPortId = 0
-        self.rootTimes = self.BridgeTimes.copy()
-        for port in self.rstp_ports.values():
-            if port.infoIs == rstp_util.RECEIVED:
-                rootPathPriorityVector = port.portPriority.copy()
-                rootPathPriorityVector.RootPathCost += port.PortPathCost
+        # The vectors and times are immutable, so they are shared instead of copied.
+        rootPriority = self.BridgePriority
+        rootPortId = 0
+        rootTimes = self.BridgeTimes
+        best_port_no = self._best_root_candidate()
+        if best_port_no is not None and self.root_candidate_vectors[best_port_no] < rootPriority:
+            rootPriority = self.root_candidate_vectors[best_port_no]
+            rootPortId = rootPriority.BridgePortID
+            rootPortTimes = self.rstp_ports[best_port_no].portTimes
+            rootTimes = rootPortTimes._replace(MessageAge=round(rootPortTimes.MessageAge + 1))
+        if not full_update:
+            full_update = (
+                rootPriority != self.rootPriority or
+                rootPortId != self.rootPortId or
+                rootTimes != self.rootTimes
+            )
+        self.rootPriority = rootPriority
+        self.rootPortId = rootPortId
+        self.rootTimes = rootTimes
 
-                if rootPathPriorityVector.DesignatedBridgeID != self.BridgePriority.DesignatedBridgeID:
-                    if rootPathPriorityVector.compare_to(self.rootPriority) < 0:
-                        self.rootPriority = rootPathPriorityVector
-                        self.rootPortId = self.rootPriority.BridgePortID
-                        self.rootTimes = port.portTimes.copy()
-                        self.rootTimes.MessageAge = round(self.rootTimes.MessageAge + 1)
+        if full_update:
+            ports = self.rstp_ports.values()
+        else:
+            ports = [self.rstp_ports[port_no] for port_no in self.roles_dirty_ports]
 
         # (d) and (e)
-        for port in self.rstp_ports.values():
-            port.designatedPriority = PriorityVector(
-                self.rootPriority.RootBridgeID,
-                self.rootPriority.RootPathCost,
-                self.BridgeIdentifier,
-                port.portId,
-                port.portId
-            )
-            port.designatedTimes = self.rootTimes.copy()
-            port.designatedTimes.BridgeHelloTime = self.BridgeTimes.BridgeHelloTime
+        # All ports have the same designated times. Objects are only replaced when their values change.
+        designatedTimes = rootTimes
+        if designatedTimes.BridgeHelloTime != self.BridgeTimes.BridgeHelloTime:
+            designatedTimes = designatedTimes._replace(BridgeHelloTime=self.BridgeTimes.BridgeHelloTime)
+        for port in ports:
+            designatedPriority = port.designatedPriority
+            if (
+                designatedPriority is None or
+                designatedPriority.RootBridgeID != rootPriority.RootBridgeID or
+                designatedPriority.RootPathCost != rootPriority.RootPathCost or
+                designatedPriority.DesignatedBridgeID != self.BridgeIdentifier or
+                designatedPriority.DesignatedPortID != port.portId
+            ):
+                port.designatedPriority = PriorityVector(
+                    rootPriority.RootBridgeID,
+                    rootPriority.RootPathCost,
+                    self.BridgeIdentifier,
+                    port.portId,
+                    port.portId
+                )
+            if port.designatedTimes != designatedTimes:
+                port.designatedTimes = designatedTimes
 
         # (f) to (l)
-        for port in self.rstp_ports.values():
+        for port in ports:
             if port.infoIs == rstp_util.DISABLED:
                 # (f)
                 port.selectedRole = rstp_util.DISABLED_PORT
@@ -244,7 +433,7 @@ class RstpHandler:
                     port.selectedRole = rstp_util.DESIGNATED_PORT
                     if (
                         port.portPriority.compare_to(port.designatedPriority) != 0 or
-                        not port.portTimes.equals(self.rootTimes)
+                        port.portTimes != self.rootTimes
                     ):
                         port.updtInfo = True
                 elif port.infoIs == rstp_util.RECEIVED:
@@ -267,6 +456,10 @@ class RstpHandler:
                                 port.selectedRole = rstp_util.BACKUP_PORT
                                 port.updtInfo = False
 
+        # The assignments above marked the ports as dirty, but their roles are up to date now.
+        self.roles_dirty_ports.clear()
+        self.roles_full_update = False
+
     # 17.21.14
     def setSyncTree(self):
         for port in self.rstp_ports.values():
@@ -311,27 +504,48 @@ class RstpHandler:
             port.reselect = False
 
     def switch_set_port_state(self, port_no, stp_state):
+        start = monotonic()
         self.client.switcht_api_stp_port_state_set(
             device = device,
             stp_handle = self.stp_group,
             intf_handle = self.rstp_ports[port_no].port_info.interface,
             stp_state = stp_state
         )
-
-    def switch_flush_mac_entries(self, port_no):
-        self.client.switcht_api_mac_table_entries_delete_by_interface(
+        self.journal.set_port_state(port_no, stp_state, monotonic() - start)
+
+    def switch_flush_mac_entries(self, port_nos):
+        # All requests are sent before the first response is read, so a topology change which flushes every port but one
+        # waits for one round trip to SwitchAPI instead of one per port. Responses come back in the order of the requests.
+        start = monotonic()
+        for port_no in port_nos:
+            self.client.send_switcht_api_mac_table_entries_delete_by_interface(
+                device = device,
+                intf_handle = self.rstp_ports[port_no].port_info.interface
+            )
+        error = None
+        for port_no in port_nos:
+            # A failed flush still consumes its response, so the ones after it are read too.
+            try:
+                self.client.recv_switcht_api_mac_table_entries_delete_by_interface()
+            except Exception as e:
+                error = error or e
+            self.journal.flush_mac_entries(port_no, monotonic() - start)
+        if error is not None:
+            raise error
+
+    def switch_flush_vlan_mac_entries(self):
+        self.client.switcht_api_mac_table_entries_delete_by_vlan(
             device = device,
-            intf_handle = self.rstp_ports[port_no].port_info.interface
+            vlan_handle = self.vlan
         )
 
     def switch_set_aging_time(self, aging_time):
-        if aging_time != self.current_aging_time:
-            self.current_aging_time = aging_time
-            self.client.switcht_api_vlan_aging_interval_set(self.vlan, aging_time * 1000)
+        self.client.switcht_api_vlan_aging_interval_set(self.vlan, aging_time * 1000)
 
     def teardown(self):
+        # A tick which is running waits for callback_lock, so it is waited for before taking the lock.
+        self.tick_timer.cancel()
         with self.callback_lock:
-            self.second_timer.cancel()
-            self.rapid_aging_timer.cancel()
+            self.hardware.stop()
             self.client.switcht_api_stp_group_vlans_remove(device, self.stp_group, 1, [self.vlan])
             self.client.switcht_api_stp_group_delete(device, self.stp_group)
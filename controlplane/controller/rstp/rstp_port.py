@@ -4,13 +4,62 @@ from structures import *
 from timer import Timer
 import rstp_util
 from state_machines import *
+from tracing import tracer, PORT_STATE_BIT
+from counters import PortCounters
 
 from switch_api_thrift.ttypes import *
 from switch_api_thrift.switch_api_headers import *
 
+# Per port state machines, in the order they are evaluated.
+PORT_STATE_MACHINES = (
+    PortReceive,
+    PortProtocolMigration,
+    BridgeDetection,
+    PortTransmit,
+    PortInformation,
+    PortRoleTransitions,
+    PortStateTransition,
+    TopologyChange
+)
+ALL_PORT_STATE_MACHINES = (1 << len(PORT_STATE_MACHINES)) - 1
+
+def _watchers(inputs_name):
+    """Maps each variable to a bit mask of the state machines that list it in their inputs_name."""
+    watchers = {}
+    for i, state_machine_class in enumerate(PORT_STATE_MACHINES):
+        for variable in getattr(state_machine_class, inputs_name):
+            watchers[variable] = watchers.get(variable, 0) | (1 << i)
+    return watchers
+
+PORT_WATCHERS = _watchers("INPUTS")
+TREE_WATCHERS = _watchers("TREE_INPUTS")
+BRIDGE_WATCHERS = _watchers("BRIDGE_INPUTS")
+# Port variables read by updtRolesTree(), plus updtInfo which is also written by PortInformation.
+# Roles only have to be recalculated for ports where one of them changed.
+ROLES_TREE_INPUTS = frozenset(["PortPathCost", "infoIs", "portId", "portPriority", "portTimes", "updtInfo"])
+WATCHED_VARIABLES = (
+    frozenset(PORT_WATCHERS) |
+    frozenset(TREE_WATCHERS) |
+    frozenset(PortRoleSelection.TREE_INPUTS) |
+    ROLES_TREE_INPUTS
+)
+
 class RstpPort:
     """Class representing a single port in the RSTP algorithm."""
+    # 17.17, counted in ticks.
+    TIMER_NAMES = (
+        "edgeDelayWhile",
+        "fdWhile",
+        "helloWhen",
+        "mdelayWhile",
+        "rbWhile",
+        "rcvdInfoWhile",
+        "rrWhile",
+        "tcWhile"
+    )
+
     def __init__(self, rstp_handler, port_info):
+        self.dirty_machines = ALL_PORT_STATE_MACHINES
         self.rstp_handler = rstp_handler
         self.port_info = port_info
         self.port_no = port_info.port_no
@@ -25,6 +74,9 @@ class RstpPort:
         self.AdminEdgePort = False
         self.AutoEdgePort = True
         self.operPointToPointMAC = True
+        self.designatedPriority = None
+        self.designatedTimes = None
+        self.counters = PortCounters()
 
         # State machines.
         self.port_receive = PortReceive(rstp_handler, self)
@@ -35,29 +87,56 @@ class RstpPort:
         self.port_role_transitions = PortRoleTransitions(rstp_handler, self)
         self.port_state_transition = PortStateTransition(rstp_handler, self)
         self.topology_change = TopologyChange(rstp_handler, self)
+        # In the order of PORT_STATE_MACHINES.
+        self.state_machines = (
+            self.port_receive,
+            self.port_protocol_migration,
+            self.bridge_detection,
+            self.port_transmit,
+            self.port_information,
+            self.port_role_transitions,
+            self.port_state_transition,
+            self.topology_change
+        )
+
+    def __setattr__(self, name, value):
+        # Mark the state machines that read a variable as dirty when its value changes.
+        if name in WATCHED_VARIABLES and self.__dict__.get(name, WATCHED_VARIABLES) != value:
+            self.dirty_machines |= PORT_WATCHERS.get(name, 0)
+            tree_watchers = TREE_WATCHERS.get(name, 0)
+            if tree_watchers:
+                for port in self.rstp_handler.rstp_ports.values():
+                    port.dirty_machines |= tree_watchers
+            if name in PortRoleSelection.TREE_INPUTS:
+                self.rstp_handler.role_selection_dirty = True
+            if name in ROLES_TREE_INPUTS:
+                self.rstp_handler.roles_dirty_ports.add(self.port_no)
+        self.__dict__[name] = value
 
     def update(self):
+        """Evaluates the state machines whose inputs changed. Returns True if any of them made a transition."""
         wasUpdated = False
-        wasUpdated = self.port_receive.update() or wasUpdated
-        wasUpdated = self.port_protocol_migration.update() or wasUpdated
-        wasUpdated = self.bridge_detection.update() or wasUpdated
-        wasUpdated = self.port_transmit.update() or wasUpdated
-        wasUpdated = self.port_information.update() or wasUpdated
-        wasUpdated = self.port_role_transitions.update() or wasUpdated
-        wasUpdated = self.port_state_transition.update() or wasUpdated
-        wasUpdated = self.topology_change.update() or wasUpdated
+        for i, state_machine in enumerate(self.state_machines):
+            bit = 1 << i
+            if self.dirty_machines & bit:
+                self.dirty_machines &= ~bit
+                self.rstp_handler.machine_evaluations += 1
+                if state_machine.update():
+                    # A state may have transitions that don't depend on any input, so evaluate it again.
+                    self.dirty_machines |= bit
+                    wasUpdated = True
 
         if self.fdbFlush:
             if self.rstp_handler.rstpVersion():
-                self.rstp_handler.switch_flush_mac_entries(self.port_no)
+                self.rstp_handler.hardware.flush_port(self.port_no)
                 self.fdbFlush = False
             elif self.rstp_handler.stpVersion():
-                self.rstp_handler.start_rapid_aging_workaround() # TODO: See "start_rapid_aging_workaround" in rstp_handler.py.
+                self.rstp_handler.start_rapid_aging(self.port_no)
                 self.fdbFlush = False
 
         return wasUpdated
 
-    # Update the switch stp state if needed.
+    # Queue an update of the switch stp state if needed.
     def set_switch_state(self):
         new_switch_state = None
         if self.state == rstp_util.PORT_STATE_DISCARDING:
@@ -70,7 +149,7 @@ class RstpPort:
             assert False, "Invalid port state"
 
         if new_switch_state != self.switch_state:
-            self.rstp_handler.switch_set_port_state(self.port_no, new_switch_state)
+            self.rstp_handler.hardware.set_port_state(self.port_no, new_switch_state)
             self.switch_state = new_switch_state
 
 
@@ -96,21 +175,23 @@ class RstpPort:
         else:
             return self.FwdDelay()
 
+    # The times of 17.20.4 to 17.20.9 are only used for timers, so they are returned in ticks.
+
     # 17.20.6
     def FwdDelay(self):
-        return self.designatedTimes.BridgeForwardDelay
+        return self.rstp_handler.to_ticks(self.designatedTimes.BridgeForwardDelay)
 
     # 17.20.7
     def HelloTime(self):
-        return self.designatedTimes.BridgeHelloTime
+        return self.rstp_handler.to_ticks(self.designatedTimes.BridgeHelloTime)
 
     # 17.20.8
     def MaxAge(self):
-        return self.designatedTimes.BridgeMaxAge
+        return self.rstp_handler.to_ticks(self.designatedTimes.BridgeMaxAge)
 
     # 17.20.9
     def MigrateTime(self):
-        return rstp_util.MIGRATE_TIME
+        return self.rstp_handler.to_ticks(rstp_util.MIGRATE_TIME)
 
     # 17.20.10
     def reRooted(self):
@@ -139,34 +220,37 @@ class RstpPort:
 
     # 17.21.3 and 17.21.4 combined.
     def disableLearningForwarding(self):
-        print("Port {}: {} -> {}".format(self.port_no, rstp_util.rstp_state_to_string(self.state), rstp_util.rstp_state_to_string(rstp_util.PORT_STATE_DISCARDING)))
+        if tracer.category_mask & PORT_STATE_BIT:
+            tracer.trace_port_state(self.port_no, self.state, rstp_util.PORT_STATE_DISCARDING)
         self.state = rstp_util.PORT_STATE_DISCARDING
 
     # 17.21.5
     def enableForwarding(self):
-        print("Port {}: {} -> {}".format(self.port_no, rstp_util.rstp_state_to_string(self.state), rstp_util.rstp_state_to_string(rstp_util.PORT_STATE_FORWARDING)))
+        if tracer.category_mask & PORT_STATE_BIT:
+            tracer.trace_port_state(self.port_no, self.state, rstp_util.PORT_STATE_FORWARDING)
         self.state = rstp_util.PORT_STATE_FORWARDING
 
     # 17.21.6
     def enableLearning(self):
-        print("Port {}: {} -> {}".format(self.port_no, rstp_util.rstp_state_to_string(self.state), rstp_util.rstp_state_to_string(rstp_util.PORT_STATE_LEARNING)))
+        if tracer.category_mask & PORT_STATE_BIT:
+            tracer.trace_port_state(self.port_no, self.state, rstp_util.PORT_STATE_LEARNING)
         self.state = rstp_util.PORT_STATE_LEARNING
 
     # 17.21.7
     def newTcWhile(self):
         if self.tcWhile == 0:
             if self.sendRSTP:
-                self.tcWhile = self.HelloTime() + 1
+                self.tcWhile = self.HelloTime() + self.rstp_handler.to_ticks(1)
                 self.newInfo = True
             else:
-                self.tcWhile = self.rstp_handler.rootTimes.BridgeMaxAge + self.rstp_handler.rootTimes.BridgeForwardDelay
+                self.tcWhile = self.rstp_handler.to_ticks(self.rstp_handler.rootTimes.BridgeMaxAge + self.rstp_handler.rootTimes.BridgeForwardDelay)
 
     # 17.21.8
     def rcvInfo(self):
         self.msgPriority = PriorityVector(
-            (self.last_bpdu.rootid, self.last_bpdu.rootmac),
+            self.last_bpdu.rootbridgeid,
             self.last_bpdu.pathcost,
-            (self.last_bpdu.bridgeid, self.last_bpdu.bridgemac),
+            self.last_bpdu.designatedbridgeid,
             self.last_bpdu.portid,
             self.portId
         )
@@ -187,7 +271,7 @@ class RstpPort:
             is_designated_port_role and
             (
                 self.is_msg_priority_superior() or
-                (self.msgPriority.compare_to(self.portPriority) == 0 and not self.msgTimes.equals(self.portTimes))
+                (self.msgPriority.compare_to(self.portPriority) == 0 and self.msgTimes != self.portTimes)
             )
         ):
             return rstp_util.SUPERIOR_DESIGNATED_INFO
@@ -195,7 +279,7 @@ class RstpPort:
         if (
             is_designated_port_role and
             self.msgPriority.compare_to(self.portPriority) == 0 and
-            self.msgTimes.equals(self.portTimes)
+            self.msgTimes == self.portTimes
         ):
             return rstp_util.REPEATED_DESIGNATED_INFO
 
@@ -250,13 +334,15 @@ class RstpPort:
 
     # 17.21.12
     def recordPriority(self):
-        self.portPriority = self.msgPriority.copy()
+        self.portPriority = self.msgPriority
 
     # 17.21.13
     def recordTimes(self):
-        self.portTimes = self.msgTimes.copy()
-        if self.portTimes.BridgeHelloTime < 1:
-            self.portTimes.BridgeHelloTime = 1
+        self.portTimes = self.msgTimes
+        # The standard minimum of 1 second is lowered to one tick when running with sub-second ticks.
+        min_hello_time = self.rstp_handler.TickInterval / 1000.0
+        if self.portTimes.BridgeHelloTime < min_hello_time:
+            self.portTimes = self.portTimes._replace(BridgeHelloTime=min_hello_time)
 
     # 17.21.17
     def setTcFlags(self):
@@ -277,13 +363,20 @@ class RstpPort:
         if self.tcAck:
             flags |= rstp_util.BPDU_FLAGS_TOPOLOGY_CHANGE_ACK_BIT
 
+        self.counters.bpdu_sent(rstp_util.BPDU_TYPE_CONFIGURATION)
+        self.rstp_handler.journal.bpdu_sent(
+            self.port_no,
+            rstp_util.BPDU_TYPE_CONFIGURATION,
+            flags,
+            self.designatedPriority.RootBridgeID,
+            self.designatedPriority.RootPathCost,
+            self.designatedPriority.DesignatedPortID
+        )
         self.rstp_handler.packet_io.send_config_bpdu(
             flags,
-            self.designatedPriority.RootBridgeID[0],
-            self.designatedPriority.RootBridgeID[1],
+            self.designatedPriority.RootBridgeID,
             self.designatedPriority.RootPathCost,
-            self.designatedPriority.DesignatedBridgeID[0],
-            self.designatedPriority.DesignatedBridgeID[1],
+            self.designatedPriority.DesignatedBridgeID,
             self.designatedPriority.DesignatedPortID,
             self.designatedTimes.MessageAge,
             self.designatedTimes.BridgeMaxAge,
@@ -316,13 +409,20 @@ class RstpPort:
         if self.forwarding:
             flags |= rstp_util.BPDU_FLAGS_FORWARDING_BIT
 
+        self.counters.bpdu_sent(rstp_util.BPDU_TYPE_RSTP)
+        self.rstp_handler.journal.bpdu_sent(
+            self.port_no,
+            rstp_util.BPDU_TYPE_RSTP,
+            flags,
+            self.designatedPriority.RootBridgeID,
+            self.designatedPriority.RootPathCost,
+            self.designatedPriority.DesignatedPortID
+        )
         self.rstp_handler.packet_io.send_rstp_bpdu(
             flags,
-            self.designatedPriority.RootBridgeID[0],
-            self.designatedPriority.RootBridgeID[1],
+            self.designatedPriority.RootBridgeID,
             self.designatedPriority.RootPathCost,
-            self.designatedPriority.DesignatedBridgeID[0],
-            self.designatedPriority.DesignatedBridgeID[1],
+            self.designatedPriority.DesignatedBridgeID,
             self.designatedPriority.DesignatedPortID,
             self.designatedTimes.MessageAge,
             self.designatedTimes.BridgeMaxAge,
@@ -333,6 +433,8 @@ class RstpPort:
 
     # 17.21.21
     def txTcn(self):
+        self.counters.bpdu_sent(rstp_util.BPDU_TYPE_TOPOLOGY_CHANGE_NOTIFICATION)
+        self.rstp_handler.journal.bpdu_sent(self.port_no, rstp_util.BPDU_TYPE_TOPOLOGY_CHANGE_NOTIFICATION, 0)
         self.rstp_handler.packet_io.send_tcn_bpdu(self.port_no)
 
     # 17.21.22
@@ -345,7 +447,7 @@ class RstpPort:
     # 17.21.23
     def updtRcvdInfoWhile(self):
         if round(self.portTimes.MessageAge + 1) <= self.portTimes.BridgeMaxAge:
-            self.rcvdInfoWhile = 3 * self.portTimes.BridgeHelloTime
+            self.rcvdInfoWhile = self.rstp_handler.to_ticks(3 * self.portTimes.BridgeHelloTime)
         else:
             self.rcvdInfoWhile = 0
 
@@ -76,13 +76,21 @@ INFERIOR_DESIGNATED_INFO = 2
 INFERIOR_ROOT_ALTERNATE_INFO = 3
 OTHER_INFO = 4
 
-def is_id_better(id, other_id):
-    """Checks if an id is better than another. 'id' and 'other_id' are tuples of a priority value and a mac address string."""
-    id_prio = id[0]
-    id_mac_int = int(id[1].translate(None, ":"), 16)
-    other_id_prio = other_id[0]
-    other_id_mac_int = int(other_id[1].translate(None, ":"), 16)
-
-    if id_prio != other_id_prio:
-        return id_prio < other_id_prio
-    return id_mac_int < other_id_mac_int
\ No newline at end of file
+# Bridge identifiers are 64 bit integers of the priority followed by the mac address, as sent in BPDUs,
+# so comparing two identifiers is a single integer comparison.
+BRIDGE_ID_MAC_MASK = 0xFFFFFFFFFFFF
+
+def bridge_id(priority, mac_int):
+    return (priority << 48) | mac_int
+
+def bridge_id_priority(bridge_id):
+    return bridge_id >> 48
+
+def bridge_id_mac(bridge_id):
+    return bridge_id & BRIDGE_ID_MAC_MASK
+
+def mac_to_int(mac_string):
+    return int(mac_string.replace(":", ""), 16)
+
+def mac_to_string(mac_int):
+    return ":".join("{:02x}".format((mac_int >> shift) & 0xFF) for shift in range(40, -8, -8))
\ No newline at end of file
@@ -1,117 +1,187 @@
 import rstp_util
+from tracing import tracer, category_bit
+import journal
+import convergence
 
-DEBUG_PRINT = False
+UCT = None # Guard of an unconditional transition.
+
+class CompiledStateMachine:
+    """Transition tables of a state machine class, resolved to functions and indexed by state."""
+    def __init__(self, cls):
+        self.state_names = dict(cls.STATE_NAMES)
+        self.entry_actions = {}
+        for state, name in cls.STATE_NAMES.items():
+            self.entry_actions[state] = self._function(cls, "enter_" + name)
+        self.guard_names = ["UCT"] # By guard id, which is the index used in transitions and the journal.
+        self.trace_bit = category_bit(cls.__name__)
+        self.condition = self._function(cls, cls.CONDITION) if cls.CONDITION else None
+        self.begin_transitions = self._transitions(cls, cls.BEGIN_TRANSITIONS)
+        self.global_transitions = self._transitions(cls, cls.GLOBAL_TRANSITIONS)
+        self.transitions = {}
+        for state in cls.STATE_NAMES:
+            self.transitions[state] = self._transitions(cls, cls.TRANSITIONS.get(state, ()))
+        self.journal_id = journal.register_machine(cls.__name__, self.state_names, self.guard_names)
+
+    def _function(self, cls, name):
+        attribute = getattr(cls, name)
+        return getattr(attribute, "__func__", attribute) # Plain function, so calls skip the unbound method check.
+
+    def _transitions(self, cls, transitions):
+        compiled = []
+        for guard_name, new_state in transitions:
+            if guard_name is UCT:
+                compiled.append((None, new_state, 0))
+            else:
+                if guard_name not in self.guard_names:
+                    self.guard_names.append(guard_name)
+                compiled.append((self._function(cls, guard_name), new_state, self.guard_names.index(guard_name)))
+        return tuple(compiled)
 
 class StateMachine:
+    # Variables read by the transition conditions, besides BEGIN. A machine only has to be evaluated when one of them
+    # has changed since its last evaluation, or when it made a transition.
+    INPUTS = () # Variables of its own port.
+    TREE_INPUTS = () # Variables of any port, e.g. read through allSynced().
+    BRIDGE_INPUTS = () # Variables of the RstpHandler.
+
+    # Transition tables. Transitions are (guard, new state) pairs, where the guard is the name of a method returning
+    # whether the transition is taken, or UCT. The first transition whose guard holds is taken, in this order:
+    BEGIN_TRANSITIONS = () # While BEGIN is asserted.
+    GLOBAL_TRANSITIONS = () # From any state.
+    TRANSITIONS = {} # From the state used as key.
+    # Name of a method qualifying all transitions except the BEGIN and UCT ones, e.g. "selected && !updtInfo".
+    CONDITION = None
+    # Every state has a name and an entry action, the method "enter_" + name.
+    STATE_NAMES = {}
+
     def __init__(self, port=None):
+        cls = self.__class__
+        if "_table" not in cls.__dict__:
+            cls._table = CompiledStateMachine(cls)
         self.state = None
         self.port = port
+        self.journal_port_no = port.port_no if port else journal.NO_PORT
+        self.last_guard = None # Guard of the last transition, for tracing.
 
-    def enter_state(self, new_state):
-        old_state_name = self.state_name(self.state) if self.state != None else "none"
-        new_state_name = self.state_name(new_state)
-        if DEBUG_PRINT:
-            if self.port:
-                print("Port {}: {} ({} -> {})".format(self.port.port_no, self.__class__.__name__, old_state_name, new_state_name))
-            else:
-                print("{} ({} -> {})".format(self.__class__.__name__, old_state_name, new_state_name))
+    def update(self):
+        table = self._table
+        if self.rstp_handler.BEGIN:
+            for guard, new_state, guard_id in table.begin_transitions:
+                if guard is None or guard(self):
+                    return self.enter_state(new_state, guard_id)
+
+        # The condition is only evaluated once a qualified transition is reached, as it may read variables which
+        # don't exist yet before the first BEGIN.
+        qualified = None
+        if table.global_transitions:
+            qualified = table.condition is None or table.condition(self)
+            if qualified:
+                for guard, new_state, guard_id in table.global_transitions:
+                    if guard(self):
+                        return self.enter_state(new_state, guard_id)
+
+        for guard, new_state, guard_id in table.transitions[self.state]:
+            if guard is None:
+                return self.enter_state(new_state, guard_id)
+            if qualified is None:
+                qualified = table.condition is None or table.condition(self)
+            if qualified and guard(self):
+                return self.enter_state(new_state, guard_id)
+        return False
+
+    def enter_state(self, new_state, guard_id):
+        table = self._table
+        self.rstp_handler.journal.transition(table.journal_id, self.journal_port_no, self.state, new_state, guard_id)
+        self.last_guard = table.guard_names[guard_id]
+        if tracer.category_mask & table.trace_bit:
+            tracer.trace_transition(self, self.state, new_state, self.last_guard)
         self.state = new_state
-        self.on_enter_state()
+        table.entry_actions[new_state](self)
         return True
 
+    def state_name(self, state):
+        return self._table.state_names[state]
+
 # 17.28
 class PortRoleSelection(StateMachine):
     INIT_BRIDGE = 0
     ROLE_SELECTION = 1
 
+    TREE_INPUTS = ("reselect",)
+
+    STATE_NAMES = {
+        INIT_BRIDGE: "init_bridge",
+        ROLE_SELECTION: "role_selection"
+    }
+    BEGIN_TRANSITIONS = ((UCT, INIT_BRIDGE),)
+    TRANSITIONS = {
+        INIT_BRIDGE: ((UCT, ROLE_SELECTION),),
+        ROLE_SELECTION: (("any_reselect", ROLE_SELECTION),)
+    }
+
     def __init__(self, rstp_handler):
         self.rstp_handler = rstp_handler
         StateMachine.__init__(self)
 
-    def update(self):
-        if self.rstp_handler.BEGIN:
-            return self.enter_state(PortRoleSelection.INIT_BRIDGE)
-
-        if self.state == PortRoleSelection.INIT_BRIDGE:
-            return self.enter_state(PortRoleSelection.ROLE_SELECTION)
-        elif self.state == PortRoleSelection.ROLE_SELECTION:
-            for port in self.rstp_handler.rstp_ports.values():
-                if port.reselect:
-                    return self.enter_state(PortRoleSelection.ROLE_SELECTION)
-        else:
-            assert False
+    def any_reselect(self):
+        for port in self.rstp_handler.rstp_ports.values():
+            if port.reselect:
+                return True
         return False
 
-    def on_enter_state(self):
-        if self.state == PortRoleSelection.INIT_BRIDGE:
-            self.rstp_handler.updtRoleDisabledTree()
-        elif self.state == PortRoleSelection.ROLE_SELECTION:
-            self.rstp_handler.clearReselectTree()
-            self.rstp_handler.updtRolesTree()
-            self.rstp_handler.setSelectedTree()
-        else:
-            assert False
+    def enter_init_bridge(self):
+        self.rstp_handler.updtRoleDisabledTree()
 
-    def state_name(self, state):
-        if state == PortRoleSelection.INIT_BRIDGE:
-            return "init_bridge"
-        elif state == PortRoleSelection.ROLE_SELECTION:
-            return "role_selection"
-        else:
-            assert False
+    def enter_role_selection(self):
+        self.rstp_handler.clearReselectTree()
+        self.rstp_handler.updtRolesTree()
+        self.rstp_handler.setSelectedTree()
 
 # 17.23
 class PortReceive(StateMachine):
     DISCARD = 0
     RECEIVE = 1
 
+    INPUTS = ("edgeDelayWhile", "portEnabled", "rcvdBPDU", "rcvdMsg")
+
+    STATE_NAMES = {
+        DISCARD: "discard",
+        RECEIVE: "receive"
+    }
+    BEGIN_TRANSITIONS = ((UCT, DISCARD),)
+    GLOBAL_TRANSITIONS = (("rcvd_while_disabled", DISCARD),)
+    TRANSITIONS = {
+        DISCARD: (("rcvd_bpdu", RECEIVE),),
+        RECEIVE: (("rcvd_bpdu_and_not_rcvd_msg", RECEIVE),)
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if self.rstp_handler.BEGIN:
-            return self.enter_state(PortReceive.DISCARD)
-        if (
-            (self.port.rcvdBPDU or self.port.edgeDelayWhile != self.port.MigrateTime()) and
-            not self.port.portEnabled
-        ):
-            return self.enter_state(PortReceive.DISCARD)
-
-        if self.state == PortReceive.DISCARD:
-            if self.port.rcvdBPDU and self.port.portEnabled:
-                return self.enter_state(PortReceive.RECEIVE)
-        elif self.state == PortReceive.RECEIVE:
-            if self.port.rcvdBPDU and self.port.portEnabled and not self.port.rcvdMsg:
-                return self.enter_state(PortReceive.RECEIVE)
-        else:
-            assert False
-        return False
+    def rcvd_while_disabled(self):
+        return (self.port.rcvdBPDU or self.port.edgeDelayWhile != self.port.MigrateTime()) and not self.port.portEnabled
 
-    def on_enter_state(self):
-        if self.state == PortReceive.DISCARD:
-            self.port.rcvdBPDU = False
-            self.port.rcvdRSTP = False
-            self.port.rcvdSTP = False
-            self.port.rcvdMsg = False
-            self.port.edgeDelayWhile = self.port.MigrateTime()
-        elif self.state == PortReceive.RECEIVE:
-            self.port.updtBPDUVersion()
-            self.port.operEdge = False
-            self.port.rcvdBPDU = False
-            self.port.rcvdMsg = True
-            self.port.edgeDelayWhile = self.port.MigrateTime()
-        else:
-            assert False
+    def rcvd_bpdu(self):
+        return self.port.rcvdBPDU and self.port.portEnabled
 
-    def state_name(self, state):
-        if state == PortReceive.DISCARD:
-            return "discard"
-        elif state == PortReceive.RECEIVE:
-            return "receive"
-        else:
-            assert False
+    def rcvd_bpdu_and_not_rcvd_msg(self):
+        return self.port.rcvdBPDU and self.port.portEnabled and not self.port.rcvdMsg
+
+    def enter_discard(self):
+        self.port.rcvdBPDU = False
+        self.port.rcvdRSTP = False
+        self.port.rcvdSTP = False
+        self.port.rcvdMsg = False
+        self.port.edgeDelayWhile = self.port.MigrateTime()
+
+    def enter_receive(self):
+        self.port.updtBPDUVersion()
+        self.port.operEdge = False
+        self.port.rcvdBPDU = False
+        self.port.rcvdMsg = True
+        self.port.edgeDelayWhile = self.port.MigrateTime()
 
 # 17.24
 class PortProtocolMigration(StateMachine):
@@ -119,59 +189,63 @@ class PortProtocolMigration(StateMachine):
     SELECTING_STP = 1
     SENSING = 2
 
+    INPUTS = ("mcheck", "mdelayWhile", "portEnabled", "rcvdRSTP", "rcvdSTP", "sendRSTP")
+    BRIDGE_INPUTS = ("ForceProtocolVersion",)
+
+    STATE_NAMES = {
+        CHECKING_RSTP: "checking_rstp",
+        SELECTING_STP: "selecting_stp",
+        SENSING: "sensing"
+    }
+    BEGIN_TRANSITIONS = ((UCT, CHECKING_RSTP),)
+    TRANSITIONS = {
+        CHECKING_RSTP: (
+            ("mdelay_expired", SENSING),
+            ("mdelay_running_and_disabled", CHECKING_RSTP)
+        ),
+        SELECTING_STP: (("stp_sensing_done", SENSING),),
+        SENSING: (
+            ("rcvd_stp", SELECTING_STP),
+            ("migrate_to_rstp", CHECKING_RSTP)
+        )
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if self.rstp_handler.BEGIN:
-            return self.enter_state(PortProtocolMigration.CHECKING_RSTP)
-
-        if self.state == PortProtocolMigration.CHECKING_RSTP:
-            if self.port.mdelayWhile == 0:
-                return self.enter_state(PortProtocolMigration.SENSING)
-            elif self.port.mdelayWhile != self.port.MigrateTime() and not self.port.portEnabled:
-                return self.enter_state(PortProtocolMigration.CHECKING_RSTP)
-        elif self.state == PortProtocolMigration.SELECTING_STP:
-            if self.port.mdelayWhile == 0 or not self.port.portEnabled or self.port.mcheck:
-                return self.enter_state(PortProtocolMigration.SENSING)
-        elif self.state == PortProtocolMigration.SENSING:
-            if self.port.sendRSTP and self.port.rcvdSTP:
-                return self.enter_state(PortProtocolMigration.SELECTING_STP)
-            elif (
-                not self.port.portEnabled or
-                self.port.mcheck or
-                (self.rstp_handler.rstpVersion() and not self.port.sendRSTP and self.port.rcvdRSTP)
-            ):
-                return self.enter_state(PortProtocolMigration.CHECKING_RSTP)
-        else:
-            assert False
-        return False
+    def mdelay_expired(self):
+        return self.port.mdelayWhile == 0
 
-    def on_enter_state(self):
-        if self.state == PortProtocolMigration.CHECKING_RSTP:
-            self.port.mcheck = False
-            self.port.sendRSTP = self.rstp_handler.rstpVersion()
-            self.port.mdelayWhile = self.port.MigrateTime()
-        elif self.state == PortProtocolMigration.SELECTING_STP:
-            self.port.sendRSTP = False
-            self.port.mdelayWhile = self.port.MigrateTime()
-        elif self.state == PortProtocolMigration.SENSING:
-            self.port.rcvdRSTP = False
-            self.port.rcvdSTP = False
-        else:
-            assert False
+    def mdelay_running_and_disabled(self):
+        return self.port.mdelayWhile != self.port.MigrateTime() and not self.port.portEnabled
 
-    def state_name(self, state):
-        if state == PortProtocolMigration.CHECKING_RSTP:
-            return "checking_rstp"
-        elif state == PortProtocolMigration.SELECTING_STP:
-            return "selecting_stp"
-        elif state == PortProtocolMigration.SENSING:
-            return "sensing"
-        else:
-            assert False
+    def stp_sensing_done(self):
+        return self.port.mdelayWhile == 0 or not self.port.portEnabled or self.port.mcheck
+
+    def rcvd_stp(self):
+        return self.port.sendRSTP and self.port.rcvdSTP
+
+    def migrate_to_rstp(self):
+        return (
+            not self.port.portEnabled or
+            self.port.mcheck or
+            (self.rstp_handler.rstpVersion() and not self.port.sendRSTP and self.port.rcvdRSTP)
+        )
+
+    def enter_checking_rstp(self):
+        self.port.mcheck = False
+        self.port.sendRSTP = self.rstp_handler.rstpVersion()
+        self.port.mdelayWhile = self.port.MigrateTime()
+
+    def enter_selecting_stp(self):
+        self.port.sendRSTP = False
+        self.port.mdelayWhile = self.port.MigrateTime()
+
+    def enter_sensing(self):
+        self.port.rcvdRSTP = False
+        self.port.rcvdSTP = False
 
 
 # 17.25
@@ -179,53 +253,51 @@ class BridgeDetection(StateMachine):
     EDGE = 0
     NOT_EDGE = 1
 
+    INPUTS = ("AdminEdgePort", "AutoEdgePort", "edgeDelayWhile", "operEdge", "portEnabled", "proposing", "sendRSTP")
+
+    STATE_NAMES = {
+        EDGE: "edge",
+        NOT_EDGE: "not_edge"
+    }
+    BEGIN_TRANSITIONS = (
+        ("admin_edge", EDGE),
+        ("not_admin_edge", NOT_EDGE)
+    )
+    TRANSITIONS = {
+        EDGE: (("edge_lost", NOT_EDGE),),
+        NOT_EDGE: (("edge_detected", EDGE),)
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if self.rstp_handler.BEGIN and self.port.AdminEdge():
-            return self.enter_state(BridgeDetection.EDGE)
-        elif self.rstp_handler.BEGIN and not self.port.AdminEdge():
-            return self.enter_state(BridgeDetection.NOT_EDGE)
-
-        if self.state == BridgeDetection.EDGE:
-            if (
-                (not self.port.portEnabled and not self.port.AdminEdge()) or
-                not self.port.operEdge
-            ):
-                return self.enter_state(BridgeDetection.NOT_EDGE)
-        elif self.state == BridgeDetection.NOT_EDGE:
-            if (
-                (not self.port.portEnabled and self.port.AdminEdge()) or
-                (
-                    self.port.edgeDelayWhile == 0 and
-                    self.port.AutoEdge() and
-                    self.port.sendRSTP and
-                    self.port.proposing
-                )
-            ):
-                return self.enter_state(BridgeDetection.EDGE)
-        else:
-            assert False
-        return False
+    def admin_edge(self):
+        return self.port.AdminEdge()
 
-    def on_enter_state(self):
-        if self.state == BridgeDetection.EDGE:
-            self.port.operEdge = True
-        elif self.state == BridgeDetection.NOT_EDGE:
-            self.port.operEdge = False
-        else:
-            assert False
+    def not_admin_edge(self):
+        return not self.port.AdminEdge()
 
-    def state_name(self, state):
-        if state == BridgeDetection.EDGE:
-            return "edge"
-        elif state == BridgeDetection.NOT_EDGE:
-            return "not_edge"
-        else:
-            assert False
+    def edge_lost(self):
+        return (not self.port.portEnabled and not self.port.AdminEdge()) or not self.port.operEdge
+
+    def edge_detected(self):
+        return (
+            (not self.port.portEnabled and self.port.AdminEdge()) or
+            (
+                self.port.edgeDelayWhile == 0 and
+                self.port.AutoEdge() and
+                self.port.sendRSTP and
+                self.port.proposing
+            )
+        )
+
+    def enter_edge(self):
+        self.port.operEdge = True
+
+    def enter_not_edge(self):
+        self.port.operEdge = False
 
 # 17.26
 class PortTransmit(StateMachine):
@@ -236,105 +308,115 @@ class PortTransmit(StateMachine):
     TRANSMIT_RSTP = 4
     IDLE = 5
 
+    INPUTS = ("helloWhen", "newInfo", "role", "selected", "sendRSTP", "txCount", "updtInfo")
+    BRIDGE_INPUTS = ("TxHoldCount",)
+
+    STATE_NAMES = {
+        TRANSMIT_INIT: "transmit_init",
+        TRANSMIT_CONFIG: "transmit_config",
+        TRANSMIT_PERIODIC: "transmit_periodic",
+        TRANSMIT_TCN: "transmit_tcn",
+        TRANSMIT_RSTP: "transmit_rstp",
+        IDLE: "idle"
+    }
+    CONDITION = "selected_and_not_updt_info"
+    BEGIN_TRANSITIONS = ((UCT, TRANSMIT_INIT),)
+    TRANSITIONS = {
+        TRANSMIT_INIT: ((UCT, IDLE),),
+        TRANSMIT_CONFIG: ((UCT, IDLE),),
+        TRANSMIT_PERIODIC: ((UCT, IDLE),),
+        TRANSMIT_TCN: ((UCT, IDLE),),
+        TRANSMIT_RSTP: ((UCT, IDLE),),
+        IDLE: (
+            ("hello_when_expired", TRANSMIT_PERIODIC),
+            ("new_config_info", TRANSMIT_CONFIG),
+            ("new_tcn_info", TRANSMIT_TCN),
+            ("new_rstp_info", TRANSMIT_RSTP)
+        )
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if self.rstp_handler.BEGIN:
-            return self.enter_state(PortTransmit.TRANSMIT_INIT)
-
-        if self.state == PortTransmit.TRANSMIT_INIT:
-            return self.enter_state(PortTransmit.IDLE)
-        elif self.state == PortTransmit.TRANSMIT_CONFIG:
-            return self.enter_state(PortTransmit.IDLE)
-        elif self.state == PortTransmit.TRANSMIT_PERIODIC:
-            return self.enter_state(PortTransmit.IDLE)
-        elif self.state == PortTransmit.TRANSMIT_TCN:
-            return self.enter_state(PortTransmit.IDLE)
-        elif self.state == PortTransmit.TRANSMIT_RSTP:
-            return self.enter_state(PortTransmit.IDLE)
-        elif self.state == PortTransmit.IDLE:
-            if (self.port.selected and not self.port.updtInfo):
-                if (self.port.helloWhen == 0):
-                    return self.enter_state(PortTransmit.TRANSMIT_PERIODIC)
-
-                if (
-                    not self.port.sendRSTP and
-                    self.port.newInfo and
-                    self.port.role == rstp_util.DESIGNATED_PORT and
-                    (self.port.txCount < self.rstp_handler.TxHoldCount) and
-                    self.port.helloWhen != 0
-                ):
-                    return self.enter_state(PortTransmit.TRANSMIT_CONFIG)
-
-                if (
-                    not self.port.sendRSTP and
-                    self.port.newInfo and
-                    self.port.role == rstp_util.ROOT_PORT and
-                    (self.port.txCount < self.rstp_handler.TxHoldCount) and
-                    self.port.helloWhen != 0
-                ):
-                    return self.enter_state(PortTransmit.TRANSMIT_TCN)
-
-                if (
-                    self.port.sendRSTP and
-                    self.port.newInfo and
-                    (self.port.txCount < self.rstp_handler.TxHoldCount) and
-                    self.port.helloWhen != 0
-                ):
-                    return self.enter_state(PortTransmit.TRANSMIT_RSTP)
-        else:
-            assert False
-        return False
+    def selected_and_not_updt_info(self):
+        return self.port.selected and not self.port.updtInfo
+
+    def hello_when_expired(self):
+        return self.port.helloWhen == 0
 
-    def on_enter_state(self):
-        if self.state == PortTransmit.TRANSMIT_INIT:
-            self.port.newInfo = True
-            self.port.txCount = 0
-        elif self.state == PortTransmit.TRANSMIT_CONFIG:
-            self.port.newInfo = False
-            self.port.txConfig()
-            self.port.txCount += 1
-            self.port.tcAck = False
-        elif self.state == PortTransmit.TRANSMIT_PERIODIC:
-            self.port.newInfo = (
-                self.port.newInfo or
-                (
-                    self.port.role == rstp_util.DESIGNATED_PORT or
-                    (self.port.role == rstp_util.ROOT_PORT and self.port.tcWhile != 0)
-                )
+    def new_config_info(self):
+        return (
+            not self.port.sendRSTP and
+            self.port.newInfo and
+            self.port.role == rstp_util.DESIGNATED_PORT and
+            (self.port.txCount < self.rstp_handler.TxHoldCount) and
+            self.port.helloWhen != 0
+        )
+
+    def new_tcn_info(self):
+        return (
+            not self.port.sendRSTP and
+            self.port.newInfo and
+            self.port.role == rstp_util.ROOT_PORT and
+            (self.port.txCount < self.rstp_handler.TxHoldCount) and
+            self.port.helloWhen != 0
+        )
+
+    def new_rstp_info(self):
+        return (
+            self.port.sendRSTP and
+            self.port.newInfo and
+            (self.port.txCount < self.rstp_handler.TxHoldCount) and
+            self.port.helloWhen != 0
+        )
+
+    def tx_hold_reached(self):
+        """True if a BPDU would be transmitted now, if txCount wasn't at TxHoldCount."""
+        return (
+            self.selected_and_not_updt_info() and
+            self.port.newInfo and
+            self.port.txCount >= self.rstp_handler.TxHoldCount and
+            (
+                self.port.sendRSTP or
+                self.port.role == rstp_util.DESIGNATED_PORT or
+                self.port.role == rstp_util.ROOT_PORT
             )
-        elif self.state == PortTransmit.TRANSMIT_TCN:
-            self.port.newInfo = False
-            self.port.txTcn()
-            self.port.txCount += 1
-        elif self.state == PortTransmit.TRANSMIT_RSTP:
-            self.port.newInfo = False
-            self.port.txRstp()
-            self.port.txCount += 1
-            self.port.tcAck = False
-        elif self.state == PortTransmit.IDLE:
-            self.port.helloWhen = self.port.HelloTime()
-        else:
-            assert False
+        )
 
-    def state_name(self, state):
-        if state == PortTransmit.TRANSMIT_INIT:
-            return "transmit_init"
-        elif state == PortTransmit.TRANSMIT_CONFIG:
-            return "transmit_config"
-        elif state == PortTransmit.TRANSMIT_PERIODIC:
-            return "transmit_periodic"
-        elif state == PortTransmit.TRANSMIT_TCN:
-            return "transmit_tcn"
-        elif state == PortTransmit.TRANSMIT_RSTP:
-            return "transmit_rstp"
-        elif state == PortTransmit.IDLE:
-            return "idle"
-        else:
-            assert False
+    def enter_transmit_init(self):
+        self.port.newInfo = True
+        self.port.txCount = 0
+
+    def enter_transmit_config(self):
+        self.port.newInfo = False
+        self.port.txConfig()
+        self.port.txCount += 1
+        self.port.tcAck = False
+
+    def enter_transmit_periodic(self):
+        self.port.newInfo = (
+            self.port.newInfo or
+            (
+                self.port.role == rstp_util.DESIGNATED_PORT or
+                (self.port.role == rstp_util.ROOT_PORT and self.port.tcWhile != 0)
+            )
+        )
+
+    def enter_transmit_tcn(self):
+        self.port.newInfo = False
+        self.port.txTcn()
+        self.port.txCount += 1
+
+    def enter_transmit_rstp(self):
+        self.port.newInfo = False
+        self.port.txRstp()
+        self.port.txCount += 1
+        self.port.tcAck = False
+
+    def enter_idle(self):
+        self.port.helloWhen = self.port.HelloTime()
 
 # 17.27
 class PortInformation(StateMachine):
@@ -349,147 +431,164 @@ class PortInformation(StateMachine):
     OTHER = 8
     RECEIVE = 9
 
+    INPUTS = ("infoIs", "portEnabled", "rcvdInfo", "rcvdInfoWhile", "rcvdMsg", "selected", "updtInfo")
+
+    STATE_NAMES = {
+        DISABLED: "disabled",
+        AGED: "aged",
+        UPDATE: "update",
+        CURRENT: "current",
+        SUPERIOR_DESIGNATED: "superior_designated",
+        REPEATED_DESIGNATED: "repeated_designated",
+        INFERIOR_DESIGNATED: "inferior_designated",
+        NOT_DESIGNATED: "not_designated",
+        OTHER: "other",
+        RECEIVE: "receive"
+    }
+    BEGIN_TRANSITIONS = ((UCT, DISABLED),)
+    GLOBAL_TRANSITIONS = (("port_disabled", DISABLED),)
+    TRANSITIONS = {
+        DISABLED: (
+            ("rcvd_msg", DISABLED),
+            ("port_enabled", AGED)
+        ),
+        AGED: (("selected_and_updt_info", UPDATE),),
+        UPDATE: ((UCT, CURRENT),),
+        CURRENT: (
+            ("selected_and_updt_info", UPDATE),
+            ("rcvd_info_expired", AGED),
+            ("rcvd_msg_and_not_updt_info", RECEIVE)
+        ),
+        SUPERIOR_DESIGNATED: ((UCT, CURRENT),),
+        REPEATED_DESIGNATED: ((UCT, CURRENT),),
+        INFERIOR_DESIGNATED: ((UCT, CURRENT),),
+        NOT_DESIGNATED: ((UCT, CURRENT),),
+        OTHER: ((UCT, CURRENT),),
+        RECEIVE: (
+            ("rcvd_superior_designated_info", SUPERIOR_DESIGNATED),
+            ("rcvd_repeated_designated_info", REPEATED_DESIGNATED),
+            ("rcvd_inferior_designated_info", INFERIOR_DESIGNATED),
+            ("rcvd_inferior_root_alternate_info", NOT_DESIGNATED),
+            ("rcvd_other_info", OTHER)
+        )
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if (
-            self.rstp_handler.BEGIN or
-            (not self.port.portEnabled and self.port.infoIs != rstp_util.DISABLED)
-        ):
-            return self.enter_state(PortInformation.DISABLED)
-
-        if self.state == PortInformation.DISABLED:
-            if self.port.rcvdMsg:
-                return self.enter_state(PortInformation.DISABLED)
-            if self.port.portEnabled:
-                return self.enter_state(PortInformation.AGED)
-        elif self.state == PortInformation.AGED:
-            if self.port.selected and self.port.updtInfo:
-                return self.enter_state(PortInformation.UPDATE)
-        elif self.state == PortInformation.UPDATE:
-            return self.enter_state(PortInformation.CURRENT)
-        elif self.state == PortInformation.CURRENT:
-            if self.port.selected and self.port.updtInfo:
-                return self.enter_state(PortInformation.UPDATE)
-            if (
-                self.port.infoIs == rstp_util.RECEIVED and
-                self.port.rcvdInfoWhile == 0 and
-                not self.port.updtInfo and
-                not self.port.rcvdMsg
-            ):
-                return self.enter_state(PortInformation.AGED)
-            if self.port.rcvdMsg and not self.port.updtInfo:
-                return self.enter_state(PortInformation.RECEIVE)
-        elif self.state == PortInformation.SUPERIOR_DESIGNATED:
-            return self.enter_state(PortInformation.CURRENT)
-        elif self.state == PortInformation.REPEATED_DESIGNATED:
-            return self.enter_state(PortInformation.CURRENT)
-        elif self.state == PortInformation.INFERIOR_DESIGNATED:
-            return self.enter_state(PortInformation.CURRENT)
-        elif self.state == PortInformation.NOT_DESIGNATED:
-            return self.enter_state(PortInformation.CURRENT)
-        elif self.state == PortInformation.OTHER:
-            return self.enter_state(PortInformation.CURRENT)
-        elif self.state == PortInformation.RECEIVE:
-            if self.port.rcvdInfo == rstp_util.SUPERIOR_DESIGNATED_INFO:
-                return self.enter_state(PortInformation.SUPERIOR_DESIGNATED)
-            if self.port.rcvdInfo == rstp_util.REPEATED_DESIGNATED_INFO:
-                return self.enter_state(PortInformation.REPEATED_DESIGNATED)
-            if self.port.rcvdInfo == rstp_util.INFERIOR_DESIGNATED_INFO:
-                return self.enter_state(PortInformation.INFERIOR_DESIGNATED)
-            if self.port.rcvdInfo == rstp_util.INFERIOR_ROOT_ALTERNATE_INFO:
-                return self.enter_state(PortInformation.NOT_DESIGNATED)
-            if self.port.rcvdInfo == rstp_util.OTHER_INFO:
-                return self.enter_state(PortInformation.OTHER)
-        else:
-            assert False
-        return False
+    def port_disabled(self):
+        return not self.port.portEnabled and self.port.infoIs != rstp_util.DISABLED
 
-    def on_enter_state(self):
-        if self.state == PortInformation.DISABLED:
-            self.port.rcvdMsg = False
-            self.port.proposing = False
-            self.port.proposed = False
-            self.port.agree = False
-            self.port.agreed = False
-            self.port.rcvdInfoWhile = 0
-            self.port.infoIs = rstp_util.DISABLED
-            self.port.reselect = True
-            self.port.selected = False
-        elif self.state == PortInformation.AGED:
-            self.port.infoIs = rstp_util.AGED
-            self.port.reselect = True
-            self.port.selected = False
-        elif self.state == PortInformation.UPDATE:
-            self.port.proposing = False
-            self.port.proposed = False
-            self.port.agreed = self.port.agreed and self.port.betterorsameInfo(rstp_util.MINE) # 802.1D-2004 doesn't specify what argument to pass, but 802.1Q-2018 does.
-            self.port.synced = self.port.synced and self.port.agreed
-            self.port.portPriority = self.port.designatedPriority.copy()
-            self.port.portTimes = self.port.designatedTimes.copy()
-            self.port.updtInfo = False
-            self.port.infoIs = rstp_util.MINE
-            self.port.newInfo = True
-        elif self.state == PortInformation.CURRENT:
-            pass
-        elif self.state == PortInformation.SUPERIOR_DESIGNATED:
-            self.port.agreed = False
-            self.port.proposing = False
-            self.port.recordProposal()
-            self.port.setTcFlags()
-            self.port.agree = self.port.agree and self.port.betterorsameInfo(rstp_util.RECEIVED) # 802.1D-2004 doesn't specify what argument to pass, but 802.1Q-2018 does.
-            self.port.recordPriority()
-            self.port.recordTimes()
-            self.port.updtRcvdInfoWhile()
-            self.port.infoIs = rstp_util.RECEIVED
-            self.port.reselect = True
-            self.port.selected = False
-            self.port.rcvdMsg = False
-        elif self.state == PortInformation.REPEATED_DESIGNATED:
-            self.port.recordProposal()
-            self.port.setTcFlags()
-            self.port.updtRcvdInfoWhile()
-            self.port.rcvdMsg = False
-        elif self.state == PortInformation.INFERIOR_DESIGNATED:
-            self.port.recordDispute()
-            self.port.rcvdMsg = False
-        elif self.state == PortInformation.NOT_DESIGNATED:
-            self.port.recordAgreement()
-            self.port.setTcFlags()
-            self.port.rcvdMsg = False
-        elif self.state == PortInformation.OTHER:
-            self.port.rcvdMsg = False
-        elif self.state == PortInformation.RECEIVE:
-            self.port.rcvdInfo = self.port.rcvInfo()
-        else:
-            assert False
+    def rcvd_msg(self):
+        return self.port.rcvdMsg
+
+    def port_enabled(self):
+        return self.port.portEnabled
+
+    def selected_and_updt_info(self):
+        return self.port.selected and self.port.updtInfo
+
+    def rcvd_info_expired(self):
+        return (
+            self.port.infoIs == rstp_util.RECEIVED and
+            self.port.rcvdInfoWhile == 0 and
+            not self.port.updtInfo and
+            not self.port.rcvdMsg
+        )
+
+    def rcvd_msg_and_not_updt_info(self):
+        return self.port.rcvdMsg and not self.port.updtInfo
+
+    def rcvd_superior_designated_info(self):
+        return self.port.rcvdInfo == rstp_util.SUPERIOR_DESIGNATED_INFO
+
+    def rcvd_repeated_designated_info(self):
+        return self.port.rcvdInfo == rstp_util.REPEATED_DESIGNATED_INFO
+
+    def rcvd_inferior_designated_info(self):
+        return self.port.rcvdInfo == rstp_util.INFERIOR_DESIGNATED_INFO
+
+    def rcvd_inferior_root_alternate_info(self):
+        return self.port.rcvdInfo == rstp_util.INFERIOR_ROOT_ALTERNATE_INFO
+
+    def rcvd_other_info(self):
+        return self.port.rcvdInfo == rstp_util.OTHER_INFO
+
+    def enter_disabled(self):
+        self.port.rcvdMsg = False
+        self.port.proposing = False
+        self.port.proposed = False
+        self.port.agree = False
+        self.port.agreed = False
+        self.port.rcvdInfoWhile = 0
+        self.port.infoIs = rstp_util.DISABLED
+        self.port.reselect = True
+        self.port.selected = False
+
+    def enter_aged(self):
+        if self.last_guard == "rcvd_info_expired":
+            self.rstp_handler.convergence.trigger(convergence.INFO_AGED, self.port.port_no)
+        self.port.infoIs = rstp_util.AGED
+        self.port.reselect = True
+        self.port.selected = False
+
+    def enter_update(self):
+        self.port.proposing = False
+        self.port.proposed = False
+        self.port.agreed = self.port.agreed and self.port.betterorsameInfo(rstp_util.MINE) # 802.1D-2004 doesn't specify what argument to pass, but 802.1Q-2018 does.
+        self.port.synced = self.port.synced and self.port.agreed
+        self.port.portPriority = self.port.designatedPriority
+        self.port.portTimes = self.port.designatedTimes
+        self.port.updtInfo = False
+        self.port.infoIs = rstp_util.MINE
+        self.port.newInfo = True
+
+    def enter_current(self):
+        pass
+
+    def enter_superior_designated(self):
+        # rcvInfo() also returns SuperiorDesignatedInfo for every repeated BPDU of the designated bridge and port, so
+        # only information which is new to the port starts a convergence.
+        old_info = (self.port.infoIs, self.port.portPriority, self.port.portTimes)
+        self.port.agreed = False
+        self.port.proposing = False
+        self.port.recordProposal()
+        self.port.setTcFlags()
+        self.port.agree = self.port.agree and self.port.betterorsameInfo(rstp_util.RECEIVED) # 802.1D-2004 doesn't specify what argument to pass, but 802.1Q-2018 does.
+        self.port.recordPriority()
+        self.port.recordTimes()
+        self.port.updtRcvdInfoWhile()
+        self.port.infoIs = rstp_util.RECEIVED
+        self.port.reselect = True
+        self.port.selected = False
+        self.port.rcvdMsg = False
+        if (self.port.infoIs, self.port.portPriority, self.port.portTimes) != old_info:
+            self.rstp_handler.convergence.trigger(convergence.SUPERIOR_BPDU, self.port.port_no)
+
+    def enter_repeated_designated(self):
+        self.port.recordProposal()
+        self.port.setTcFlags()
+        self.port.updtRcvdInfoWhile()
+        self.port.rcvdMsg = False
+
+    def enter_inferior_designated(self):
+        self.port.recordDispute()
+        self.port.rcvdMsg = False
+
+    def enter_not_designated(self):
+        self.port.recordAgreement()
+        self.port.setTcFlags()
+        self.port.rcvdMsg = False
+
+    def enter_other(self):
+        self.port.rcvdMsg = False
+
+    def enter_receive(self):
+        self.port.rcvdInfo = self.port.rcvInfo()
+        self.port.counters.info_received(self.port.rcvdInfo)
 
-    def state_name(self, state):
-        if state == PortInformation.DISABLED:
-            return "disabled"
-        elif state == PortInformation.AGED:
-            return "aged"
-        elif state == PortInformation.UPDATE:
-            return "update"
-        elif state == PortInformation.CURRENT:
-            return "current"
-        elif state == PortInformation.SUPERIOR_DESIGNATED:
-            return "superior_designated"
-        elif state == PortInformation.REPEATED_DESIGNATED:
-            return "repeated_designated"
-        elif state == PortInformation.INFERIOR_DESIGNATED:
-            return "inferior_designated"
-        elif state == PortInformation.NOT_DESIGNATED:
-            return "not_designated"
-        elif state == PortInformation.OTHER:
-            return "other"
-        elif state == PortInformation.RECEIVE:
-            return "receive"
-        else:
-            assert False
 # 17.29
 class PortRoleTransitions(StateMachine):
     # Disabled port states.
@@ -519,380 +618,422 @@ class PortRoleTransitions(StateMachine):
     BLOCK_PORT = 20
     BACKUP_PORT = 21
 
+    INPUTS = (
+        "agree",
+        "agreed",
+        "designatedTimes",
+        "disputed",
+        "fdWhile",
+        "forward",
+        "forwarding",
+        "learn",
+        "learning",
+        "operEdge",
+        "proposed",
+        "proposing",
+        "rbWhile",
+        "reRoot",
+        "role",
+        "rrWhile",
+        "selected",
+        "selectedRole",
+        "sendRSTP",
+        "sync",
+        "synced",
+        "updtInfo"
+    )
+    TREE_INPUTS = ("portId", "role", "rrWhile", "selected", "selectedRole", "synced") # allSynced() and reRooted().
+    BRIDGE_INPUTS = ("ForceProtocolVersion", "rootPortId")
+
+    STATE_NAMES = {
+        INIT_PORT: "init_port",
+        DISABLE_PORT: "disable_port",
+        DISABLED_PORT: "disabled_port",
+        ROOT_PROPOSED: "root_proposed",
+        ROOT_AGREED: "root_agreed",
+        ROOT_FORWARD: "root_forward",
+        ROOT_LEARN: "root_learn",
+        REROOT: "reroot",
+        REROOTED: "rerooted",
+        ROOT_PORT: "root_port",
+        DESIGNATED_PROPOSE: "designated_propose",
+        DESIGNATED_SYNCED: "designated_synced",
+        DESIGNATED_RETIRED: "designated_retired",
+        DESIGNATED_PORT: "designated_port",
+        DESIGNATED_FORWARD: "designated_forward",
+        DESIGNATED_LEARN: "designated_learn",
+        DESIGNATED_DISCARD: "designated_discard",
+        ALTERNATE_PROPOSED: "alternate_proposed",
+        ALTERNATE_AGREED: "alternate_agreed",
+        ALTERNATE_PORT: "alternate_port",
+        BLOCK_PORT: "block_port",
+        BACKUP_PORT: "backup_port"
+    }
+    CONDITION = "selected_and_not_updt_info"
+    BEGIN_TRANSITIONS = ((UCT, INIT_PORT),)
+    GLOBAL_TRANSITIONS = (
+        ("selected_disabled_role", DISABLE_PORT),
+        ("selected_root_role", ROOT_PORT),
+        ("selected_designated_role", DESIGNATED_PORT),
+        ("selected_alternate_or_backup_role", BLOCK_PORT)
+    )
+    TRANSITIONS = {
+        INIT_PORT: ((UCT, DISABLE_PORT),),
+        DISABLE_PORT: (("not_learning_and_not_forwarding", DISABLED_PORT),),
+        DISABLED_PORT: (("disabled_port_reset", DISABLED_PORT),),
+        ROOT_PROPOSED: ((UCT, ROOT_PORT),),
+        ROOT_AGREED: ((UCT, ROOT_PORT),),
+        ROOT_FORWARD: ((UCT, ROOT_PORT),),
+        ROOT_LEARN: ((UCT, ROOT_PORT),),
+        REROOT: ((UCT, ROOT_PORT),),
+        REROOTED: ((UCT, ROOT_PORT),),
+        ROOT_PORT: (
+            ("proposed_and_not_agree", ROOT_PROPOSED),
+            ("all_synced_or_agreed_proposal", ROOT_AGREED),
+            ("not_forward_and_not_reroot", REROOT),
+            # The next two transitions don't have explicit precedence in 802.1D-2004,
+            # but do in 802.1Q-2018, so going by that.
+            ("root_forward_ready", ROOT_FORWARD),
+            ("root_learn_ready", ROOT_LEARN),
+            ("reroot_and_forward", REROOTED),
+            ("rr_while_not_fwd_delay", ROOT_PORT)
+        ),
+        DESIGNATED_PROPOSE: ((UCT, DESIGNATED_PORT),),
+        DESIGNATED_SYNCED: ((UCT, DESIGNATED_PORT),),
+        DESIGNATED_RETIRED: ((UCT, DESIGNATED_PORT),),
+        DESIGNATED_PORT: (
+            ("designated_propose_ready", DESIGNATED_PROPOSE),
+            ("designated_synced_ready", DESIGNATED_SYNCED),
+            ("rr_while_expired_and_reroot", DESIGNATED_RETIRED),
+            ("designated_forward_ready", DESIGNATED_FORWARD),
+            ("designated_learn_ready", DESIGNATED_LEARN),
+            ("designated_discard_needed", DESIGNATED_DISCARD)
+        ),
+        DESIGNATED_FORWARD: ((UCT, DESIGNATED_PORT),),
+        DESIGNATED_LEARN: ((UCT, DESIGNATED_PORT),),
+        DESIGNATED_DISCARD: ((UCT, DESIGNATED_PORT),),
+        ALTERNATE_PROPOSED: ((UCT, ALTERNATE_PORT),),
+        ALTERNATE_AGREED: ((UCT, ALTERNATE_PORT),),
+        ALTERNATE_PORT: (
+            ("proposed_and_not_agree", ALTERNATE_PROPOSED),
+            ("all_synced_or_agreed_proposal", ALTERNATE_AGREED),
+            ("backup_rb_while_running", BACKUP_PORT),
+            ("alternate_port_reset", ALTERNATE_PORT)
+        ),
+        BLOCK_PORT: (("not_learning_and_not_forwarding", ALTERNATE_PORT),),
+        BACKUP_PORT: ((UCT, ALTERNATE_PORT),)
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if self.rstp_handler.BEGIN:
-            return self.enter_state(PortRoleTransitions.INIT_PORT)
-
-        if self.port.selected and not self.port.updtInfo:
-            if self.port.role != self.port.selectedRole:
-                if self.port.selectedRole == rstp_util.DISABLED_PORT:
-                    return self.enter_state(PortRoleTransitions.DISABLE_PORT)
-                elif self.port.selectedRole == rstp_util.ROOT_PORT:
-                    return self.enter_state(PortRoleTransitions.ROOT_PORT)
-                elif self.port.selectedRole == rstp_util.DESIGNATED_PORT:
-                    return self.enter_state(PortRoleTransitions.DESIGNATED_PORT)
-                elif (
-                    self.port.selectedRole == rstp_util.ALTERNATE_PORT or
-                    self.port.selectedRole == rstp_util.BACKUP_PORT
-                ):
-                    return self.enter_state(PortRoleTransitions.BLOCK_PORT)
-                else:
-                    assert False
-
-            # Conditional, not global transitions.
-            if self.state == PortRoleTransitions.DISABLE_PORT:
-                if not self.port.learning and not self.port.forwarding:
-                    return self.enter_state(PortRoleTransitions.DISABLED_PORT)
-            elif self.state == PortRoleTransitions.DISABLED_PORT:
-                if (
-                    self.port.fdWhile != self.port.MaxAge() or
-                    self.port.sync or
-                    self.port.reRoot or
-                    not self.port.synced
-                ):
-                    return self.enter_state(PortRoleTransitions.DISABLED_PORT)
-            elif self.state == PortRoleTransitions.ROOT_PORT:
-                if self.port.proposed and not self.port.agree:
-                    return self.enter_state(PortRoleTransitions.ROOT_PROPOSED)
-                if (
-                    (self.rstp_handler.allSynced() and not self.port.agree) or
-                    (self.port.proposed and self.port.agree)
-                ):
-                    return self.enter_state(PortRoleTransitions.ROOT_AGREED)
-                if not self.port.forward and not self.port.reRoot:
-                    return self.enter_state(PortRoleTransitions.REROOT)
-
-                # The next two conditions don't have explicit precedence in 802.1D-2004,
-                # but do in 802.1Q-2018, so going by that.
-                if (
-                    (
-                        self.port.fdWhile == 0 or
-                        (self.port.reRooted() and self.port.rbWhile == 0 and self.rstp_handler.rstpVersion())
-                    ) and
-                    self.port.learn and
-                    not self.port.forward
-                ):
-                    return self.enter_state(PortRoleTransitions.ROOT_FORWARD)
-                if (
-                    (
-                        self.port.fdWhile == 0 or
-                        (self.port.reRooted() and self.port.rbWhile == 0 and self.rstp_handler.rstpVersion())
-                    ) and
-                    not self.port.learn
-                ):
-                    return self.enter_state(PortRoleTransitions.ROOT_LEARN)
-                if self.port.reRoot and self.port.forward:
-                    return self.enter_state(PortRoleTransitions.REROOTED)
-                if self.port.rrWhile != self.port.FwdDelay():
-                    return self.enter_state(PortRoleTransitions.ROOT_PORT)
-            elif self.state == PortRoleTransitions.DESIGNATED_PORT:
-                if (
-                    not self.port.forward and
-                    not self.port.agreed and
-                    not self.port.proposing and
-                    not self.port.operEdge
-                ):
-                    return self.enter_state(PortRoleTransitions.DESIGNATED_PROPOSE)
-                if (
-                    (
-                        not self.port.learning and
-                        not self.port.forwarding and
-                        not self.port.synced
-                    ) or
-                    (self.port.agreed and not self.port.synced) or
-                    (self.port.operEdge and not self.port.synced) or
-                    (self.port.sync and self.port.synced)
-                ):
-                    return self.enter_state(PortRoleTransitions.DESIGNATED_SYNCED)
-                if self.port.rrWhile == 0 and self.port.reRoot:
-                    return self.enter_state(PortRoleTransitions.DESIGNATED_RETIRED)
-                if (
-                    (
-                        self.port.fdWhile == 0 or
-                        self.port.agreed or
-                        self.port.operEdge
-                    ) and
-                    (self.port.rrWhile == 0 or not self.port.reRoot) and
-                    not self.port.sync and
-                    (self.port.learn and not self.port.forward)
-                ):
-                    return self.enter_state(PortRoleTransitions.DESIGNATED_FORWARD)
-                if (
-                    (
-                        self.port.fdWhile == 0 or
-                        self.port.agreed or
-                        self.port.operEdge
-                    ) and
-                    (self.port.rrWhile == 0 or not self.port.reRoot) and
-                    not self.port.sync and
-                    not self.port.learn
-                ):
-                    return self.enter_state(PortRoleTransitions.DESIGNATED_LEARN)
-
-                if (
-                    (
-                        (self.port.sync and not self.port.synced) or
-                        (self.port.reRoot and self.port.rrWhile != 0) or
-                        self.port.disputed
-                    ) and
-                    not self.port.operEdge and
-                    (self.port.learn or self.port.forward)
-                ):
-                    return self.enter_state(PortRoleTransitions.DESIGNATED_DISCARD)
-            elif self.state == PortRoleTransitions.BLOCK_PORT:
-                if not self.port.learning and not self.port.forwarding:
-                    return self.enter_state(PortRoleTransitions.ALTERNATE_PORT)
-            elif self.state == PortRoleTransitions.ALTERNATE_PORT:
-                if self.port.proposed and not self.port.agree:
-                    return self.enter_state(PortRoleTransitions.ALTERNATE_PROPOSED)
-                if (
-                    (self.rstp_handler.allSynced() and not self.port.agree) or
-                    (self.port.proposed and self.port.agree)
-                ):
-                    return self.enter_state(PortRoleTransitions.ALTERNATE_AGREED)
-                if (
-                    (self.port.rbWhile != 2 * self.port.HelloTime()) and
-                    (self.port.role == rstp_util.BACKUP_PORT)
-                ):
-                    return self.enter_state(PortRoleTransitions.BACKUP_PORT)
-                if (
-                    (self.port.fdWhile != self.port.forwardDelay()) or
-                    self.port.sync or
-                    self.port.reRoot or
-                    not self.port.synced
-                ):
-                    return self.enter_state(PortRoleTransitions.ALTERNATE_PORT)
-
-        # Unconditional transitions.
-        if self.state == PortRoleTransitions.INIT_PORT:
-            return self.enter_state(PortRoleTransitions.DISABLE_PORT)
-        elif self.state == PortRoleTransitions.ROOT_PROPOSED:
-            return self.enter_state(PortRoleTransitions.ROOT_PORT)
-        elif self.state == PortRoleTransitions.ROOT_AGREED:
-            return self.enter_state(PortRoleTransitions.ROOT_PORT)
-        elif self.state == PortRoleTransitions.ROOT_FORWARD:
-            return self.enter_state(PortRoleTransitions.ROOT_PORT)
-        elif self.state == PortRoleTransitions.ROOT_LEARN:
-            return self.enter_state(PortRoleTransitions.ROOT_PORT)
-        elif self.state == PortRoleTransitions.REROOT:
-            return self.enter_state(PortRoleTransitions.ROOT_PORT)
-        elif self.state == PortRoleTransitions.REROOTED:
-            return self.enter_state(PortRoleTransitions.ROOT_PORT)
-        elif self.state == PortRoleTransitions.DESIGNATED_PROPOSE:
-            return self.enter_state(PortRoleTransitions.DESIGNATED_PORT)
-        elif self.state == PortRoleTransitions.DESIGNATED_SYNCED:
-            return self.enter_state(PortRoleTransitions.DESIGNATED_PORT)
-        elif self.state == PortRoleTransitions.DESIGNATED_RETIRED:
-            return self.enter_state(PortRoleTransitions.DESIGNATED_PORT)
-        elif self.state == PortRoleTransitions.DESIGNATED_FORWARD:
-            return self.enter_state(PortRoleTransitions.DESIGNATED_PORT)
-        elif self.state == PortRoleTransitions.DESIGNATED_LEARN:
-            return self.enter_state(PortRoleTransitions.DESIGNATED_PORT)
-        elif self.state == PortRoleTransitions.DESIGNATED_DISCARD:
-            return self.enter_state(PortRoleTransitions.DESIGNATED_PORT)
-        elif self.state == PortRoleTransitions.ALTERNATE_PROPOSED:
-            return self.enter_state(PortRoleTransitions.ALTERNATE_PORT)
-        elif self.state == PortRoleTransitions.ALTERNATE_AGREED:
-            return self.enter_state(PortRoleTransitions.ALTERNATE_PORT)
-        elif self.state == PortRoleTransitions.BACKUP_PORT:
-            return self.enter_state(PortRoleTransitions.ALTERNATE_PORT)
-        return False
+    def selected_and_not_updt_info(self):
+        return self.port.selected and not self.port.updtInfo
 
-    def on_enter_state(self):
-        if self.state == PortRoleTransitions.INIT_PORT:
-            self.port.role = rstp_util.DISABLED_PORT
-            self.port.learn = False
-            self.port.forward = False
-            self.port.synced = False
-            self.port.sync = True
-            self.port.reRoot = True
-            self.port.rrWhile = self.port.FwdDelay()
-            self.port.fdWhile = self.port.MaxAge()
-            self.port.rbWhile = 0
-        elif self.state == PortRoleTransitions.ROOT_PROPOSED:
-            self.rstp_handler.setSyncTree()
-            self.port.proposed = False
-        elif self.state == PortRoleTransitions.ROOT_AGREED:
-            self.port.proposed = False
-            self.port.sync = False
-            self.port.agree = True
-            self.port.newInfo = True
-        elif self.state == PortRoleTransitions.ROOT_FORWARD:
-            self.port.fdWhile = 0
-            self.port.forward = True
-        elif self.state == PortRoleTransitions.ROOT_LEARN:
-            self.port.fdWhile = self.port.forwardDelay()
-            self.port.learn = True
-        elif self.state == PortRoleTransitions.REROOT:
-            self.rstp_handler.setReRootTree()
-        elif self.state == PortRoleTransitions.REROOTED:
-            self.port.reRoot = False
-        elif self.state == PortRoleTransitions.DESIGNATED_PROPOSE:
-            self.port.proposing = True
-            self.port.edgeDelayWhile = self.port.EdgeDelay()
-            self.port.newInfo = True
-        elif self.state == PortRoleTransitions.DESIGNATED_SYNCED:
-            self.port.rrWhile = 0
-            self.port.synced = True
-            self.port.sync = False
-        elif self.state == PortRoleTransitions.DESIGNATED_RETIRED:
-            self.port.reRoot = False
-        elif self.state == PortRoleTransitions.DESIGNATED_FORWARD:
-            self.port.forward = True
-            self.port.fdWhile = 0
-            self.port.agreed = self.port.sendRSTP
-        elif self.state == PortRoleTransitions.DESIGNATED_LEARN:
-            self.port.learn = True
-            self.port.fdWhile = self.port.forwardDelay()
-        elif self.state == PortRoleTransitions.DESIGNATED_DISCARD:
-            self.port.learn = False
-            self.port.forward = False
-            self.port.disputed = False
-            self.port.fdWhile = self.port.forwardDelay()
-        elif self.state == PortRoleTransitions.ALTERNATE_PROPOSED:
-            self.rstp_handler.setSyncTree()
-            self.port.proposed = False
-        elif self.state == PortRoleTransitions.ALTERNATE_AGREED:
-            self.port.proposed = False
-            self.port.agree = True
-            self.port.newInfo = True
-        elif self.state == PortRoleTransitions.BACKUP_PORT:
-            self.port.rbWhile = 2 * self.port.HelloTime()
-        elif self.state == PortRoleTransitions.DISABLE_PORT:
-            self.port.role = self.port.selectedRole
-            self.port.learn = False
-            self.port.forward = False
-        elif self.state == PortRoleTransitions.DISABLED_PORT:
-            self.port.fdWhile = self.port.MaxAge()
-            self.port.synced = True
-            self.port.rrWhile = 0
-            self.port.sync = False
-            self.port.reRoot = False
-        elif self.state == PortRoleTransitions.ROOT_PORT:
-            self.port.role = rstp_util.ROOT_PORT
-            self.port.rrWhile = self.port.FwdDelay()
-        elif self.state == PortRoleTransitions.DESIGNATED_PORT:
-            self.port.role = rstp_util.DESIGNATED_PORT
-        elif self.state == PortRoleTransitions.BLOCK_PORT:
-            self.port.role = self.port.selectedRole
-            self.port.learn = False
-            self.port.forward = False
-        elif self.state == PortRoleTransitions.ALTERNATE_PORT:
-            # 802.1D-2004 says to use FwdDelay here, but that leads to an infinite loop
-            # and 802.1Q-2018 say forwardDelay.
-            self.port.fdWhile = self.port.forwardDelay()
-            self.port.synced = True
-            self.port.rrWhile = 0
-            self.port.sync = False
-            self.port.reRoot = False
-        else:
-            assert False
+    # Global transitions.
+    def selected_disabled_role(self):
+        return self.port.role != self.port.selectedRole and self.port.selectedRole == rstp_util.DISABLED_PORT
+
+    def selected_root_role(self):
+        return self.port.role != self.port.selectedRole and self.port.selectedRole == rstp_util.ROOT_PORT
+
+    def selected_designated_role(self):
+        return self.port.role != self.port.selectedRole and self.port.selectedRole == rstp_util.DESIGNATED_PORT
+
+    def selected_alternate_or_backup_role(self):
+        return (
+            self.port.role != self.port.selectedRole and
+            (
+                self.port.selectedRole == rstp_util.ALTERNATE_PORT or
+                self.port.selectedRole == rstp_util.BACKUP_PORT
+            )
+        )
+
+    # Disabled port transitions.
+    def not_learning_and_not_forwarding(self):
+        return not self.port.learning and not self.port.forwarding
+
+    def disabled_port_reset(self):
+        return (
+            self.port.fdWhile != self.port.MaxAge() or
+            self.port.sync or
+            self.port.reRoot or
+            not self.port.synced
+        )
+
+    # Root and alternate port transitions.
+    def proposed_and_not_agree(self):
+        return self.port.proposed and not self.port.agree
+
+    def all_synced_or_agreed_proposal(self):
+        return (
+            (self.rstp_handler.allSynced() and not self.port.agree) or
+            (self.port.proposed and self.port.agree)
+        )
+
+    def not_forward_and_not_reroot(self):
+        return not self.port.forward and not self.port.reRoot
+
+    def root_forward_ready(self):
+        return (
+            (
+                self.port.fdWhile == 0 or
+                (self.port.reRooted() and self.port.rbWhile == 0 and self.rstp_handler.rstpVersion())
+            ) and
+            self.port.learn and
+            not self.port.forward
+        )
+
+    def root_learn_ready(self):
+        return (
+            (
+                self.port.fdWhile == 0 or
+                (self.port.reRooted() and self.port.rbWhile == 0 and self.rstp_handler.rstpVersion())
+            ) and
+            not self.port.learn
+        )
+
+    def reroot_and_forward(self):
+        return self.port.reRoot and self.port.forward
+
+    def rr_while_not_fwd_delay(self):
+        return self.port.rrWhile != self.port.FwdDelay()
+
+    def backup_rb_while_running(self):
+        return (
+            (self.port.rbWhile != 2 * self.port.HelloTime()) and
+            (self.port.role == rstp_util.BACKUP_PORT)
+        )
+
+    def alternate_port_reset(self):
+        return (
+            (self.port.fdWhile != self.port.forwardDelay()) or
+            self.port.sync or
+            self.port.reRoot or
+            not self.port.synced
+        )
+
+    # Designated port transitions.
+    def designated_propose_ready(self):
+        return (
+            not self.port.forward and
+            not self.port.agreed and
+            not self.port.proposing and
+            not self.port.operEdge
+        )
+
+    def designated_synced_ready(self):
+        return (
+            (
+                not self.port.learning and
+                not self.port.forwarding and
+                not self.port.synced
+            ) or
+            (self.port.agreed and not self.port.synced) or
+            (self.port.operEdge and not self.port.synced) or
+            (self.port.sync and self.port.synced)
+        )
+
+    def rr_while_expired_and_reroot(self):
+        return self.port.rrWhile == 0 and self.port.reRoot
+
+    def designated_forward_ready(self):
+        return (
+            (
+                self.port.fdWhile == 0 or
+                self.port.agreed or
+                self.port.operEdge
+            ) and
+            (self.port.rrWhile == 0 or not self.port.reRoot) and
+            not self.port.sync and
+            (self.port.learn and not self.port.forward)
+        )
+
+    def designated_learn_ready(self):
+        return (
+            (
+                self.port.fdWhile == 0 or
+                self.port.agreed or
+                self.port.operEdge
+            ) and
+            (self.port.rrWhile == 0 or not self.port.reRoot) and
+            not self.port.sync and
+            not self.port.learn
+        )
+
+    def designated_discard_needed(self):
+        return (
+            (
+                (self.port.sync and not self.port.synced) or
+                (self.port.reRoot and self.port.rrWhile != 0) or
+                self.port.disputed
+            ) and
+            not self.port.operEdge and
+            (self.port.learn or self.port.forward)
+        )
+
+    def enter_init_port(self):
+        self.port.role = rstp_util.DISABLED_PORT
+        self.port.learn = False
+        self.port.forward = False
+        self.port.synced = False
+        self.port.sync = True
+        self.port.reRoot = True
+        self.port.rrWhile = self.port.FwdDelay()
+        self.port.fdWhile = self.port.MaxAge()
+        self.port.rbWhile = 0
+
+    def enter_root_proposed(self):
+        self.rstp_handler.setSyncTree()
+        self.port.proposed = False
+
+    def enter_root_agreed(self):
+        self.port.proposed = False
+        self.port.sync = False
+        self.port.agree = True
+        self.port.newInfo = True
+
+    def enter_root_forward(self):
+        self.port.fdWhile = 0
+        self.port.forward = True
+
+    def enter_root_learn(self):
+        self.port.fdWhile = self.port.forwardDelay()
+        self.port.learn = True
+
+    def enter_reroot(self):
+        self.rstp_handler.setReRootTree()
+
+    def enter_rerooted(self):
+        self.port.reRoot = False
+
+    def enter_designated_propose(self):
+        self.port.proposing = True
+        self.port.edgeDelayWhile = self.port.EdgeDelay()
+        self.port.newInfo = True
+
+    def enter_designated_synced(self):
+        self.port.rrWhile = 0
+        self.port.synced = True
+        self.port.sync = False
+
+    def enter_designated_retired(self):
+        self.port.reRoot = False
+
+    def enter_designated_forward(self):
+        self.port.forward = True
+        self.port.fdWhile = 0
+        self.port.agreed = self.port.sendRSTP
+
+    def enter_designated_learn(self):
+        self.port.learn = True
+        self.port.fdWhile = self.port.forwardDelay()
+
+    def enter_designated_discard(self):
+        self.port.learn = False
+        self.port.forward = False
+        self.port.disputed = False
+        self.port.fdWhile = self.port.forwardDelay()
+
+    def enter_alternate_proposed(self):
+        self.rstp_handler.setSyncTree()
+        self.port.proposed = False
+
+    def enter_alternate_agreed(self):
+        self.port.proposed = False
+        self.port.agree = True
+        self.port.newInfo = True
+
+    def enter_backup_port(self):
+        self.port.rbWhile = 2 * self.port.HelloTime()
+
+    def enter_disable_port(self):
+        self.port.role = self.port.selectedRole
+        self.port.learn = False
+        self.port.forward = False
+
+    def enter_disabled_port(self):
+        self.port.fdWhile = self.port.MaxAge()
+        self.port.synced = True
+        self.port.rrWhile = 0
+        self.port.sync = False
+        self.port.reRoot = False
+
+    def enter_root_port(self):
+        self.port.role = rstp_util.ROOT_PORT
+        self.port.rrWhile = self.port.FwdDelay()
+
+    def enter_designated_port(self):
+        self.port.role = rstp_util.DESIGNATED_PORT
+
+    def enter_block_port(self):
+        self.port.role = self.port.selectedRole
+        self.port.learn = False
+        self.port.forward = False
+
+    def enter_alternate_port(self):
+        # 802.1D-2004 says to use FwdDelay here, but that leads to an infinite loop
+        # and 802.1Q-2018 say forwardDelay.
+        self.port.fdWhile = self.port.forwardDelay()
+        self.port.synced = True
+        self.port.rrWhile = 0
+        self.port.sync = False
+        self.port.reRoot = False
 
-    def state_name(self, state):
-        if state == PortRoleTransitions.INIT_PORT:
-            return "init_port"
-        elif state == PortRoleTransitions.ROOT_PROPOSED:
-            return "root_proposed"
-        elif state == PortRoleTransitions.ROOT_AGREED:
-            return "root_agreed"
-        elif state == PortRoleTransitions.ROOT_FORWARD:
-            return "root_forward"
-        elif state == PortRoleTransitions.ROOT_LEARN:
-            return "root_learn"
-        elif state == PortRoleTransitions.REROOT:
-            return "reroot"
-        elif state == PortRoleTransitions.REROOTED:
-            return "rerooted"
-        elif state == PortRoleTransitions.DESIGNATED_PROPOSE:
-            return "designated_propose"
-        elif state == PortRoleTransitions.DESIGNATED_SYNCED:
-            return "designated_synced"
-        elif state == PortRoleTransitions.DESIGNATED_RETIRED:
-            return "designated_retired"
-        elif state == PortRoleTransitions.DESIGNATED_FORWARD:
-            return "designated_forward"
-        elif state == PortRoleTransitions.DESIGNATED_LEARN:
-            return "designated_learn"
-        elif state == PortRoleTransitions.DESIGNATED_DISCARD:
-            return "designated_discard"
-        elif state == PortRoleTransitions.ALTERNATE_PROPOSED:
-            return "alternate_proposed"
-        elif state == PortRoleTransitions.ALTERNATE_AGREED:
-            return "alternated_agreed"
-        elif state == PortRoleTransitions.BACKUP_PORT:
-            return "backup_port"
-        elif state == PortRoleTransitions.DISABLE_PORT:
-            return "disable_port"
-        elif state == PortRoleTransitions.DISABLED_PORT:
-            return "disabled_port"
-        elif state == PortRoleTransitions.ROOT_PORT:
-            return "root_port"
-        elif state == PortRoleTransitions.DESIGNATED_PORT:
-            return "designated_port"
-        elif state == PortRoleTransitions.BLOCK_PORT:
-            return "block_port"
-        elif state == PortRoleTransitions.ALTERNATE_PORT:
-            return "alternate_port"
-        else:
-            assert False
 # 17.30
 class PortStateTransition(StateMachine):
     DISCARDING = 0
     LEARNING = 1
     FORWARDING = 2
 
+    INPUTS = ("forward", "learn")
+
+    STATE_NAMES = {
+        DISCARDING: "discarding",
+        LEARNING: "learning",
+        FORWARDING: "forwarding"
+    }
+    BEGIN_TRANSITIONS = ((UCT, DISCARDING),)
+    TRANSITIONS = {
+        DISCARDING: (("learn", LEARNING),),
+        LEARNING: (
+            ("not_learn", DISCARDING),
+            ("forward", FORWARDING)
+        ),
+        FORWARDING: (("not_forward", DISCARDING),)
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if self.rstp_handler.BEGIN:
-            return self.enter_state(PortStateTransition.DISCARDING)
-
-        if self.state == PortStateTransition.DISCARDING:
-            if self.port.learn:
-                return self.enter_state(PortStateTransition.LEARNING)
-        elif self.state == PortStateTransition.LEARNING:
-            if not self.port.learn:
-                return self.enter_state(PortStateTransition.DISCARDING)
-            if self.port.forward:
-                return self.enter_state(PortStateTransition.FORWARDING)
-        elif self.state == PortStateTransition.FORWARDING:
-            if not self.port.forward:
-                return self.enter_state(PortStateTransition.DISCARDING)
-        else:
-            assert False
-        return False
+    def learn(self):
+        return self.port.learn
 
-    def on_enter_state(self):
-        if self.state == PortStateTransition.DISCARDING:
-            self.port.disableLearningForwarding()
-            self.port.learning = False
-            self.port.forwarding = False
-        elif self.state == PortStateTransition.LEARNING:
-            self.port.enableLearning()
-            self.port.learning = True
-        elif self.state == PortStateTransition.FORWARDING:
-            self.port.enableForwarding()
-            self.port.forwarding = True
-        else:
-            assert False
+    def not_learn(self):
+        return not self.port.learn
 
-    def state_name(self, state):
-        if state == PortStateTransition.DISCARDING:
-            return "discarding"
-        elif state == PortStateTransition.LEARNING:
-            return "learning"
-        elif state == PortStateTransition.FORWARDING:
-            return "forwarding"
-        else:
-            assert False
+    def forward(self):
+        return self.port.forward
+
+    def not_forward(self):
+        return not self.port.forward
+
+    def enter_discarding(self):
+        self.port.disableLearningForwarding()
+        self.port.learning = False
+        self.port.forwarding = False
+
+    def enter_learning(self):
+        self.port.enableLearning()
+        self.port.learning = True
+
+    def enter_forwarding(self):
+        self.port.enableForwarding()
+        self.port.forwarding = True
 
 # 17.23
 class TopologyChange(StateMachine):
@@ -905,122 +1046,139 @@ class TopologyChange(StateMachine):
     PROPAGATING = 6
     ACKNOWLEDGED = 7
 
+    INPUTS = (
+        "fdbFlush",
+        "forward",
+        "learn",
+        "learning",
+        "operEdge",
+        "rcvdTc",
+        "rcvdTcAck",
+        "rcvdTcn",
+        "role",
+        "tcProp"
+    )
+
+    STATE_NAMES = {
+        INACTIVE: "inactive",
+        LEARNING: "learning",
+        DETECTED: "detected",
+        ACTIVE: "active",
+        NOTIFIED_TCN: "notified_tcn",
+        NOTIFIED_TC: "notified_tc",
+        PROPAGATING: "propagating",
+        ACKNOWLEDGED: "acknowledged"
+    }
+    BEGIN_TRANSITIONS = ((UCT, INACTIVE),)
+    TRANSITIONS = {
+        INACTIVE: (("learn_and_not_fdb_flush", LEARNING),),
+        LEARNING: (
+            ("topology_change_detected", DETECTED),
+            ("not_participating", INACTIVE),
+            ("rcvd_tc_or_tc_prop", LEARNING)
+        ),
+        DETECTED: ((UCT, ACTIVE),),
+        ACTIVE: (
+            ("not_root_or_designated_or_edge", LEARNING),
+            ("rcvd_tcn", NOTIFIED_TCN),
+            ("rcvd_tc", NOTIFIED_TC),
+            ("tc_prop_and_not_edge", PROPAGATING),
+            ("rcvd_tc_ack", ACKNOWLEDGED)
+        ),
+        NOTIFIED_TCN: ((UCT, NOTIFIED_TC),),
+        NOTIFIED_TC: ((UCT, ACTIVE),),
+        PROPAGATING: ((UCT, ACTIVE),),
+        ACKNOWLEDGED: ((UCT, ACTIVE),)
+    }
+
     def __init__(self, rstp_handler, rstp_port):
         self.rstp_handler = rstp_handler
         self.port = rstp_port
         StateMachine.__init__(self, rstp_port)
 
-    def update(self):
-        if self.rstp_handler.BEGIN:
-            return self.enter_state(TopologyChange.INACTIVE)
-
-        if self.state == TopologyChange.INACTIVE:
-            if self.port.learn and not self.port.fdbFlush:
-                return self.enter_state(TopologyChange.LEARNING)
-        elif self.state == TopologyChange.LEARNING:
-            if (
-                (
-                    self.port.role == rstp_util.ROOT_PORT or
-                    self.port.role == rstp_util.DESIGNATED_PORT
-                ) and
-                self.port.forward and not self.port.operEdge
-            ):
-                return self.enter_state(TopologyChange.DETECTED)
-            if (
-                (self.port.role != rstp_util.ROOT_PORT) and
-                (self.port.role != rstp_util.DESIGNATED_PORT) and
-                not (self.port.learn or self.port.learning) and
-                not (self.port.rcvdTc or self.port.rcvdTcn or self.port.rcvdTcAck or self.port.tcProp)
-            ):
-                return self.enter_state(TopologyChange.INACTIVE)
-            if (
-                self.port.rcvdTc or
-                self.port.rcvdTcn or
-                self.port.rcvdTcAck or
-                self.port.tcProp
-            ):
-                return self.enter_state(TopologyChange.LEARNING)
-        elif self.state == TopologyChange.DETECTED:
-            return self.enter_state(TopologyChange.ACTIVE)
-        elif self.state == TopologyChange.ACTIVE:
-            if (
-                (
-                    self.port.role != rstp_util.ROOT_PORT and
-                    self.port.role != rstp_util.DESIGNATED_PORT
-                ) or
-                self.port.operEdge
-            ):
-                return self.enter_state(TopologyChange.LEARNING)
-            if self.port.rcvdTcn:
-                return self.enter_state(TopologyChange.NOTIFIED_TCN)
-            if self.port.rcvdTc:
-                return self.enter_state(TopologyChange.NOTIFIED_TC)
-            if self.port.tcProp and not self.port.operEdge:
-                return self.enter_state(TopologyChange.PROPAGATING)
-            if self.port.rcvdTcAck:
-                return self.enter_state(TopologyChange.ACKNOWLEDGED)
-        elif self.state == TopologyChange.NOTIFIED_TCN:
-            return self.enter_state(TopologyChange.NOTIFIED_TC)
-        elif self.state == TopologyChange.NOTIFIED_TC:
-            return self.enter_state(TopologyChange.ACTIVE)
-        elif self.state == TopologyChange.PROPAGATING:
-            return self.enter_state(TopologyChange.ACTIVE)
-        elif self.state == TopologyChange.ACKNOWLEDGED:
-            return self.enter_state(TopologyChange.ACTIVE)
-        else:
-            assert False
-        return False
+    def learn_and_not_fdb_flush(self):
+        return self.port.learn and not self.port.fdbFlush
 
-    def on_enter_state(self):
-        if self.state == TopologyChange.INACTIVE:
-            self.port.fdbFlush = True
-            self.port.tcWhile = 0
-            self.port.tcAck = False
-        elif self.state == TopologyChange.LEARNING:
-            self.port.rcvdTc = False
-            self.port.rcvdTcn = False
-            self.port.rcvdTcAck = False
-            self.port.tcProp = False
-        elif self.state == TopologyChange.DETECTED:
-            self.port.newTcWhile()
-            self.rstp_handler.setTcPropTree(self.port.port_no)
-            self.port.newInfo = True
-        elif self.state == TopologyChange.ACTIVE:
-            pass
-        elif self.state == TopologyChange.NOTIFIED_TCN:
-            self.port.newTcWhile()
-        elif self.state == TopologyChange.NOTIFIED_TC:
-            self.port.rcvdTcn = False
-            self.port.rcvdTc = False
-            if self.port.role == rstp_util.DESIGNATED_PORT:
-                self.port.tcAck = True
-            self.rstp_handler.setTcPropTree(self.port.port_no) # Standard says setTcPropBridge(), but that function doesn't exist.
-        elif self.state == TopologyChange.PROPAGATING:
-            self.port.newTcWhile()
-            self.port.fdbFlush = True
-            self.port.tcProp = False
-        elif self.state == TopologyChange.ACKNOWLEDGED:
-            self.port.tcWhile = 0
-            self.port.rcvdTcAck = False
-        else:
-            assert False
+    def topology_change_detected(self):
+        return (
+            (
+                self.port.role == rstp_util.ROOT_PORT or
+                self.port.role == rstp_util.DESIGNATED_PORT
+            ) and
+            self.port.forward and not self.port.operEdge
+        )
 
-    def state_name(self, state):
-        if state == TopologyChange.INACTIVE:
-            return "inactive"
-        elif state == TopologyChange.LEARNING:
-            return "learning"
-        elif state == TopologyChange.DETECTED:
-            return "detected"
-        elif state == TopologyChange.ACTIVE:
-            return "active"
-        elif state == TopologyChange.NOTIFIED_TCN:
-            return "notified_tcn"
-        elif state == TopologyChange.NOTIFIED_TC:
-            return "notified_tc"
-        elif state == TopologyChange.PROPAGATING:
-            return "propagating"
-        elif state == TopologyChange.ACKNOWLEDGED:
-            return "acknowledged"
-        else:
-            assert False
+    def not_participating(self):
+        return (
+            (self.port.role != rstp_util.ROOT_PORT) and
+            (self.port.role != rstp_util.DESIGNATED_PORT) and
+            not (self.port.learn or self.port.learning) and
+            not (self.port.rcvdTc or self.port.rcvdTcn or self.port.rcvdTcAck or self.port.tcProp)
+        )
+
+    def rcvd_tc_or_tc_prop(self):
+        return (
+            self.port.rcvdTc or
+            self.port.rcvdTcn or
+            self.port.rcvdTcAck or
+            self.port.tcProp
+        )
+
+    def not_root_or_designated_or_edge(self):
+        return (
+            (
+                self.port.role != rstp_util.ROOT_PORT and
+                self.port.role != rstp_util.DESIGNATED_PORT
+            ) or
+            self.port.operEdge
+        )
+
+    def rcvd_tcn(self):
+        return self.port.rcvdTcn
+
+    def rcvd_tc(self):
+        return self.port.rcvdTc
+
+    def tc_prop_and_not_edge(self):
+        return self.port.tcProp and not self.port.operEdge
+
+    def rcvd_tc_ack(self):
+        return self.port.rcvdTcAck
+
+    def enter_inactive(self):
+        self.port.fdbFlush = True
+        self.port.tcWhile = 0
+        self.port.tcAck = False
+
+    def enter_learning(self):
+        self.port.rcvdTc = False
+        self.port.rcvdTcn = False
+        self.port.rcvdTcAck = False
+        self.port.tcProp = False
+
+    def enter_detected(self):
+        self.port.newTcWhile()
+        self.rstp_handler.setTcPropTree(self.port.port_no)
+        self.port.newInfo = True
+
+    def enter_active(self):
+        pass
+
+    def enter_notified_tcn(self):
+        self.port.newTcWhile()
+
+    def enter_notified_tc(self):
+        self.port.rcvdTcn = False
+        self.port.rcvdTc = False
+        if self.port.role == rstp_util.DESIGNATED_PORT:
+            self.port.tcAck = True
+        self.rstp_handler.setTcPropTree(self.port.port_no) # Standard says setTcPropBridge(), but that function doesn't exist.
+
+    def enter_propagating(self):
+        self.port.newTcWhile()
+        self.port.fdbFlush = True
+        self.port.tcProp = False
+
+    def enter_acknowledged(self):
+        self.port.tcWhile = 0
+        self.port.rcvdTcAck = False
@@ -0,0 +1,75 @@
+from threading import Lock
+from timer import monotonic
+from metrics import Histogram, DURATION_BOUNDS
+from tracing import tracer
+
+class MethodStatistics:
+    """Calls of one SwitchAPI method."""
+    def __init__(self):
+        self.durations = Histogram(DURATION_BOUNDS)
+        self.exceptions = 0
+        self.slow_calls_under_lock = 0
+
+    def snapshot(self):
+        return {
+            "durations": self.durations.snapshot(),
+            "exceptions": self.exceptions,
+            "slow_calls_under_lock": self.slow_calls_under_lock
+        }
+
+class SwitchApiProxy:
+    """Wraps a switch_api_rpc.Client and forwards every call to it, counting the calls, their durations and the
+    exceptions they raise per method. Calls made while holding the watched lock which take longer than the threshold
+    are counted and written to the trace log, since every callback waits for them."""
+    SLOW_CALL_THRESHOLD = 0.01 # Seconds.
+
+    def __init__(self, client, slow_call_threshold=SLOW_CALL_THRESHOLD):
+        self._client = client
+        self._watched_lock = None
+        self._statistics_lock = Lock() # The controller calls SwitchAPI from several threads.
+        self.slow_call_threshold = slow_call_threshold
+        self.statistics = {} # MethodStatistics by method name.
+
+    def watch_lock(self, lock):
+        """Flags slow calls made while the current thread holds lock, a TimedLock."""
+        self._watched_lock = lock
+
+    def get_statistics(self):
+        """Returns a copy of the statistics of each method."""
+        with self._statistics_lock:
+            return dict((method, statistics.snapshot()) for method, statistics in self.statistics.items())
+
+    def __getattr__(self, name):
+        # Only called for attributes the proxy doesn't have, and the wrapper is stored, so each method is wrapped once.
+        method = getattr(self._client, name)
+        if name.startswith("_") or not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            under_lock = self._watched_lock is not None and self._watched_lock.is_owned()
+            exception = None
+            start = monotonic()
+            try:
+                return method(*args, **kwargs)
+            except Exception as e:
+                exception = e
+                raise
+            finally:
+                self._record(name, monotonic() - start, exception, under_lock)
+
+        self.__dict__[name] = call
+        return call
+
+    def _record(self, name, duration, exception, under_lock):
+        slow = under_lock and duration > self.slow_call_threshold
+        with self._statistics_lock:
+            statistics = self.statistics.get(name)
+            if statistics is None:
+                statistics = self.statistics[name] = MethodStatistics()
+            statistics.durations.add(duration)
+            if exception is not None:
+                statistics.exceptions += 1
+            if slow:
+                statistics.slow_calls_under_lock += 1
+        if slow:
+            tracer.trace_slow_call(name, duration)
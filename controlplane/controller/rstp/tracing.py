@@ -0,0 +1,136 @@
+from collections import deque
+from datetime import datetime
+from threading import Thread, Event
+import sys
+import time
+import traceback
+import rstp_util
+
+# Trace categories, one for each state machine and one for the learning and forwarding state of the ports.
+PORT_STATE = "PortState"
+CATEGORIES = (
+    "PortRoleSelection",
+    "PortReceive",
+    "PortProtocolMigration",
+    "BridgeDetection",
+    "PortTransmit",
+    "PortInformation",
+    "PortRoleTransitions",
+    "PortStateTransition",
+    "TopologyChange",
+    PORT_STATE
+)
+
+def category_bit(category):
+    return 1 << CATEGORIES.index(category)
+
+PORT_STATE_BIT = category_bit(PORT_STATE)
+ALL_PORTS = -1 # Has every bit set, however large the port number.
+SLOW_CALL = "SlowCall" # Stands in for the machine class in records of slow SwitchAPI calls.
+
+class Tracer:
+    """Records state machine transitions and port state changes of the enabled categories and ports into a ring buffer,
+    which a background thread formats and writes to the log. Callers check category_mask before calling in, so a
+    disabled category costs a single bit test and nothing is formatted while holding the callback lock. SwitchAPI calls
+    which held up the callback lock are recorded as well, whatever is enabled."""
+    CAPACITY = 65536 # Records. When full, the oldest records are dropped.
+    DRAIN_INTERVAL = 0.1 # Seconds.
+
+    def __init__(self, capacity=CAPACITY):
+        self.category_mask = 0
+        self.port_mask = ALL_PORTS
+        self.capacity = capacity
+        # Appending to and popping from a deque is atomic, so the buffer needs no lock.
+        self.records = deque(maxlen=capacity)
+        self.dropped = 0
+        self.log = sys.stdout
+        self.thread = None
+        self.stopped = Event()
+
+    def configure(self, categories, port_nos=None, log=None):
+        """Enables the given categories, for the given ports or all of them. Disables all other categories."""
+        mask = 0
+        for category in categories:
+            mask |= category_bit(category)
+        port_mask = ALL_PORTS
+        if port_nos is not None:
+            port_mask = 0
+            for port_no in port_nos:
+                port_mask |= 1 << port_no
+        self.port_mask = port_mask
+        self.category_mask = mask
+        if log is not None:
+            self.log = log
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        self.drain()
+
+    def trace_transition(self, machine, old_state, new_state, guard_name):
+        port_no = machine.port.port_no if machine.port else None
+        if port_no is None or (self.port_mask >> port_no) & 1:
+            self._append((time.time(), machine.__class__, port_no, old_state, new_state, guard_name))
+
+    def trace_port_state(self, port_no, old_state, new_state):
+        if (self.port_mask >> port_no) & 1:
+            self._append((time.time(), None, port_no, old_state, new_state, None))
+
+    def trace_slow_call(self, method, duration):
+        # The method and the duration take the places of the old and the new state.
+        self._append((time.time(), SLOW_CALL, None, method, duration, None))
+
+    def _append(self, record):
+        if len(self.records) == self.capacity:
+            self.dropped += 1
+        self.records.append(record)
+
+    def drain(self):
+        """Writes out all buffered records."""
+        records = self.records
+        lines = []
+        while records:
+            lines.append(self._format(records.popleft()))
+        if self.dropped:
+            lines.append("Trace buffer full, dropped {} records".format(self.dropped))
+            self.dropped = 0
+        if lines:
+            self.log.write("\n".join(lines) + "\n")
+            self.log.flush()
+
+    def _format(self, record):
+        timestamp, machine_class, port_no, old_state, new_state, guard_name = record
+        timestamp = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")
+        if machine_class is SLOW_CALL:
+            return "{} SwitchAPI call {} took {:.1f} ms while holding the callback lock".format(
+                timestamp, old_state, new_state * 1000
+            )
+        if machine_class is None:
+            return "{} Port {}: {} -> {}".format(
+                timestamp, port_no, rstp_util.rstp_state_to_string(old_state), rstp_util.rstp_state_to_string(new_state)
+            )
+        names = machine_class.STATE_NAMES
+        old_state_name = names[old_state] if old_state is not None else "none"
+        if port_no is None:
+            return "{} {} ({} -> {} on {})".format(timestamp, machine_class.__name__, old_state_name, names[new_state], guard_name)
+        return "{} Port {}: {} ({} -> {} on {})".format(
+            timestamp, port_no, machine_class.__name__, old_state_name, names[new_state], guard_name
+        )
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.drain()
+            except Exception:
+                traceback.print_exc()
+            self.stopped.wait(Tracer.DRAIN_INTERVAL)
+
+tracer = Tracer()
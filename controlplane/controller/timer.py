@@ -1,71 +1,139 @@
-from threading import Thread, Condition
-import datetime
+from threading import Thread, Lock, Condition, current_thread
+import heapq
+import itertools
+import os
+import select
+import traceback
 
-class Timer(Thread):
-    """Startable and stoppable repeating timer, which runs in its own thread."""
-    STATE_STOPPED = 0
-    STATE_RESTART = 1
-    STATE_RUNNING = 2
-    STATE_CANCELED = 3
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2 has no time.monotonic(), so read CLOCK_MONOTONIC through libc.
+    import ctypes
 
-    def __init__(self, callback):
-        Thread.__init__(self)
-        self.daemon = True
+    class _Timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
 
-        self.callback = callback
-        self.state = Timer.STATE_STOPPED
-        self.condition = Condition()
+    _CLOCK_MONOTONIC = 1
+    _libc = ctypes.CDLL(None, use_errno=True)
+
+    def monotonic():
+        """Seconds from a clock which is not affected by changes of the wall clock."""
+        timespec = _Timespec()
+        if _libc.clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(timespec)) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
+class TimerScheduler:
+    """Runs the callbacks of all timers on a single thread, ordered by their next deadline on the monotonic clock."""
+    instance = None
+    instance_lock = Lock()
+
+    @staticmethod
+    def get_instance():
+        with TimerScheduler.instance_lock:
+            if TimerScheduler.instance is None:
+                TimerScheduler.instance = TimerScheduler()
+            return TimerScheduler.instance
+
+    def __init__(self):
+        self.lock = Lock()
+        self.callback_done = Condition(self.lock)
+        self.running = None # The timer whose callback is running.
+        self.heap = []
+        self.sequence = itertools.count() # Keeps timers with equal deadlines in scheduling order.
+
+        # The thread sleeps in select(), which times out on the monotonic clock, and is woken through this pipe.
+        self.wakeup_read, self.wakeup_write = os.pipe()
+
+        self.thread = Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def schedule(self, timer, delay):
+        with self.lock:
+            timer.generation += 1
+            timer.delay = delay
+            deadline = monotonic() + delay
+            self._push(timer, deadline)
+            is_earliest = self.heap[0][2] is timer
+        if is_earliest:
+            os.write(self.wakeup_write, b"\0")
 
-        Thread.start(self)
+    def unschedule(self, timer):
+        # Heap entries of older generations are skipped when they are reached, so there is no need to remove them.
+        with self.lock:
+            timer.generation += 1
 
-    def run(self):
+    def wait_for_callback(self, timer):
+        """Waits until no callback of timer is running, unless called by a callback, which can't wait for itself."""
+        if current_thread() is self.thread:
+            return
+        with self.lock:
+            while self.running is timer:
+                self.callback_done.wait()
+
+    def _push(self, timer, deadline):
+        heapq.heappush(self.heap, (deadline, next(self.sequence), timer, timer.generation))
+
+    def _run(self):
         while True:
-            # Wait until started.
-            self.condition.acquire()
-            while self.state == Timer.STATE_STOPPED:
-                self.condition.wait()
-                if self.state == Timer.STATE_CANCELED:
-                    self.condition.release()
-                    return
-
-            if self.state == Timer.STATE_RESTART:
-                self.call_time = datetime.datetime.now()
-                self.state = Timer.STATE_RUNNING
-
-            # Wait the delay.
-            self.call_time += datetime.timedelta(seconds=self.delay)
-            self.condition.wait((self.call_time - datetime.datetime.now()).total_seconds())
-
-            if self.state == Timer.STATE_CANCELED:
-                self.condition.release()
-                return
-            if self.state != Timer.STATE_RUNNING:
-                self.condition.release()
-                continue
-            self.condition.release()
-
-            self.callback()
+            due = []
+            with self.lock:
+                now = monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    deadline, _, timer, generation = heapq.heappop(self.heap)
+                    if generation != timer.generation:
+                        continue
+                    # The next deadline is counted from this one rather than from now, so the timer doesn't drift.
+                    self._push(timer, deadline + timer.delay)
+                    due.append((timer, generation))
+                timeout = self.heap[0][0] - now if self.heap else None
+
+            for timer, generation in due:
+                with self.lock:
+                    # Skip timers stopped by an earlier callback.
+                    if generation != timer.generation:
+                        continue
+                    self.running = timer
+                try:
+                    timer.callback()
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    with self.lock:
+                        self.running = None
+                        self.callback_done.notify_all()
+
+            if not due:
+                readable = select.select([self.wakeup_read], [], [], timeout)[0]
+                if readable:
+                    os.read(self.wakeup_read, 4096)
+
+class Timer:
+    """Startable and stoppable repeating timer. All timers share one scheduler thread."""
+    def __init__(self, callback, scheduler=None):
+        self.callback = callback
+        self.scheduler = scheduler if scheduler else TimerScheduler.get_instance()
+        self.delay = None
+        self.generation = 0
+        self.active = False
 
     def is_active(self):
-        return self.state == Timer.STATE_RUNNING or self.state == Timer.STATE_RESTART
+        return self.active
 
     def start(self, delay):
-        self.condition.acquire()
-        self.delay = delay
-        self.state = Timer.STATE_RESTART
-        self.condition.notify()
-        self.condition.release()
+        self.active = True
+        self.scheduler.schedule(self, delay)
 
     def stop(self):
-        self.condition.acquire()
-        self.state = Timer.STATE_STOPPED
-        self.condition.notify()
-        self.condition.release()
+        self.active = False
+        self.scheduler.unschedule(self)
 
     def cancel(self):
-        self.condition.acquire()
-        self.state = Timer.STATE_CANCELED
-        self.condition.notify()
-        self.condition.release()
-        self.join()
-
+        """Stops the timer and waits for its callback if it is running, so the callback is done when cancel() returns.
+        Called by the callback itself, it only stops the timer. A caller holding a lock the callback takes would wait
+        forever, so cancel() must be called without it."""
+        self.stop()
+        self.scheduler.wait_for_callback(self)
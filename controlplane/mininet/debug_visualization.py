@@ -100,10 +100,12 @@ class DebugVisualization:
                                 remote = self.switch_port_to_remote[node, current_port]
                                 self.port_states[node, remote] = state
                 elif node_obj.__class__ == SwitchP4:
+                    # All ports of the switch in one request.
+                    port_states = node_obj.get_port_states()
                     for port_no, interface in node_obj.intfs.items():
                         if not interface.IP():
                             remote = self.switch_port_to_remote[node, port_no]
-                            state = node_obj.get_port_state(port_no)
+                            state = port_states.get(port_no, SwitchP4.PORT_STATE_FORWARDING)
                             if state == SwitchP4.PORT_STATE_FORWARDING:
                                 translated_state = PORT_STATE_FORWARDING
                             elif state == SwitchP4.PORT_STATE_LEARNING:
@@ -116,7 +116,8 @@ class SwitchP4(Switch):
             self.deleteIntfs()
         self.running = False
 
-    def get_port_state(self, port_no):
+    def get_port_states(self):
+        """Returns the states of all ports by port number, read from the controller with one snapshot request."""
         while self.running:
             if not self.config_socket:
                 self.config_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -129,14 +130,36 @@ class SwitchP4(Switch):
                         pass
                     time.sleep(0.2)
 
-            GET_PORT_STATE = 21
+            # See controller/configuration_server.py for the snapshot format.
+            GET_SNAPSHOT = 46
             try:
-                self.config_socket.sendall(struct.pack("!ii", GET_PORT_STATE, port_no))
-                return struct.unpack("!ii", self.config_socket.recv(1500))[1]
+                self.config_socket.sendall(struct.pack("!i", GET_SNAPSHOT))
+                status, version, bridge_size, port_size, port_count = struct.unpack("!5i", self._receive_config(20))
+                if status != 0:
+                    raise Exception("Snapshot failed.")
+                self._receive_config(bridge_size)
+                states = {}
+                for i in range(port_count):
+                    port_no, uptime, state = struct.unpack("!3i", self._receive_config(port_size)[:12])
+                    states[port_no] = state
+                return states
             except Exception as e:
                 self.config_socket = None
-        # Switch not even running, so just return forwarding.
-        return SwitchP4.PORT_STATE_FORWARDING
+        # Switch not even running.
+        return {}
+
+    def get_port_state(self, port_no):
+        # Ports the controller doesn't know, or of a switch which isn't running, just return forwarding.
+        return self.get_port_states().get(port_no, SwitchP4.PORT_STATE_FORWARDING)
+
+    def _receive_config(self, size):
+        data = bytes()
+        while len(data) < size:
+            received_bytes = self.config_socket.recv(size - len(data))
+            if not received_bytes:
+                raise Exception("Socket closed.")
+            data += received_bytes
+        return data
 
     def setup_cpu_port(self):
         # Add virtual CPU port.
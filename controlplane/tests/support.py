@@ -0,0 +1,99 @@
+"""Fakes of the switch and the CPU port, so an RstpHandler can be driven by a test without a switch.
+See README.md for how to run the tests."""
+import os
+import socket
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "controller"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cli"))
+
+from bpdu import Bpdu
+from port_info import PortInfo
+from rstp.rstp_handler import RstpHandler
+
+VLAN = 10
+
+class FakeSwitchApi:
+    """Answers every SwitchAPI call with handle 1 and records it as (method, keyword arguments)."""
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self.calls.append((name, kwargs))
+            return 1
+        return call
+
+    def count(self, name):
+        return len([call for call in self.calls if call[0] == name])
+
+class FakePacketIo:
+    """Records the BPDUs sent by the handler."""
+    def __init__(self):
+        self.sent = []
+        self.batch_depth = 0
+        self.batch = []
+        self.batch_sizes = {}
+        self.send_calls = 0
+        self.frames_sent = 0
+
+    def begin_batch(self):
+        self.batch_depth += 1
+
+    def end_batch(self):
+        self.batch_depth -= 1
+        frames = self.batch if self.batch_depth == 0 else []
+        if self.batch_depth == 0:
+            self.batch = []
+        return frames
+
+    def send_batch(self, frames):
+        self.sent.extend(frames)
+
+    def send_config_bpdu(self, *args):
+        self.batch.append(("config",) + args)
+
+    def send_rstp_bpdu(self, *args):
+        self.batch.append(("rstp",) + args)
+
+    def send_tcn_bpdu(self, out_port):
+        self.batch.append(("tcn", out_port))
+
+def make_handler(port_nos, rstp=True, bridge_prio=32768, bridge_mac="00:00:00:00:00:0b"):
+    """Returns an RstpHandler whose state machines have run their BEGIN states. Its timer isn't started, so tests call
+    tick_timer_callback() themselves, and the switch calls are made right away by the calling thread."""
+    port_infos = dict((port_no, PortInfo(port_no, 100 + port_no, None)) for port_no in port_nos)
+    handler = RstpHandler(FakeSwitchApi(), FakePacketIo(), VLAN, port_infos, bridge_prio, bridge_mac, rstp)
+    with handler.callback_lock:
+        handler.do_begin_states()
+    return handler
+
+def make_rstp_bpdu(root_id, root_path_cost, bridge_id, port_id, flags=0x7C, max_age=20, hello_time=2, forward_delay=15):
+    """Returns an RSTP BPDU from a designated port (flags: forwarding, learning, designated role, proposal clear)."""
+    frame = struct.pack(
+        "!HBBBQIQHHHHHB",
+        0, 2, 2, flags, root_id, root_path_cost, bridge_id, port_id,
+        0, int(max_age * 256), int(hello_time * 256), int(forward_delay * 256), 0
+    )
+    return Bpdu(frame, 0)
+
+def make_config_bpdu(root_id, root_path_cost, bridge_id, port_id, flags=0, max_age=20, hello_time=2, forward_delay=15):
+    """Returns an STP configuration BPDU. Flag 0x01 is topology change, 0x80 topology change acknowledgment."""
+    frame = struct.pack(
+        "!HBBBQIQHHHHH",
+        0, 0, 0, flags, root_id, root_path_cost, bridge_id, port_id,
+        0, int(max_age * 256), int(hello_time * 256), int(forward_delay * 256)
+    )
+    return Bpdu(frame, 0)
+
+def free_tcp_port():
+    """Returns a TCP port nothing listens on, for a configuration server started by a test."""
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
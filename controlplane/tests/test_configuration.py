@@ -0,0 +1,37 @@
+import unittest
+
+import support
+import configuration_server
+from rstp.rstp_configuration import RstpConfiguration, InvalidParameter
+
+# The neighbour on port 1 is the root bridge.
+ROOT_ID = (4096 << 48) | 0x0a
+
+class HelloTimeTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = support.make_handler([1])
+        self.configuration = RstpConfiguration(self.handler)
+
+    def test_sub_second_bridge_hello_time(self):
+        self.assertRaises(InvalidParameter, self.configuration.set_bridge_hello_time_ms, 500)
+        self.configuration.set_tick_interval(100)
+        self.configuration.set_bridge_hello_time_ms(500)
+        self.assertEqual(self.configuration.get_bridge_hello_time_ms(), 500)
+        # The hello time would no longer be a whole number of ticks.
+        self.assertRaises(InvalidParameter, self.configuration.set_tick_interval, 200)
+        self.assertEqual(self.handler.TickInterval, 100)
+
+    def test_tick_interval_must_divide_the_root_hello_time(self):
+        self.configuration.set_tick_interval(50)
+        self.handler.bpdu_received_callback(support.make_rstp_bpdu(ROOT_ID, 0, ROOT_ID, 0x8001, hello_time=0.25), 1)
+        self.assertEqual(self.configuration.get_hello_time_ms(), 250)
+        self.assertRaises(InvalidParameter, self.configuration.set_tick_interval, 100)
+        self.configuration.set_tick_interval(250)
+        self.assertEqual(self.handler.TickInterval, 250)
+
+    def test_hello_times_in_seconds_are_not_truncated(self):
+        self.assertEqual(configuration_server._pack_whole_seconds(2.0), configuration_server.INTEGER.pack(2))
+        self.assertRaises(configuration_server.NotWholeSeconds, configuration_server._pack_whole_seconds, 0.5)
+
+if __name__ == "__main__":
+    unittest.main()
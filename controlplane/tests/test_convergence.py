@@ -0,0 +1,34 @@
+import unittest
+
+import support
+
+# The neighbour on port 1 is the root bridge.
+ROOT_ID = (4096 << 48) | 0x0a
+
+class ConvergenceTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = support.make_handler([1])
+        self.monitor = self.handler.convergence
+        self.monitor.reset()
+
+    def receive(self, bpdu):
+        self.handler.bpdu_received_callback(bpdu, 1)
+
+    def test_repeated_bpdus_record_no_convergence(self):
+        bpdu = support.make_rstp_bpdu(ROOT_ID, 0, ROOT_ID, 0x8001)
+        self.receive(bpdu)
+        self.assertFalse(self.monitor.is_converging())
+        self.assertEqual(self.monitor.convergence_times.count, 1)
+
+        for _ in range(10):
+            self.receive(bpdu)
+        self.assertFalse(self.monitor.is_converging())
+        self.assertEqual(self.monitor.convergence_times.count, 1)
+
+    def test_changed_bpdu_records_a_convergence(self):
+        self.receive(support.make_rstp_bpdu(ROOT_ID, 0, ROOT_ID, 0x8001))
+        self.receive(support.make_rstp_bpdu(ROOT_ID, 0, ROOT_ID, 0x8001, hello_time=1))
+        self.assertEqual(self.monitor.convergence_times.count, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+import support
+
+# The neighbour on port 1 is the root bridge.
+ROOT_ID = (4096 << 48) | 0x0a
+PORT_COUNT = 48
+SEND_FLUSH = "send_switcht_api_mac_table_entries_delete_by_interface"
+RECV_FLUSH = "recv_switcht_api_mac_table_entries_delete_by_interface"
+VLAN_FLUSH = "switcht_api_mac_table_entries_delete_by_vlan"
+
+class TopologyChangeFlushTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = support.make_handler(range(1, PORT_COUNT + 1))
+        # Ports without a neighbour would become edge ports, which aren't flushed.
+        for port in self.handler.rstp_ports.values():
+            port.AutoEdgePort = False
+        self.handler.bpdu_received_callback(support.make_rstp_bpdu(ROOT_ID, 0, ROOT_ID, 0x8001), 1)
+        for _ in range(40 * self.handler.ticks_per_second):
+            self.handler.tick_timer_callback()
+        self.api = self.handler.client
+        del self.api.calls[:]
+
+    def receive_topology_change(self):
+        self.handler.bpdu_received_callback(support.make_rstp_bpdu(ROOT_ID, 0, ROOT_ID, 0x8001, flags=0x7D), 1)
+
+    def test_topology_change_flushes_in_one_round_trip(self):
+        self.receive_topology_change()
+        names = [call[0] for call in self.api.calls if call[0] in (SEND_FLUSH, RECV_FLUSH, VLAN_FLUSH)]
+        # Every port but the receiving one is flushed, and all requests go out before the first response is read.
+        self.assertEqual(names, [SEND_FLUSH] * (PORT_COUNT - 1) + [RECV_FLUSH] * (PORT_COUNT - 1))
+        flushed = [call[1]["intf_handle"] for call in self.api.calls if call[0] == SEND_FLUSH]
+        self.assertEqual(sorted(flushed), [100 + port_no for port_no in range(2, PORT_COUNT + 1)])
+
+if __name__ == "__main__":
+    unittest.main()
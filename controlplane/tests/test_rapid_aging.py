@@ -0,0 +1,41 @@
+import unittest
+
+import support
+
+# The neighbour on port 1 is the root bridge.
+ROOT_ID = (4096 << 48) | 0x0a
+AGING_TIME_SET = "switcht_api_vlan_aging_interval_set"
+FLUSHES = (
+    "switcht_api_mac_table_entries_delete_by_interface",
+    "send_switcht_api_mac_table_entries_delete_by_interface",
+    "switcht_api_mac_table_entries_delete_by_vlan"
+)
+
+class RapidAgingTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = support.make_handler([1, 2, 3], rstp=False)
+        for port in self.handler.rstp_ports.values():
+            port.AutoEdgePort = False
+        self.api = self.handler.client
+        # Long enough for the topology change of the ports becoming forwarding to be over.
+        self.run_for(60)
+        self.assertEqual(self.handler.current_aging_time, 300)
+        del self.api.calls[:]
+
+    def run_for(self, seconds, flags=0):
+        # The root sends a configuration BPDU every hello time.
+        for tick in range(seconds * self.handler.ticks_per_second):
+            if tick % (2 * self.handler.ticks_per_second) == 0:
+                self.handler.bpdu_received_callback(support.make_config_bpdu(ROOT_ID, 0, ROOT_ID, 0x8001, flags), 1)
+            self.handler.tick_timer_callback()
+
+    def test_aging_time_is_short_while_the_topology_change_lasts(self):
+        self.run_for(60, flags=0x01)
+        self.assertEqual(self.handler.current_aging_time, 15)
+        self.run_for(30)
+        self.assertEqual(self.handler.current_aging_time, 300)
+        self.assertEqual(self.api.count(AGING_TIME_SET), 2)
+        self.assertEqual(sum(self.api.count(name) for name in FLUSHES), 0)
+
+if __name__ == "__main__":
+    unittest.main()
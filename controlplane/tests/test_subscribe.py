@@ -0,0 +1,42 @@
+import unittest
+
+import support
+import configuration_client
+from configuration_server import ConfigurationServer
+from rstp.rstp_configuration import RstpConfiguration
+
+class SubscribeTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = support.make_handler([1, 2])
+        self.port = support.free_tcp_port()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server.socket.close()
+
+    def start_server(self):
+        self.server = ConfigurationServer(RstpConfiguration(self.handler), self.port)
+        self.server.start()
+
+    def test_reconnecting_client_subscribes_after_failed_connect(self):
+        client = configuration_client.ConfigurationClient("127.0.0.1", self.port, reconnect=True)
+        self.assertIsNone(client.socket)
+        self.start_server()
+        status, subscription = client.subscribe()
+        self.assertEqual(status, configuration_client.STATUS_SUCCESS)
+        sequence, bridge, ports = subscription
+        self.assertEqual([port["port_no"] for port in ports], [1, 2])
+        client.close()
+
+    def test_subscribe_is_refused_in_a_batch(self):
+        self.start_server()
+        client = configuration_client.ConfigurationClient("127.0.0.1", self.port)
+        client.recording = []
+        self.assertRaises(Exception, client.subscribe)
+        self.assertEqual(client.recording, [])
+        client.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import threading
+import time
+import unittest
+
+import support
+from timer import Timer, TimerScheduler
+
+class TimerCancelTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = TimerScheduler()
+        self.started = threading.Event()
+        self.finished = threading.Event()
+
+    def test_cancel_waits_for_a_running_callback(self):
+        def callback():
+            self.started.set()
+            time.sleep(0.2)
+            self.finished.set()
+        timer = Timer(callback, self.scheduler)
+        timer.start(0.01)
+        self.assertTrue(self.started.wait(1))
+        timer.cancel()
+        self.assertTrue(self.finished.is_set())
+        self.assertFalse(timer.is_active())
+
+    def test_cancel_from_its_own_callback(self):
+        def callback():
+            timer.cancel()
+            self.finished.set()
+        timer = Timer(callback, self.scheduler)
+        timer.start(0.01)
+        self.assertTrue(self.finished.wait(1))
+        self.assertFalse(timer.is_active())
+
+if __name__ == "__main__":
+    unittest.main()